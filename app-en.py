@@ -5,10 +5,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import seaborn as sns
-import calendar
 from datetime import datetime
 import pycountry
-from wordcloud import WordCloud
+import iomdata
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +17,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Warm up the default dataset and popular filters in the background
+iomdata.start_warmup()
+
 # Title and description
 st.title("Migration Incidents Analysis Dashboard")
 st.markdown("""
@@ -25,46 +27,56 @@ This dashboard analyzes data on incidents involving immigrants, providing insigh
 trends and statistics related to these occurrences around the world.
 """)
 
-# Function to load data
-@st.cache_data
-def load_data(file=None):
-    if file is not None:
-        try:
-            # Check file extension
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-            return df, None
-        except Exception as e:
-            return None, str(e)
-    else:
-        # Create example DataFrame with structure similar to real data
-        # (only for demonstration when there's no upload)
-        data = {
-            'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
-            'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
-            'Incident Type': ['Shipwreck', 'Vehicle Accident', 'Dehydration', 'Violence', 'Drowning', 'Hypothermia'],
-            'Region of Incident': ['North America', 'North America', 'North America', 'North America', 'Europe', 'North America'],
-            'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
-            'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
-            'Month': ['January', 'February', 'March', 'April', 'May', 'June'],
-            'Number of Dead': [12, 5, 3, 8, 15, 2],
-            'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
-            'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
-            'Number of Survivors': [8, 12, 5, 3, 2, 4],
-            'Number of Females': [6, 7, 2, 5, 8, 1],
-            'Number of Males': [14, 10, 6, 7, 14, 5],
-            'Number of Children': [3, 4, 1, 2, 7, 0],
-            'Country of Origin': ['Guatemala', 'Mexico', 'Honduras', 'El Salvador', 'Syria', 'Mexico'],
-            'Region of Origin': ['Central America', 'North America', 'Central America', 'Central America', 'Middle East', 'North America'],
-            'Cause of Death': ['Drowning', 'Trauma', 'Dehydration', 'Violence', 'Drowning', 'Exposure'],
-            'Country of Incident': ['United States', 'United States', 'United States', 'United States', 'Finland', 'United States'],
-            'Migration Route': ['Mexico to US', 'Mexico to US', 'Central America to US', 'Central America to US', 'Middle East to Europe', 'Mexico to US'],
-            'Location of Incident': ['Desert', 'Highway', 'Desert', 'Border', 'Sea', 'Mountains']
-        }
-        df = pd.DataFrame(data)
-        return df, None
+# Function to load the dataset shown without an upload
+@st.cache_resource
+def load_data():
+    # Bundled dataset, already loaded by the warm-up when available
+    dataset = iomdata.default_dataset()
+    if dataset is not None:
+        return dataset
+
+    # Create example DataFrame with structure similar to real data
+    # (only for demonstration when there's no upload)
+    data = {
+        'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
+        'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
+        'Incident Type': ['Shipwreck', 'Vehicle Accident', 'Dehydration', 'Violence', 'Drowning', 'Hypothermia'],
+        'Region of Incident': ['North America', 'North America', 'North America', 'North America', 'Europe', 'North America'],
+        'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
+        'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
+        'Month': ['January', 'February', 'March', 'April', 'May', 'June'],
+        'Number of Dead': [12, 5, 3, 8, 15, 2],
+        'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
+        'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
+        'Number of Survivors': [8, 12, 5, 3, 2, 4],
+        'Number of Females': [6, 7, 2, 5, 8, 1],
+        'Number of Males': [14, 10, 6, 7, 14, 5],
+        'Number of Children': [3, 4, 1, 2, 7, 0],
+        'Country of Origin': ['Guatemala', 'Mexico', 'Honduras', 'El Salvador', 'Syria', 'Mexico'],
+        'Region of Origin': ['Central America', 'North America', 'Central America', 'Central America', 'Middle East', 'North America'],
+        'Cause of Death': ['Drowning', 'Trauma', 'Dehydration', 'Violence', 'Drowning', 'Exposure'],
+        'Country of Incident': ['United States', 'United States', 'United States', 'United States', 'Finland', 'United States'],
+        'Migration Route': ['Mexico to US', 'Mexico to US', 'Central America to US', 'Central America to US', 'Middle East to Europe', 'Mexico to US'],
+        'Location of Incident': ['Desert', 'Highway', 'Desert', 'Border', 'Sea', 'Mountains']
+    }
+    return iomdata.Dataset.from_frame(pd.DataFrame(data), 'example', sample=True)
+
+# Stages of a background upload, as shown in the progress bar
+INGESTION_STAGES = {
+    'queued': "Waiting to process",
+    'parsing': "Reading",
+    'normalizing': "Normalizing",
+    'indexing': "Indexing",
+}
+
+# Upload progress, refreshed every second while the file is processed
+@st.fragment(run_every=1)
+def show_ingestion_progress(ingestion):
+    if ingestion.done:
+        # Switch the whole dashboard over to the new dataset at once
+        st.rerun()
+    st.progress(ingestion.progress, text=f"⏳ {INGESTION_STAGES[ingestion.stage]} {ingestion.name}...")
+    st.caption("The dashboard keeps showing the current data until the file is ready.")
 
 # Option for file upload
 st.sidebar.header("📊 Data")
@@ -72,37 +84,42 @@ uploaded_file = st.sidebar.file_uploader("Upload data file", type=["xlsx", "xls"
 
 # Load data
 if uploaded_file is not None:
-    df, error = load_data(uploaded_file)
-    if error:
-        st.error(f"Error loading file: {error}")
+    # Uploads are parsed in the background; identical files share one job
+    if st.session_state.get('ingestion_file') != uploaded_file.file_id:
+        st.session_state['ingestion_file'] = uploaded_file.file_id
+        st.session_state['ingestion'] = iomdata.ingest(uploaded_file.getvalue(), uploaded_file.name)
+    ingestion = st.session_state['ingestion']
+    if ingestion.error:
+        st.error(f"Error loading file: {ingestion.error}")
         st.stop()
-    else:
+    elif ingestion.done:
+        dataset = ingestion.dataset
         st.sidebar.success("✅ Data loaded successfully!")
+    else:
+        # Previous dataset until the upload is ready
+        dataset = st.session_state['dataset_lease'].dataset if 'dataset_lease' in st.session_state else load_data()
+        with st.sidebar:
+            show_ingestion_progress(ingestion)
 else:
-    df, _ = load_data()
-    st.sidebar.warning("⚠️ Using example data. Upload your file for real analysis.")
-
-# Convert Incident Date to datetime, if necessary
-if 'Incident Date' in df.columns:
-    try:
-        df['Incident Date'] = pd.to_datetime(df['Incident Date'])
-    except:
-        pass
-
-# Check and fill null values in numeric fields
-numeric_columns = [
-    'Number of Dead', 'Minimum Estimated Number of Missing', 
-    'Total Number of Dead and Missing', 'Number of Survivors',
-    'Number of Females', 'Number of Males', 'Number of Children'
-]
-
-for col in numeric_columns:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        df[col] = df[col].fillna(0)
+    # Drop the finished upload job so a removed upload can be freed
+    st.session_state.pop('ingestion', None)
+    st.session_state.pop('ingestion_file', None)
+    dataset = load_data()
+    if dataset.sample:
+        st.sidebar.warning("⚠️ Using example data. Upload your file for real analysis.")
+    else:
+        st.sidebar.info(f"ℹ️ Using the bundled dataset ({dataset.name}). Upload your file to analyze other data.")
+
+# Hold the dataset shown while this session uses it; unused uploads are freed
+if 'dataset_lease' not in st.session_state or st.session_state['dataset_lease'].dataset is not dataset:
+    st.session_state['dataset_lease'] = iomdata.lease(dataset)
+
+# Dates and numeric fields are already normalized when the dataset is loaded
+df = dataset.frame
 
 # Sidebar for filters
 st.sidebar.header("🔍 Filters")
+filter_state = iomdata.FilterState()
 
 # Period filter
 if 'Incident Year' in df.columns:
@@ -113,8 +130,21 @@ if 'Incident Year' in df.columns:
             options=available_years,
             default=available_years
         )
-        if selected_year:
-            df = df[df['Incident Year'].isin(selected_year)]
+        filter_state = filter_state.replace(years=iomdata.selection(selected_year, available_years))
+        df = dataset.filtered(filter_state)
+
+# Date range filter, resolved with a binary search on the date index
+date_bounds = dataset.date_bounds()
+if date_bounds is not None and date_bounds[0] < date_bounds[1]:
+    selected_dates = st.sidebar.slider(
+        "Incident Date",
+        min_value=date_bounds[0],
+        max_value=date_bounds[1],
+        value=date_bounds,
+        format="MM/DD/YYYY"
+    )
+    filter_state = filter_state.replace(dates=iomdata.date_window(selected_dates, date_bounds))
+    df = dataset.filtered(filter_state)
 
 # Region filter
 if 'Region of Incident' in df.columns:
@@ -125,8 +155,8 @@ if 'Region of Incident' in df.columns:
             options=available_regions,
             default=available_regions
         )
-        if selected_region:
-            df = df[df['Region of Incident'].isin(selected_region)]
+        filter_state = filter_state.replace(regions=iomdata.selection(selected_region, available_regions))
+        df = dataset.filtered(filter_state)
 
 # Incident type filter
 if 'Incident Type' in df.columns:
@@ -137,14 +167,68 @@ if 'Incident Type' in df.columns:
             options=available_types,
             default=available_types
         )
-        if selected_type:
-            df = df[df['Incident Type'].isin(selected_type)]
+        filter_state = filter_state.replace(types=iomdata.selection(selected_type, available_types))
+        df = dataset.filtered(filter_state)
+
+# Keep the area selected on the map as a filter for the whole dashboard
+def store_map_selection():
+    st.session_state['map_bounds'] = iomdata.selection_bounds(st.session_state['incident_map'].selection.points)
+
+def clear_map_selection():
+    st.session_state['map_bounds'] = None
+
+# Near location filter, answered by the spatial index
+if dataset.spatial_index is not None:
+    with st.sidebar.expander("📍 Near location"):
+        custom_place = "Custom coordinates"
+        place = st.selectbox(
+            "Reference point",
+            options=[None] + list(iomdata.PLACES) + [custom_place],
+            format_func=lambda option: "Anywhere" if option is None else option
+        )
+        if place is not None:
+            if place == custom_place:
+                place_lat = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=0.0)
+                place_lon = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=0.0)
+            else:
+                place_lat, place_lon = iomdata.PLACES[place]
+            radius_km = st.slider("Radius (km)", 5, 1000, 50, step=5)
+            filter_state = filter_state.replace(near=(place_lat, place_lon, float(radius_km)))
+            df = dataset.filtered(filter_state)
+
+    # Area selected on the map (box or lasso in the Geographic Analysis tab)
+    if st.session_state.get('map_bounds') is not None:
+        filter_state = filter_state.replace(bounds=st.session_state['map_bounds'])
+        df = dataset.filtered(filter_state)
+        st.sidebar.caption("🗺️ Filtered to the area selected on the map")
+        st.sidebar.button("Clear map selection", on_click=clear_map_selection)
+
+# Values clicked on the charts (bars or countries) filter the whole dashboard
+def store_chart_pick(chart, column, field):
+    picks = dict(st.session_state.get('chart_picks') or {})
+    picks[column] = iomdata.picked(st.session_state[chart].selection.points, field)
+    st.session_state['chart_picks'] = picks
+
+def clear_chart_picks():
+    st.session_state['chart_picks'] = {}
+
+chart_picks = iomdata.chart_picks(st.session_state.get('chart_picks'))
+if chart_picks is not None:
+    filter_state = filter_state.replace(picks=chart_picks)
+    df = dataset.filtered(filter_state)
+    chart_pick_labels = {'Incident Type': "Incident type", 'Migration Route': "Route", 'Country of Incident': "Country"}
+    for column, values in chart_picks:
+        st.sidebar.caption(f"🖱️ {chart_pick_labels.get(column, column)}: {', '.join(map(str, values))}")
+    st.sidebar.button("Clear chart selection", on_click=clear_chart_picks)
 
 # Check if there's data after filtering
 if len(df) == 0:
     st.warning("No data available for the selected filters.")
     st.stop()
 
+# Remember the filters used, so the next warm-up can precompute them
+iomdata.record_usage(filter_state, st.session_state)
+
 # Divide the dashboard into sections
 tab1, tab2, tab3, tab4 = st.tabs(["📈 Overview", "🗺️ Geographic Analysis", "👥 Demographics", "📊 Detailed Analysis"])
 
@@ -153,6 +237,7 @@ with tab1:
     
     # Main KPIs
     col1, col2, col3, col4 = st.columns(4)
+    totals = iomdata.section(dataset, filter_state, 'column_sums')
     
     with col1:
         total_incidents = len(df)
@@ -160,17 +245,17 @@ with tab1:
     
     with col2:
         if 'Total Number of Dead and Missing' in df.columns:
-            total_dead_missing = int(df['Total Number of Dead and Missing'].sum())
+            total_dead_missing = int(totals['Total Number of Dead and Missing'])
             st.metric("Total Victims", f"{total_dead_missing:,}")
     
     with col3:
         if 'Number of Survivors' in df.columns:
-            total_survivors = int(df['Number of Survivors'].sum())
+            total_survivors = int(totals['Number of Survivors'])
             st.metric("Total Survivors", f"{total_survivors:,}")
     
     with col4:
         if 'Number of Children' in df.columns:
-            total_children = int(df['Number of Children'].sum())
+            total_children = int(totals['Number of Children'])
             st.metric("Children Affected", f"{total_children:,}")
     
     st.markdown("---")
@@ -179,29 +264,36 @@ with tab1:
     if 'Incident Date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Incident Date']):
         st.subheader("Incident Trend Over Time")
         
-        # Grouping by month
-        df_time = df.copy()
-        df_time['Month'] = df_time['Incident Date'].dt.to_period('M')
-        incidents_by_month = df_time.groupby('Month').size().reset_index(name='Incidents')
-        incidents_by_month['Month'] = incidents_by_month['Month'].astype(str)
-        
-        # Dead and missing by month
+        # Dead and missing over time
         if 'Total Number of Dead and Missing' in df.columns:
-            victims_by_month = df_time.groupby('Month')['Total Number of Dead and Missing'].sum().reset_index()
-            victims_by_month['Month'] = victims_by_month['Month'].astype(str)
+            granularity_labels = {'day': 'Day', 'week': 'Week', 'month': 'Month', 'quarter': 'Quarter', 'year': 'Year'}
+            granularity = st.radio(
+                "Granularity",
+                options=list(granularity_labels),
+                index=2,
+                format_func=granularity_labels.get,
+                horizontal=True
+            )
+            
+            # Series rolled up from precomputed daily values
+            trend = iomdata.section(dataset, filter_state, 'trend', granularity)
+            
+            # Cap the points sent to the browser, keeping the peaks
+            incident_points = iomdata.downsample(trend['Incidents'])
+            victim_points = iomdata.downsample(trend['Victims'])
             
             # Combined line chart
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=incidents_by_month['Month'],
-                y=incidents_by_month['Incidents'],
+            fig.add_trace(iomdata.scatter_type(len(incident_points))(
+                x=incident_points.index,
+                y=incident_points,
                 name='Number of Incidents',
                 line=dict(color='blue', width=2)
             ))
             
-            fig.add_trace(go.Scatter(
-                x=victims_by_month['Month'],
-                y=victims_by_month['Total Number of Dead and Missing'],
+            fig.add_trace(iomdata.scatter_type(len(victim_points))(
+                x=victim_points.index,
+                y=victim_points,
                 name='Victims (dead and missing)',
                 line=dict(color='red', width=2),
                 yaxis='y2'
@@ -209,7 +301,7 @@ with tab1:
             
             fig.update_layout(
                 title='Evolution of Incidents and Victims Over Time',
-                xaxis=dict(title='Month'),
+                xaxis=dict(title=granularity_labels[granularity]),
                 yaxis=dict(title='Number of Incidents', showgrid=False),
                 yaxis2=dict(title='Number of Victims', overlaying='y', side='right', showgrid=False),
                 legend=dict(x=0.01, y=0.99),
@@ -225,11 +317,11 @@ with tab1:
         with col1:
             st.subheader("Incidents by Type")
             
-            incidents_by_type = df['Incident Type'].value_counts().reset_index()
+            incidents_by_type = iomdata.section(dataset, filter_state, 'top_values', 'Incident Type', 10).reset_index()
             incidents_by_type.columns = ['Incident Type', 'Count']
             
             fig = px.bar(
-                incidents_by_type.sort_values('Count', ascending=False).head(10),
+                incidents_by_type,
                 x='Incident Type',
                 y='Count',
                 color='Count',
@@ -237,13 +329,19 @@ with tab1:
                 title='Top 10 Incident Types'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='type_chart',
+                on_select=lambda: store_chart_pick('type_chart', 'Incident Type', 'x'),
+                selection_mode='points'
+            )
         
         with col2:
             st.subheader("Victims by Incident Type")
             
             if 'Total Number of Dead and Missing' in df.columns:
-                victims_by_type = df.groupby('Incident Type')['Total Number of Dead and Missing'].sum().reset_index()
+                victims_by_type = iomdata.section(dataset, filter_state, 'group_sum', 'Incident Type', 'Total Number of Dead and Missing').reset_index()
                 victims_by_type.columns = ['Incident Type', 'Total Victims']
                 
                 fig = px.pie(
@@ -280,68 +378,140 @@ with tab2:
             else:
                 df_map['marker_size'] = 5
             
-            # Add text for hover
-            hover_text = []
-            for idx, row in df_map.iterrows():
-                text = f"Location: {row.get('Location of Incident', 'N/A')}<br>"
-                if 'Incident Type' in df_map.columns:
-                    text += f"Type: {row['Incident Type']}<br>"
-                if 'Incident Date' in df_map.columns:
-                    date = row['Incident Date']
-                    if pd.api.types.is_datetime64_any_dtype(date):
-                        text += f"Date: {date.strftime('%m/%d/%Y')}<br>"
-                    else:
-                        text += f"Date: {date}<br>"
-                if 'Total Number of Dead and Missing' in df_map.columns:
-                    text += f"Victims: {int(row['Total Number of Dead and Missing'])}"
-                hover_text.append(text)
+            # Hover fields; above the compact threshold the labels are sent once
+            hover_fields = {'Location': df_map['Location of Incident'] if 'Location of Incident' in df_map.columns else 'N/A'}
+            if 'Incident Type' in df_map.columns:
+                hover_fields['Type'] = df_map['Incident Type']
+            if 'Incident Date' in df_map.columns:
+                hover_fields['Date'] = df_map['Incident Date']
+            if 'Total Number of Dead and Missing' in df_map.columns:
+                hover_fields['Victims'] = df_map['Total Number of Dead and Missing'].fillna(0).astype(int)
             
             # Create density map
             fig = go.Figure()
             
-            # Add heat map
-            fig.add_densitymapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
-                z=df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))),
-                radius=20,
-                colorscale='Reds',
-                colorbar=dict(title='Intensity'),
-                hoverinfo='none',
-                opacity=0.7
-            )
+            # Add heat map, unless the tile server renders it
+            if not iomdata.serves_tiles(dataset):
+                fig.add_densitymapbox(
+                    lat=iomdata.quantize(df_map['LATITUDE']),
+                    lon=iomdata.quantize(df_map['LONGITUDE']),
+                    z=iomdata.quantize(df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))), 0),
+                    radius=20,
+                    colorscale='Reds',
+                    colorbar=dict(title='Intensity'),
+                    hoverinfo='none',
+                    opacity=0.7
+                )
             
             # Add individual points
             fig.add_scattermapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
+                lat=iomdata.quantize(df_map['LATITUDE']),
+                lon=iomdata.quantize(df_map['LONGITUDE']),
                 mode='markers',
                 marker=dict(
-                    size=df_map['marker_size'],
+                    size=iomdata.quantize(df_map['marker_size'], 1),
                     color='rgb(220, 20, 60)',
                     opacity=0.7
                 ),
-                text=hover_text,
-                hoverinfo='text'
+                **iomdata.hover(hover_fields, len(df_map))
             )
             
             # Configure map layout
             fig.update_layout(
-                mapbox_style="carto-positron",
+                mapbox_style=iomdata.MAP_STYLE,
                 mapbox=dict(
                     center=dict(lat=df_map['LATITUDE'].mean(), lon=df_map['LONGITUDE'].mean()),
-                    zoom=2
+                    zoom=2,
+                    layers=iomdata.tile_layers(dataset, filter_state)
                 ),
                 margin=dict(r=0, t=0, l=0, b=0),
                 height=500
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='incident_map',
+                on_select=store_map_selection,
+                selection_mode=('box', 'lasso')
+            )
         else:
             st.warning("There are no valid coordinates to display on the map.")
     else:
         st.warning("Latitude and longitude columns were not found in the data.")
     
+    # Hotspots: clusters of nearby incidents
+    st.subheader("Incident Hotspots")
+    
+    if 'LATITUDE' in df.columns and 'LONGITUDE' in df.columns:
+        col1, col2 = st.columns(2)
+        with col1:
+            hotspot_radius = st.slider("Cluster radius (km)", 5, 200, 25, step=5)
+        with col2:
+            hotspot_min_incidents = st.slider("Minimum incidents per hotspot", 2, 50, 10)
+        
+        hotspots = iomdata.section(dataset, filter_state, 'hotspots', float(hotspot_radius), hotspot_min_incidents)
+        
+        if hotspots is not None and len(hotspots) > 0:
+            # One polygon per hotspot, separated by None
+            polygon_lat, polygon_lon = [], []
+            for hull in hotspots['Hull']:
+                polygon_lon += [point[0] for point in hull] + [None]
+                polygon_lat += [point[1] for point in hull] + [None]
+            
+            fig = go.Figure()
+            fig.add_scattermapbox(
+                lat=polygon_lat,
+                lon=polygon_lon,
+                mode='lines',
+                fill='toself',
+                fillcolor='rgba(220, 20, 60, 0.25)',
+                line=dict(color='rgb(220, 20, 60)', width=1),
+                hoverinfo='skip'
+            )
+            fig.add_scattermapbox(
+                lat=hotspots['Latitude'],
+                lon=hotspots['Longitude'],
+                mode='markers',
+                marker=dict(
+                    size=np.log1p(hotspots['Victims']) * 4 + 6,
+                    color='rgb(139, 0, 0)',
+                    opacity=0.8
+                ),
+                text=[
+                    f"Incidents: {incidents}<br>Victims: {victims}"
+                    for incidents, victims in zip(hotspots['Incidents'], hotspots['Victims'])
+                ],
+                hoverinfo='text'
+            )
+            fig.update_layout(
+                mapbox_style=iomdata.MAP_STYLE,
+                mapbox=dict(
+                    center=dict(lat=hotspots['Latitude'].mean(), lon=hotspots['Longitude'].mean()),
+                    zoom=2,
+                    layers=iomdata.tile_layers()
+                ),
+                margin=dict(r=0, t=0, l=0, b=0),
+                height=500,
+                showlegend=False
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("Convex hull of each cluster; marker size follows the number of victims.")
+            
+            st.dataframe(
+                iomdata.decoded_columns(hotspots.drop(columns='Hull')).round({'Latitude': 3, 'Longitude': 3}).rename(columns={
+                    'Incidents': 'Incidents',
+                    'Victims': 'Victims',
+                    'Latitude': 'Latitude',
+                    'Longitude': 'Longitude',
+                    'Locations': 'Locations'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No hotspots found with these settings.")
+    
     # Analysis by region/country
     st.markdown("---")
     
@@ -351,7 +521,7 @@ with tab2:
         if 'Country of Incident' in df.columns:
             st.subheader("Incidents by Country")
             
-            incident_countries = df['Country of Incident'].value_counts().reset_index()
+            incident_countries = iomdata.section(dataset, filter_state, 'value_counts', 'Country of Incident').reset_index()
             incident_countries.columns = ['Country', 'Incidents']
             
             fig = px.choropleth(
@@ -363,17 +533,23 @@ with tab2:
                 title='Number of Incidents by Country',
                 height=400
             )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='country_chart',
+                on_select=lambda: store_chart_pick('country_chart', 'Country of Incident', 'location'),
+                selection_mode='points'
+            )
     
     with col2:
         if 'Migration Route' in df.columns:
             st.subheader("Most Common Migration Routes")
             
-            routes = df['Migration Route'].value_counts().reset_index()
+            routes = iomdata.section(dataset, filter_state, 'top_values', 'Migration Route', 10).reset_index()
             routes.columns = ['Route', 'Frequency']
             
             fig = px.bar(
-                routes.sort_values('Frequency', ascending=False).head(10),
+                routes,
                 x='Route',
                 y='Frequency',
                 color='Frequency',
@@ -381,7 +557,55 @@ with tab2:
                 title='Top 10 Migration Routes'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='route_chart',
+                on_select=lambda: store_chart_pick('route_chart', 'Migration Route', 'x'),
+                selection_mode='points'
+            )
+
+    # Flows from the region of origin to where the incident happened
+    if 'Region of Origin' in df.columns:
+        st.markdown("---")
+        st.subheader("Migration Flows")
+        
+        flow_destinations = {col: label for col, label in {'Region of Incident': "Region of incident", 'Country of Incident': "Country of incident"}.items() if col in df.columns}
+        if flow_destinations:
+            col1, col2 = st.columns(2)
+            flow_destination = col1.radio(
+                "Destination",
+                options=list(flow_destinations),
+                format_func=flow_destinations.get,
+                horizontal=True
+            )
+            flow_labels = {'Incidents': 'Incidents'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                flow_labels['Victims'] = 'Victims (dead and missing)'
+            flow_measure = col2.radio(
+                "Flow measure",
+                options=list(flow_labels),
+                format_func=flow_labels.get,
+                horizontal=True
+            )
+            flows = iomdata.section(dataset, filter_state, 'flows', 'Region of Origin', flow_destination)
+            flows = flows[flows[flow_measure] > 0].nlargest(25, flow_measure)
+            
+            if len(flows) > 0:
+                # Origins and destinations are separate nodes, so a region can be both
+                flow_origins = list(flows['Origin'].unique())
+                flow_targets = list(flows['Destination'].unique())
+                fig = go.Figure(go.Sankey(
+                    node=dict(label=flow_origins + flow_targets, pad=12, thickness=14),
+                    link=dict(
+                        source=flows['Origin'].map({name: i for i, name in enumerate(flow_origins)}),
+                        target=flows['Destination'].map({name: len(flow_origins) + i for i, name in enumerate(flow_targets)}),
+                        value=flows[flow_measure].round(2)
+                    )
+                ))
+                fig.update_layout(title=f"Top 25 Flows: {flow_labels[flow_measure]}", height=600)
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption("Incidents listing several regions of origin are split evenly between them.")
 
 with tab3:
     st.header("Demographic Analysis")
@@ -395,7 +619,7 @@ with tab3:
             
             total_gender = {
                 'Gender': ['Male', 'Female'],
-                'Total': [df['Number of Males'].sum(), df['Number of Females'].sum()]
+                'Total': [totals['Number of Males'], totals['Number of Females']]
             }
             
             fig = px.pie(
@@ -411,8 +635,8 @@ with tab3:
         with col2:
             st.subheader("Presence of Children")
             
-            total_children = df['Number of Children'].sum()
-            total_adults = df['Number of Males'].sum() + df['Number of Females'].sum() - total_children
+            total_children = totals['Number of Children']
+            total_adults = totals['Number of Males'] + totals['Number of Females'] - total_children
             
             age_data = {
                 'Category': ['Adults', 'Children'],
@@ -440,11 +664,11 @@ with tab3:
         if 'Country of Origin' in df.columns:
             st.subheader("Main Countries of Origin")
             
-            origin_countries = df['Country of Origin'].value_counts().reset_index()
+            origin_countries = iomdata.section(dataset, filter_state, 'top_values', 'Country of Origin', 10).reset_index()
             origin_countries.columns = ['Country of Origin', 'Count']
             
             fig = px.bar(
-                origin_countries.sort_values('Count', ascending=False).head(10),
+                origin_countries,
                 x='Country of Origin',
                 y='Count',
                 color='Count',
@@ -457,7 +681,7 @@ with tab3:
         if 'Region of Origin' in df.columns:
             st.subheader("Regions of Origin")
             
-            origin_regions = df['Region of Origin'].value_counts().reset_index()
+            origin_regions = iomdata.section(dataset, filter_state, 'value_counts', 'Region of Origin').reset_index()
             origin_regions.columns = ['Region of Origin', 'Count']
             
             fig = px.pie(
@@ -476,16 +700,8 @@ with tab3:
         
         # Calculate survival rate by incident type
         if 'Incident Type' in df.columns:
-            survival_rate = df.groupby('Incident Type').agg({
-                'Number of Survivors': 'sum',
-                'Total Number of Dead and Missing': 'sum'
-            }).reset_index()
-            
-            survival_rate['Total'] = survival_rate['Number of Survivors'] + survival_rate['Total Number of Dead and Missing']
-            survival_rate['Survival Rate (%)'] = (survival_rate['Number of Survivors'] / survival_rate['Total'] * 100).round(1)
-            
-            # Sort by rate and filter only types with more than 5 people involved
-            survival_rate = survival_rate[survival_rate['Total'] >= 5].sort_values('Survival Rate (%)', ascending=False)
+            # Highest first, only for types with at least 5 people involved
+            survival_rate = iomdata.section(dataset, filter_state, 'survival_rate').reset_index()
             
             fig = px.bar(
                 survival_rate,
@@ -506,21 +722,13 @@ with tab4:
     if 'Cause of Death' in df.columns:
         st.subheader("Main Causes of Death")
         
-        causes = df['Cause of Death'].value_counts().reset_index()
+        causes = iomdata.section(dataset, filter_state, 'top_values', 'Cause of Death', 10).reset_index()
         causes.columns = ['Cause', 'Count']
         
         # Create word cloud
         try:
-            wordcloud_data = dict(zip(causes['Cause'], causes['Count']))
-            
-            # Generate word cloud
-            wordcloud = WordCloud(
-                width=800,
-                height=400,
-                background_color='white',
-                colormap='Blues',
-                max_words=50
-            ).generate_from_frequencies(wordcloud_data)
+            # Generate word cloud (rendered once per filter state)
+            wordcloud = iomdata.section(dataset, filter_state, 'cause_wordcloud')
             
             # Display
             fig, ax = plt.subplots(figsize=(10, 5))
@@ -530,7 +738,7 @@ with tab4:
         except:
             # Fallback if wordcloud fails
             fig = px.pie(
-                causes.head(10),
+                causes,
                 values='Count',
                 names='Cause',
                 title='Top 10 Causes of Death'
@@ -538,56 +746,109 @@ with tab4:
             st.plotly_chart(fig, use_container_width=True)
     
     # Seasonal analysis (by month)
-    if 'Month' in df.columns:
+    if 'Month' in df.columns and 'Incident Year' in df.columns:
         st.markdown("---")
         st.subheader("Seasonal Pattern of Incidents")
         
-        # Convert month to numerical order for correct sorting
-        months_order = {month: i for i, month in enumerate(calendar.month_name[1:], 1)}
+        # Year x month matrix, merged from precomputed monthly counts per partition
+        seasonality = iomdata.section(dataset, filter_state, 'seasonality', 'Incidents')
         
-        # Check if months are as text
-        if df['Month'].dtype == 'object':
-            try:
-                # Try to map months to numbers
-                df_month = df.copy()
-                df_month['Month_Num'] = df_month['Month'].map(months_order)
-                
-                # Group by month
-                incidents_by_month = df_month.groupby('Month').size().reset_index(name='Incidents')
-                
-                # Add month number for sorting
-                incidents_by_month['Month_Num'] = incidents_by_month['Month'].map(months_order)
-                
-                # Sort by month
-                incidents_by_month = incidents_by_month.sort_values('Month_Num')
-                
-                # Chart
-                fig = px.line(
-                    incidents_by_month,
-                    x='Month',
-                    y='Incidents',
-                    markers=True,
-                    title='Incidents by Month'
+        if len(seasonality) > 0:
+            # Calendar months over all years
+            incidents_by_month = seasonality.sum().rename_axis('Month').reset_index(name='Incidents')
+            
+            # Chart
+            fig = px.line(
+                incidents_by_month,
+                x='Month',
+                y='Incidents',
+                markers=True,
+                title='Incidents by Month'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Year by month heatmap
+            season_labels = {'Incidents': 'Incidents'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                season_labels['Victims'] = 'Victims (dead and missing)'
+            season_measure = st.radio(
+                "Heatmap measure",
+                options=list(season_labels),
+                format_func=season_labels.get,
+                horizontal=True
+            )
+            season_matrix = iomdata.section(dataset, filter_state, 'seasonality', season_measure)
+            
+            fig = px.imshow(
+                season_matrix,
+                y=season_matrix.index.astype(str),
+                labels=dict(x='Month', y='Year', color=season_labels[season_measure]),
+                color_continuous_scale='Reds',
+                aspect='auto',
+                title=f"{season_labels[season_measure]} by Year and Month"
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+    
+    # Victims per incident, merged from per-partition value counts
+    if 'Total Number of Dead and Missing' in df.columns:
+        st.markdown("---")
+        st.subheader("Victims per Incident")
+        
+        distribution = iomdata.section(dataset, filter_state, 'distribution', 'Total Number of Dead and Missing', None)
+        if len(distribution) > 0:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Median", f"{distribution['Median'].iloc[0]:,.0f}")
+            col2.metric("90th percentile", f"{distribution['P90'].iloc[0]:,.0f}")
+            col3.metric("99th percentile", f"{distribution['P99'].iloc[0]:,.0f}")
+            col4.metric("Largest incident", f"{distribution['Max'].iloc[0]:,.0f}")
+            
+            histogram = iomdata.section(dataset, filter_state, 'histogram', 'Total Number of Dead and Missing', iomdata.VICTIM_BUCKETS).reset_index()
+            histogram.columns = ['Victims', 'Incidents']
+            
+            fig = px.bar(
+                histogram,
+                x='Victims',
+                y='Incidents',
+                log_y=True,
+                color_discrete_sequence=['#1f77b4'],
+                title='Incidents by Number of Victims'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            breakdown_labels = {'Region of Incident': "Region", 'Migration Route': "Route"}
+            breakdown_by = st.radio(
+                "Breakdown by",
+                options=[col for col in breakdown_labels if col in df.columns],
+                format_func=breakdown_labels.get,
+                horizontal=True
+            )
+            if breakdown_by is not None:
+                breakdown = iomdata.section(dataset, filter_state, 'distribution', 'Total Number of Dead and Missing', breakdown_by)
+                st.dataframe(
+                    iomdata.decoded_columns(breakdown).round(1).rename(columns={
+                        breakdown_by: breakdown_labels[breakdown_by],
+                        'Incidents': 'Incidents',
+                        'Mean': 'Mean',
+                        'Median': 'Median',
+                        'P90': 'P90',
+                        'P99': 'P99',
+                        'Max': 'Max'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
                 )
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-            except:
-                st.warning("Could not create the seasonality chart due to issues with the month format.")
     
     # Correlations between numerical variables
     st.markdown("---")
     st.subheader("Variable Correlations")
     
-    # Select only numerical columns for correlation
-    num_cols = df.select_dtypes(include=['number']).columns.tolist()
+    # Correlation of numerical columns, without latitude and longitude
+    corr = iomdata.section(dataset, filter_state, 'correlation')
     
-    # Remove latitude and longitude to not distort the correlation
-    num_cols = [col for col in num_cols if col.upper() not in ['LATITUDE', 'LONGITUDE']]
-    
-    if len(num_cols) >= 3:
-        # Calculate correlation matrix
-        corr = df[num_cols].corr()
-        
+    if corr is not None:
         # Create heatmap
         fig = px.imshow(
             corr,
@@ -603,12 +864,26 @@ with tab4:
     st.markdown("---")
     st.subheader("Individual Data Exploration")
     
-    # Allow user to select specific records
-    n_records = min(10, len(df))
-    show_records = st.slider("Number of records to show", 1, min(50, len(df)), n_records)
+    # Filtered rows are paged in sort order; only the visible page is sent to the browser
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        search_text = st.text_input("Search", placeholder="Keywords in location, cause of death or source")
+    with col2:
+        sort_column = st.selectbox(
+            "Sort by",
+            options=[None] + list(df.columns),
+            format_func=lambda column: "Table order" if column is None else column
+        )
+    with col3:
+        sort_ascending = st.radio("Order", options=[True, False], format_func=lambda ascending: "Ascending" if ascending else "Descending")
+    with col4:
+        page_size = st.selectbox("Rows per page", options=[10, 25, 50, 100], index=1)
     
-    # Display data
-    st.dataframe(df.head(show_records))
+    row_order = iomdata.section(dataset, filter_state, 'row_order', sort_column, sort_ascending, search_text.strip() or None)
+    page_count = max(1, -(-len(row_order) // page_size))
+    page_number = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1, step=1)
+    st.caption(f"{len(row_order):,} records")
+    st.dataframe(dataset.page(row_order, page_number - 1, page_size))
     
     # Option to download filtered data
     st.download_button(
@@ -5,10 +5,9 @@ import plotly.express  as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import seaborn as sns
-import calendar
 from datetime import datetime
 import pycountry
-from wordcloud import WordCloud
+import iomdata
 
 # Настройка страницы
 st.set_page_config(
@@ -18,6 +17,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Фоновый прогрев набора данных по умолчанию и популярных фильтров
+iomdata.start_warmup()
+
 # Заголовок и описание
 st.title("Панель мониторинга анализа миграционных инцидентов")
 st.markdown("""
@@ -25,46 +27,56 @@ st.markdown("""
 о закономерностях, тенденциях и статистике, связанной с этими происшествиями по всему миру.
 """)
 
-# Функция для загрузки данных
-@st.cache_data
-def загрузить_данные(файл=None):
-    if файл is not None:
-        try:
-            # Проверка расширения файла
-            if файл.name.endswith('.csv'):
-                df = pd.read_csv(файл)
-            else:
-                df = pd.read_excel(файл)
-            return df, None
-        except Exception as e:
-            return None, str(e)
-    else:
-        # Создание примера DataFrame со структурой, аналогичной реальным данным
-        # (только для демонстрации, когда нет загрузки)
-        data = {
-            'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
-            'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
-            'Incident Type': ['Кораблекрушение', 'Автомобильная авария', 'Обезвоживание', 'Насилие', 'Утопление', 'Переохлаждение'],
-            'Region of Incident': ['Северная Америка', 'Северная Америка', 'Северная Америка', 'Северная Америка', 'Европа', 'Северная Америка'],
-            'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
-            'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
-            'Month': ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь'],
-            'Number of Dead': [12, 5, 3, 8, 15, 2],
-            'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
-            'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
-            'Number of Survivors': [8, 12, 5, 3, 2, 4],
-            'Number of Females': [6, 7, 2, 5, 8, 1],
-            'Number of Males': [14, 10, 6, 7, 14, 5],
-            'Number of Children': [3, 4, 1, 2, 7, 0],
-            'Country of Origin': ['Гватемала', 'Мексика', 'Гондурас', 'Эль-Сальвадор', 'Сирия', 'Мексика'],
-            'Region of Origin': ['Центральная Америка', 'Северная Америка', 'Центральная Америка', 'Центральная Америка', 'Ближний Восток', 'Северная Америка'],
-            'Cause of Death': ['Утопление', 'Травма', 'Обезвоживание', 'Насилие', 'Утопление', 'Воздействие окружающей среды'],
-            'Country of Incident': ['Соединенные Штаты', 'Соединенные Штаты', 'Соединенные Штаты', 'Соединенные Штаты', 'Финляндия', 'Соединенные Штаты'],
-            'Migration Route': ['Мексика в США', 'Мексика в США', 'Центральная Америка в США', 'Центральная Америка в США', 'Ближний Восток в Европу', 'Мексика в США'],
-            'Location of Incident': ['Пустыня', 'Шоссе', 'Пустыня', 'Граница', 'Море', 'Горы']
-        }
-        df = pd.DataFrame(data)
-        return df, None
+# Функция для загрузки набора данных, показываемого без загрузки файла
+@st.cache_resource
+def загрузить_данные():
+    # Встроенный набор данных, уже загруженный прогревом, если он доступен
+    набор_данных = iomdata.default_dataset()
+    if набор_данных is not None:
+        return набор_данных
+
+    # Создание примера DataFrame со структурой, аналогичной реальным данным
+    # (только для демонстрации, когда нет загрузки)
+    data = {
+        'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
+        'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
+        'Incident Type': ['Кораблекрушение', 'Автомобильная авария', 'Обезвоживание', 'Насилие', 'Утопление', 'Переохлаждение'],
+        'Region of Incident': ['Северная Америка', 'Северная Америка', 'Северная Америка', 'Северная Америка', 'Европа', 'Северная Америка'],
+        'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
+        'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
+        'Month': ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь'],
+        'Number of Dead': [12, 5, 3, 8, 15, 2],
+        'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
+        'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
+        'Number of Survivors': [8, 12, 5, 3, 2, 4],
+        'Number of Females': [6, 7, 2, 5, 8, 1],
+        'Number of Males': [14, 10, 6, 7, 14, 5],
+        'Number of Children': [3, 4, 1, 2, 7, 0],
+        'Country of Origin': ['Гватемала', 'Мексика', 'Гондурас', 'Эль-Сальвадор', 'Сирия', 'Мексика'],
+        'Region of Origin': ['Центральная Америка', 'Северная Америка', 'Центральная Америка', 'Центральная Америка', 'Ближний Восток', 'Северная Америка'],
+        'Cause of Death': ['Утопление', 'Травма', 'Обезвоживание', 'Насилие', 'Утопление', 'Воздействие окружающей среды'],
+        'Country of Incident': ['Соединенные Штаты', 'Соединенные Штаты', 'Соединенные Штаты', 'Соединенные Штаты', 'Финляндия', 'Соединенные Штаты'],
+        'Migration Route': ['Мексика в США', 'Мексика в США', 'Центральная Америка в США', 'Центральная Америка в США', 'Ближний Восток в Европу', 'Мексика в США'],
+        'Location of Incident': ['Пустыня', 'Шоссе', 'Пустыня', 'Граница', 'Море', 'Горы']
+    }
+    return iomdata.Dataset.from_frame(pd.DataFrame(data), 'пример', sample=True)
+
+# Этапы фоновой обработки загруженного файла для индикатора выполнения
+ЭТАПЫ_ОБРАБОТКИ = {
+    'queued': "Ожидание обработки",
+    'parsing': "Чтение",
+    'normalizing': "Нормализация",
+    'indexing': "Индексация",
+}
+
+# Ход обработки загрузки, обновляется каждую секунду
+@st.fragment(run_every=1)
+def показать_ход_обработки(обработка):
+    if обработка.done:
+        # Переключить всю панель на новый набор данных за один раз
+        st.rerun()
+    st.progress(обработка.progress, text=f"⏳ {ЭТАПЫ_ОБРАБОТКИ[обработка.stage]}: {обработка.name}...")
+    st.caption("Панель показывает текущие данные, пока файл не будет готов.")
 
 # Опция для загрузки файла
 st.sidebar.header("📊 Данные")
@@ -72,37 +84,42 @@ uploaded_file = st.sidebar.file_uploader("Загрузить файл с дан
 
 # Загрузка данных
 if uploaded_file is not None:
-    df, ошибка = загрузить_данные(uploaded_file)
-    if ошибка:
-        st.error(f"Ошибка при загрузке файла: {ошибка}")
+    # Файлы обрабатываются в фоне; одинаковые файлы используют одну обработку
+    if st.session_state.get('файл_обработки') != uploaded_file.file_id:
+        st.session_state['файл_обработки'] = uploaded_file.file_id
+        st.session_state['обработка'] = iomdata.ingest(uploaded_file.getvalue(), uploaded_file.name)
+    обработка = st.session_state['обработка']
+    if обработка.error:
+        st.error(f"Ошибка при загрузке файла: {обработка.error}")
         st.stop()
-    else:
+    elif обработка.done:
+        набор_данных = обработка.dataset
         st.sidebar.success("✅ Данные успешно загружены!")
+    else:
+        # Предыдущий набор данных, пока загрузка не готова
+        набор_данных = st.session_state['аренда_набора_данных'].dataset if 'аренда_набора_данных' in st.session_state else загрузить_данные()
+        with st.sidebar:
+            показать_ход_обработки(обработка)
 else:
-    df, _ = загрузить_данные()
-    st.sidebar.warning("⚠️ Использование примера данных. Загрузите свой файл для реального анализа.")
-
-# Конвертация Incident Date в datetime, если необходимо
-if 'Incident Date' in df.columns:
-    try:
-        df['Incident Date'] = pd.to_datetime(df['Incident Date'])
-    except:
-        pass
-
-# Проверка и заполнение пустых значений в числовых полях
-числовые_колонки = [
-    'Number of Dead', 'Minimum Estimated Number of Missing', 
-    'Total Number of Dead and Missing', 'Number of Survivors',
-    'Number of Females', 'Number of Males', 'Number of Children'
-]
-
-for col in числовые_колонки:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        df[col] = df[col].fillna(0)
+    # Забыть завершённую обработку, чтобы удалённую загрузку можно было освободить
+    st.session_state.pop('обработка', None)
+    st.session_state.pop('файл_обработки', None)
+    набор_данных = загрузить_данные()
+    if набор_данных.sample:
+        st.sidebar.warning("⚠️ Использование примера данных. Загрузите свой файл для реального анализа.")
+    else:
+        st.sidebar.info(f"ℹ️ Используется встроенный набор данных ({набор_данных.name}). Загрузите свой файл для анализа других данных.")
+
+# Удерживать показанный набор данных, пока он нужен этой сессии; неиспользуемые загрузки освобождаются
+if 'аренда_набора_данных' not in st.session_state or st.session_state['аренда_набора_данных'].dataset is not набор_данных:
+    st.session_state['аренда_набора_данных'] = iomdata.lease(набор_данных)
+
+# Даты и числовые поля уже нормализованы при загрузке набора данных
+df = набор_данных.frame
 
 # Боковая панель для фильтров
 st.sidebar.header("🔍 Фильтры")
+состояние_фильтров = iomdata.FilterState()
 
 # Фильтр по периоду
 if 'Incident Year' in df.columns:
@@ -113,8 +130,21 @@ if 'Incident Year' in df.columns:
             options=доступные_годы,
             default=доступные_годы
         )
-        if выбранный_год:
-            df = df[df['Incident Year'].isin(выбранный_год)]
+        состояние_фильтров = состояние_фильтров.replace(years=iomdata.selection(выбранный_год, доступные_годы))
+        df = набор_данных.filtered(состояние_фильтров)
+
+# Фильтр по диапазону дат, использующий двоичный поиск по индексу дат
+границы_дат = набор_данных.date_bounds()
+if границы_дат is not None and границы_дат[0] < границы_дат[1]:
+    выбранные_даты = st.sidebar.slider(
+        "Дата инцидента",
+        min_value=границы_дат[0],
+        max_value=границы_дат[1],
+        value=границы_дат,
+        format="DD.MM.YYYY"
+    )
+    состояние_фильтров = состояние_фильтров.replace(dates=iomdata.date_window(выбранные_даты, границы_дат))
+    df = набор_данных.filtered(состояние_фильтров)
 
 # Фильтр по региону
 if 'Region of Incident' in df.columns:
@@ -125,8 +155,8 @@ if 'Region of Incident' in df.columns:
             options=доступные_регионы,
             default=доступные_регионы
         )
-        if выбранный_регион:
-            df = df[df['Region of Incident'].isin(выбранный_регион)]
+        состояние_фильтров = состояние_фильтров.replace(regions=iomdata.selection(выбранный_регион, доступные_регионы))
+        df = набор_данных.filtered(состояние_фильтров)
 
 # Фильтр по типу инцидента
 if 'Incident Type' in df.columns:
@@ -137,14 +167,68 @@ if 'Incident Type' in df.columns:
             options=доступные_типы,
             default=доступные_типы
         )
-        if выбранный_тип:
-            df = df[df['Incident Type'].isin(выбранный_тип)]
+        состояние_фильтров = состояние_фильтров.replace(types=iomdata.selection(выбранный_тип, доступные_типы))
+        df = набор_данных.filtered(состояние_фильтров)
+
+# Область, выделенная на карте, служит фильтром для всей панели
+def сохранить_выделение_карты():
+    st.session_state['map_bounds'] = iomdata.selection_bounds(st.session_state['карта_инцидентов'].selection.points)
+
+def сбросить_выделение_карты():
+    st.session_state['map_bounds'] = None
+
+# Фильтр по близости к месту, использующий пространственный индекс
+if набор_данных.spatial_index is not None:
+    with st.sidebar.expander("📍 Рядом с местом"):
+        своё_место = "Свои координаты"
+        место = st.selectbox(
+            "Опорная точка",
+            options=[None] + list(iomdata.PLACES) + [своё_место],
+            format_func=lambda option: "Где угодно" if option is None else option
+        )
+        if место is not None:
+            if место == своё_место:
+                широта_места = st.number_input("Широта", min_value=-90.0, max_value=90.0, value=0.0)
+                долгота_места = st.number_input("Долгота", min_value=-180.0, max_value=180.0, value=0.0)
+            else:
+                широта_места, долгота_места = iomdata.PLACES[место]
+            радиус_км = st.slider("Радиус (км)", 5, 1000, 50, step=5)
+            состояние_фильтров = состояние_фильтров.replace(near=(широта_места, долгота_места, float(радиус_км)))
+            df = набор_данных.filtered(состояние_фильтров)
+
+    # Область, выделенная на карте (рамкой или лассо во вкладке «Географический анализ»)
+    if st.session_state.get('map_bounds') is not None:
+        состояние_фильтров = состояние_фильтров.replace(bounds=st.session_state['map_bounds'])
+        df = набор_данных.filtered(состояние_фильтров)
+        st.sidebar.caption("🗺️ Отфильтровано по области, выделенной на карте")
+        st.sidebar.button("Сбросить выделение на карте", on_click=сбросить_выделение_карты)
+
+# Значения, выбранные щелчком на графиках (столбцы или страны), фильтруют всю панель
+def сохранить_выбор_графика(график, столбец, поле):
+    выбор = dict(st.session_state.get('chart_picks') or {})
+    выбор[столбец] = iomdata.picked(st.session_state[график].selection.points, поле)
+    st.session_state['chart_picks'] = выбор
+
+def сбросить_выбор_графиков():
+    st.session_state['chart_picks'] = {}
+
+выбор_на_графиках = iomdata.chart_picks(st.session_state.get('chart_picks'))
+if выбор_на_графиках is not None:
+    состояние_фильтров = состояние_фильтров.replace(picks=выбор_на_графиках)
+    df = набор_данных.filtered(состояние_фильтров)
+    подписи_выбора = {'Incident Type': "Тип инцидента", 'Migration Route': "Маршрут", 'Country of Incident': "Страна"}
+    for столбец, значения in выбор_на_графиках:
+        st.sidebar.caption(f"🖱️ {подписи_выбора.get(столбец, столбец)}: {', '.join(map(str, значения))}")
+    st.sidebar.button("Сбросить выбор на графиках", on_click=сбросить_выбор_графиков)
 
 # Проверка наличия данных после фильтрации
 if len(df) == 0:
     st.warning("Нет доступных данных для выбранных фильтров.")
     st.stop()
 
+# Запоминаем использованные фильтры, чтобы следующий прогрев их рассчитал
+iomdata.record_usage(состояние_фильтров, st.session_state)
+
 # Разделение панели мониторинга на секции
 tab1, tab2, tab3, tab4 = st.tabs(["📈 Общий обзор", "🗺️ Географический анализ", "👥 Демография", "📊 Детальный анализ"])
 
@@ -153,6 +237,7 @@ with tab1:
     
     # Основные KPI
     col1, col2, col3, col4 = st.columns(4)
+    итоги = iomdata.section(набор_данных, состояние_фильтров, 'column_sums')
     
     with col1:
         общее_число_инцидентов = len(df)
@@ -160,17 +245,17 @@ with tab1:
     
     with col2:
         if 'Total Number of Dead and Missing' in df.columns:
-            общее_число_погибших_пропавших = int(df['Total Number of Dead and Missing'].sum())
+            общее_число_погибших_пропавших = int(итоги['Total Number of Dead and Missing'])
             st.metric("Всего жертв", f"{общее_число_погибших_пропавших:,}")
     
     with col3:
         if 'Number of Survivors' in df.columns:
-            общее_число_выживших = int(df['Number of Survivors'].sum())
+            общее_число_выживших = int(итоги['Number of Survivors'])
             st.metric("Всего выживших", f"{общее_число_выживших:,}")
     
     with col4:
         if 'Number of Children' in df.columns:
-            общее_число_детей = int(df['Number of Children'].sum())
+            общее_число_детей = int(итоги['Number of Children'])
             st.metric("Пострадавших детей", f"{общее_число_детей:,}")
     
     st.markdown("---")
@@ -179,29 +264,36 @@ with tab1:
     if 'Incident Date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Incident Date']):
         st.subheader("Тенденция инцидентов во времени")
         
-        # Группировка по месяцам
-        df_время = df.copy()
-        df_время['Месяц'] = df_время['Incident Date'].dt.to_period('M')
-        инциденты_по_месяцам = df_время.groupby('Месяц').size().reset_index(name='Инциденты')
-        инциденты_по_месяцам['Месяц'] = инциденты_по_месяцам['Месяц'].astype(str)
-        
-        # Погибшие и пропавшие по месяцам
+        # Погибшие и пропавшие во времени
         if 'Total Number of Dead and Missing' in df.columns:
-            жертвы_по_месяцам = df_время.groupby('Месяц')['Total Number of Dead and Missing'].sum().reset_index()
-            жертвы_по_месяцам['Месяц'] = жертвы_по_месяцам['Месяц'].astype(str)
+            подписи_детализации = {'day': 'День', 'week': 'Неделя', 'month': 'Месяц', 'quarter': 'Квартал', 'year': 'Год'}
+            детализация = st.radio(
+                "Детализация",
+                options=list(подписи_детализации),
+                index=2,
+                format_func=подписи_детализации.get,
+                horizontal=True
+            )
+            
+            # Ряд агрегируется из предварительно рассчитанных дневных значений
+            тенденция = iomdata.section(набор_данных, состояние_фильтров, 'trend', детализация)
+            
+            # Ограничение числа точек, отправляемых в браузер, с сохранением пиков
+            точки_инцидентов = iomdata.downsample(тенденция['Incidents'])
+            точки_жертв = iomdata.downsample(тенденция['Victims'])
             
             # Комбинированный линейный график
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=инциденты_по_месяцам['Месяц'],
-                y=инциденты_по_месяцам['Инциденты'],
+            fig.add_trace(iomdata.scatter_type(len(точки_инцидентов))(
+                x=точки_инцидентов.index,
+                y=точки_инцидентов,
                 name='Количество инцидентов',
                 line=dict(color='blue', width=2)
             ))
             
-            fig.add_trace(go.Scatter(
-                x=жертвы_по_месяцам['Месяц'],
-                y=жертвы_по_месяцам['Total Number of Dead and Missing'],
+            fig.add_trace(iomdata.scatter_type(len(точки_жертв))(
+                x=точки_жертв.index,
+                y=точки_жертв,
                 name='Жертвы (погибшие и пропавшие)',
                 line=dict(color='red', width=2),
                 yaxis='y2'
@@ -209,7 +301,7 @@ with tab1:
             
             fig.update_layout(
                 title='Динамика инцидентов и жертв во времени',
-                xaxis=dict(title='Месяц'),
+                xaxis=dict(title=подписи_детализации[детализация]),
                 yaxis=dict(title='Количество инцидентов', showgrid=False),
                 yaxis2=dict(title='Количество жертв', overlaying='y', side='right', showgrid=False),
                 legend=dict(x=0.01, y=0.99),
@@ -225,11 +317,11 @@ with tab1:
         with col1:
             st.subheader("Инциденты по типу")
             
-            инциденты_по_типу = df['Incident Type'].value_counts().reset_index()
+            инциденты_по_типу = iomdata.section(набор_данных, состояние_фильтров, 'top_values', 'Incident Type', 10).reset_index()
             инциденты_по_типу.columns = ['Тип инцидента', 'Количество']
             
             fig = px.bar(
-                инциденты_по_типу.sort_values('Количество', ascending=False).head(10),
+                инциденты_по_типу,
                 x='Тип инцидента',
                 y='Количество',
                 color='Количество',
@@ -237,13 +329,19 @@ with tab1:
                 title='Топ-10 типов инцидентов'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='график_типов',
+                on_select=lambda: сохранить_выбор_графика('график_типов', 'Incident Type', 'x'),
+                selection_mode='points'
+            )
         
         with col2:
             st.subheader("Жертвы по типу инцидента")
             
             if 'Total Number of Dead and Missing' in df.columns:
-                жертвы_по_типу = df.groupby('Incident Type')['Total Number of Dead and Missing'].sum().reset_index()
+                жертвы_по_типу = iomdata.section(набор_данных, состояние_фильтров, 'group_sum', 'Incident Type', 'Total Number of Dead and Missing').reset_index()
                 жертвы_по_типу.columns = ['Тип инцидента', 'Всего жертв']
                 
                 fig = px.pie(
@@ -280,68 +378,140 @@ with tab2:
             else:
                 df_map['marker_size'] = 5
             
-            # Добавление текста для наведения
-            hover_text = []
-            for idx, row in df_map.iterrows():
-                текст = f"Место: {row.get('Location of Incident', 'N/A')}<br>"
-                if 'Incident Type' in df_map.columns:
-                    текст += f"Тип: {row['Incident Type']}<br>"
-                if 'Incident Date' in df_map.columns:
-                    дата = row['Incident Date']
-                    if pd.api.types.is_datetime64_any_dtype(дата):
-                        текст += f"Дата: {дата.strftime('%d/%m/%Y')}<br>"
-                    else:
-                        текст += f"Дата: {дата}<br>"
-                if 'Total Number of Dead and Missing' in df_map.columns:
-                    текст += f"Жертвы: {int(row['Total Number of Dead and Missing'])}"
-                hover_text.append(текст)
+            # Поля подсказки; выше компактного порога подписи отправляются один раз
+            hover_fields = {'Место': df_map['Location of Incident'] if 'Location of Incident' in df_map.columns else 'N/A'}
+            if 'Incident Type' in df_map.columns:
+                hover_fields['Тип'] = df_map['Incident Type']
+            if 'Incident Date' in df_map.columns:
+                hover_fields['Дата'] = df_map['Incident Date']
+            if 'Total Number of Dead and Missing' in df_map.columns:
+                hover_fields['Жертвы'] = df_map['Total Number of Dead and Missing'].fillna(0).astype(int)
             
             # Создание карты плотности
             fig = go.Figure()
             
-            # Добавление тепловой карты
-            fig.add_densitymapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
-                z=df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))),
-                radius=20,
-                colorscale='Reds',
-                colorbar=dict(title='Интенсивность'),
-                hoverinfo='none',
-                opacity=0.7
-            )
+            # Добавление тепловой карты, если её не отрисовывает сервер тайлов
+            if not iomdata.serves_tiles(набор_данных):
+                fig.add_densitymapbox(
+                    lat=iomdata.quantize(df_map['LATITUDE']),
+                    lon=iomdata.quantize(df_map['LONGITUDE']),
+                    z=iomdata.quantize(df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))), 0),
+                    radius=20,
+                    colorscale='Reds',
+                    colorbar=dict(title='Интенсивность'),
+                    hoverinfo='none',
+                    opacity=0.7
+                )
             
             # Добавление отдельных точек
             fig.add_scattermapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
+                lat=iomdata.quantize(df_map['LATITUDE']),
+                lon=iomdata.quantize(df_map['LONGITUDE']),
                 mode='markers',
                 marker=dict(
-                    size=df_map['marker_size'],
+                    size=iomdata.quantize(df_map['marker_size'], 1),
                     color='rgb(220, 20, 60)',
                     opacity=0.7
                 ),
-                text=hover_text,
-                hoverinfo='text'
+                **iomdata.hover(hover_fields, len(df_map))
             )
             
             # Настройка макета карты
             fig.update_layout(
-                mapbox_style="carto-positron",
+                mapbox_style=iomdata.MAP_STYLE,
                 mapbox=dict(
                     center=dict(lat=df_map['LATITUDE'].mean(), lon=df_map['LONGITUDE'].mean()),
-                    zoom=2
+                    zoom=2,
+                    layers=iomdata.tile_layers(набор_данных, состояние_фильтров)
                 ),
                 margin=dict(r=0, t=0, l=0, b=0),
                 height=500
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='карта_инцидентов',
+                on_select=сохранить_выделение_карты,
+                selection_mode=('box', 'lasso')
+            )
         else:
             st.warning("Нет действительных координат для отображения на карте.")
     else:
         st.warning("Столбцы широты и долготы не найдены в данных.")
     
+    # Очаги: скопления близких друг к другу инцидентов
+    st.subheader("Очаги инцидентов")
+    
+    if 'LATITUDE' in df.columns and 'LONGITUDE' in df.columns:
+        col1, col2 = st.columns(2)
+        with col1:
+            радиус_очага = st.slider("Радиус скопления (км)", 5, 200, 25, step=5)
+        with col2:
+            мин_инцидентов_очага = st.slider("Минимум инцидентов в очаге", 2, 50, 10)
+        
+        очаги = iomdata.section(набор_данных, состояние_фильтров, 'hotspots', float(радиус_очага), мин_инцидентов_очага)
+        
+        if очаги is not None and len(очаги) > 0:
+            # По одному многоугольнику на очаг, разделённых None
+            широты_многоугольников, долготы_многоугольников = [], []
+            for оболочка in очаги['Hull']:
+                долготы_многоугольников += [point[0] for point in оболочка] + [None]
+                широты_многоугольников += [point[1] for point in оболочка] + [None]
+            
+            fig = go.Figure()
+            fig.add_scattermapbox(
+                lat=широты_многоугольников,
+                lon=долготы_многоугольников,
+                mode='lines',
+                fill='toself',
+                fillcolor='rgba(220, 20, 60, 0.25)',
+                line=dict(color='rgb(220, 20, 60)', width=1),
+                hoverinfo='skip'
+            )
+            fig.add_scattermapbox(
+                lat=очаги['Latitude'],
+                lon=очаги['Longitude'],
+                mode='markers',
+                marker=dict(
+                    size=np.log1p(очаги['Victims']) * 4 + 6,
+                    color='rgb(139, 0, 0)',
+                    opacity=0.8
+                ),
+                text=[
+                    f"Инциденты: {incidents}<br>Жертвы: {victims}"
+                    for incidents, victims in zip(очаги['Incidents'], очаги['Victims'])
+                ],
+                hoverinfo='text'
+            )
+            fig.update_layout(
+                mapbox_style=iomdata.MAP_STYLE,
+                mapbox=dict(
+                    center=dict(lat=очаги['Latitude'].mean(), lon=очаги['Longitude'].mean()),
+                    zoom=2,
+                    layers=iomdata.tile_layers()
+                ),
+                margin=dict(r=0, t=0, l=0, b=0),
+                height=500,
+                showlegend=False
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("Выпуклая оболочка каждого скопления; размер маркера зависит от числа жертв.")
+            
+            st.dataframe(
+                iomdata.decoded_columns(очаги.drop(columns='Hull')).round({'Latitude': 3, 'Longitude': 3}).rename(columns={
+                    'Incidents': 'Инциденты',
+                    'Victims': 'Жертвы',
+                    'Latitude': 'Широта',
+                    'Longitude': 'Долгота',
+                    'Locations': 'Места'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("С этими параметрами очаги не найдены.")
+    
     # Анализ по региону/стране
     st.markdown("---")
     
@@ -351,7 +521,7 @@ with tab2:
         if 'Country of Incident' in df.columns:
             st.subheader("Инциденты по странам")
             
-            страны_инциденты = df['Country of Incident'].value_counts().reset_index()
+            страны_инциденты = iomdata.section(набор_данных, состояние_фильтров, 'value_counts', 'Country of Incident').reset_index()
             страны_инциденты.columns = ['Страна', 'Инциденты']
             
             fig = px.choropleth(
@@ -363,17 +533,23 @@ with tab2:
                 title='Количество инцидентов по странам',
                 height=400
             )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='график_стран',
+                on_select=lambda: сохранить_выбор_графика('график_стран', 'Country of Incident', 'location'),
+                selection_mode='points'
+            )
     
     with col2:
         if 'Migration Route' in df.columns:
             st.subheader("Наиболее распространенные миграционные маршруты")
             
-            маршруты = df['Migration Route'].value_counts().reset_index()
+            маршруты = iomdata.section(набор_данных, состояние_фильтров, 'top_values', 'Migration Route', 10).reset_index()
             маршруты.columns = ['Маршрут', 'Частота']
             
             fig = px.bar(
-                маршруты.sort_values('Частота', ascending=False).head(10),
+                маршруты,
                 x='Маршрут',
                 y='Частота',
                 color='Частота',
@@ -381,7 +557,55 @@ with tab2:
                 title='Топ-10 миграционных маршрутов'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='график_маршрутов',
+                on_select=lambda: сохранить_выбор_графика('график_маршрутов', 'Migration Route', 'x'),
+                selection_mode='points'
+            )
+
+    # Потоки из региона происхождения туда, где произошёл инцидент
+    if 'Region of Origin' in df.columns:
+        st.markdown("---")
+        st.subheader("Миграционные потоки")
+        
+        назначения_потока = {col: label for col, label in {'Region of Incident': "Регион инцидента", 'Country of Incident': "Страна инцидента"}.items() if col in df.columns}
+        if назначения_потока:
+            col1, col2 = st.columns(2)
+            назначение_потока = col1.radio(
+                "Назначение",
+                options=list(назначения_потока),
+                format_func=назначения_потока.get,
+                horizontal=True
+            )
+            подписи_потока = {'Incidents': 'Инциденты'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                подписи_потока['Victims'] = 'Жертвы (погибшие и пропавшие)'
+            показатель_потока = col2.radio(
+                "Показатель потока",
+                options=list(подписи_потока),
+                format_func=подписи_потока.get,
+                horizontal=True
+            )
+            потоки = iomdata.section(набор_данных, состояние_фильтров, 'flows', 'Region of Origin', назначение_потока)
+            потоки = потоки[потоки[показатель_потока] > 0].nlargest(25, показатель_потока)
+            
+            if len(потоки) > 0:
+                # Происхождение и назначение — отдельные узлы, поэтому регион может быть и тем, и другим
+                источники_потока = list(потоки['Origin'].unique())
+                цели_потока = list(потоки['Destination'].unique())
+                fig = go.Figure(go.Sankey(
+                    node=dict(label=источники_потока + цели_потока, pad=12, thickness=14),
+                    link=dict(
+                        source=потоки['Origin'].map({name: i for i, name in enumerate(источники_потока)}),
+                        target=потоки['Destination'].map({name: len(источники_потока) + i for i, name in enumerate(цели_потока)}),
+                        value=потоки[показатель_потока].round(2)
+                    )
+                ))
+                fig.update_layout(title=f"Топ-25 потоков: {подписи_потока[показатель_потока]}", height=600)
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption("Инциденты с несколькими регионами происхождения делятся поровну между ними.")
 
 with tab3:
     st.header("Демографический анализ")
@@ -395,7 +619,7 @@ with tab3:
             
             общий_пол = {
                 'Пол': ['Мужской', 'Женский'],
-                'Всего': [df['Number of Males'].sum(), df['Number of Females'].sum()]
+                'Всего': [итоги['Number of Males'], итоги['Number of Females']]
             }
             
             fig = px.pie(
@@ -411,8 +635,8 @@ with tab3:
         with col2:
             st.subheader("Присутствие детей")
             
-            всего_детей = df['Number of Children'].sum()
-            всего_взрослых = df['Number of Males'].sum() + df['Number of Females'].sum() - всего_детей
+            всего_детей = итоги['Number of Children']
+            всего_взрослых = итоги['Number of Males'] + итоги['Number of Females'] - всего_детей
             
             данные_возраст = {
                 'Категория': ['Взрослые', 'Дети'],
@@ -440,11 +664,11 @@ with tab3:
         if 'Country of Origin' in df.columns:
             st.subheader("Основные страны происхождения")
             
-            страны_происхождения = df['Country of Origin'].value_counts().reset_index()
+            страны_происхождения = iomdata.section(набор_данных, состояние_фильтров, 'top_values', 'Country of Origin', 10).reset_index()
             страны_происхождения.columns = ['Страна происхождения', 'Количество']
             
             fig = px.bar(
-                страны_происхождения.sort_values('Количество', ascending=False).head(10),
+                страны_происхождения,
                 x='Страна происхождения',
                 y='Количество',
                 color='Количество',
@@ -457,7 +681,7 @@ with tab3:
         if 'Region of Origin' in df.columns:
             st.subheader("Регионы происхождения")
             
-            регионы_происхождения = df['Region of Origin'].value_counts().reset_index()
+            регионы_происхождения = iomdata.section(набор_данных, состояние_фильтров, 'value_counts', 'Region of Origin').reset_index()
             регионы_происхождения.columns = ['Регион происхождения', 'Количество']
             
             fig = px.pie(
@@ -476,16 +700,8 @@ with tab3:
         
         # Расчет уровня выживаемости по типу инцидента
         if 'Incident Type' in df.columns:
-            уровень_выживаемости = df.groupby('Incident Type').agg({
-                'Number of Survivors': 'sum',
-                'Total Number of Dead and Missing': 'sum'
-            }).reset_index()
-            
-            уровень_выживаемости['Всего'] = уровень_выживаемости['Number of Survivors'] + уровень_выживаемости['Total Number of Dead and Missing']
-            уровень_выживаемости['Уровень выживаемости (%)'] = (уровень_выживаемости['Number of Survivors'] / уровень_выживаемости['Всего'] * 100).round(1)
-            
-            # Сортировка по уровню и фильтрация только типов с более чем 5 вовлеченными людьми
-            уровень_выживаемости = уровень_выживаемости[уровень_выживаемости['Всего'] >= 5].sort_values('Уровень выживаемости (%)', ascending=False)
+            # Сначала самый высокий уровень, только для типов не менее чем с 5 вовлеченными людьми
+            уровень_выживаемости = iomdata.section(набор_данных, состояние_фильтров, 'survival_rate').rename('Уровень выживаемости (%)').reset_index()
             
             fig = px.bar(
                 уровень_выживаемости,
@@ -506,21 +722,13 @@ with tab4:
     if 'Cause of Death' in df.columns:
         st.subheader("Основные причины смерти")
         
-        причины = df['Cause of Death'].value_counts().reset_index()
+        причины = iomdata.section(набор_данных, состояние_фильтров, 'top_values', 'Cause of Death', 10).reset_index()
         причины.columns = ['Причина', 'Количество']
         
         # Создание облака слов
         try:
-            wordcloud_data = dict(zip(причины['Причина'], причины['Количество']))
-            
-            # Генерация облака слов
-            wordcloud = WordCloud(
-                width=800,
-                height=400,
-                background_color='white',
-                colormap='Blues',
-                max_words=50
-            ).generate_from_frequencies(wordcloud_data)
+            # Генерация облака слов (один раз для каждого состояния фильтров)
+            wordcloud = iomdata.section(набор_данных, состояние_фильтров, 'cause_wordcloud')
             
             # Отображение
             fig, ax = plt.subplots(figsize=(10, 5))
@@ -530,7 +738,7 @@ with tab4:
         except:
             # Запасной вариант, если облако слов не работает
             fig = px.pie(
-                причины.head(10),
+                причины,
                 values='Количество',
                 names='Причина',
                 title='Топ-10 причин смерти'
@@ -538,56 +746,109 @@ with tab4:
             st.plotly_chart(fig, use_container_width=True)
     
     # Сезонный анализ (по месяцам)
-    if 'Month' in df.columns:
+    if 'Month' in df.columns and 'Incident Year' in df.columns:
         st.markdown("---")
         st.subheader("Сезонная модель инцидентов")
         
-        # Преобразование месяца в числовой порядок для правильной сортировки
-        месяцы_порядок = {month: i for i, month in enumerate(calendar.month_name[1:], 1)}
+        # Матрица год x месяц, собранная из заранее посчитанных месячных сумм по разделам
+        сезонность = iomdata.section(набор_данных, состояние_фильтров, 'seasonality', 'Incidents')
         
-        # Проверка, являются ли месяцы текстовыми
-        if df['Month'].dtype == 'object':
-            try:
-                # Попытка сопоставить месяцы с числами
-                df_месяц = df.copy()
-                df_месяц['Month_Num'] = df_месяц['Month'].map(месяцы_порядок)
-                
-                # Группировка по месяцам
-                инциденты_по_месяцам = df_месяц.groupby('Month').size().reset_index(name='Инциденты')
-                
-                # Добавление номера месяца для сортировки
-                инциденты_по_месяцам['Month_Num'] = инциденты_по_месяцам['Month'].map(месяцы_порядок)
-                
-                # Сортировка по месяцу
-                инциденты_по_месяцам = инциденты_по_месяцам.sort_values('Month_Num')
-                
-                # График
-                fig = px.line(
-                    инциденты_по_месяцам,
-                    x='Month',
-                    y='Инциденты',
-                    markers=True,
-                    title='Инциденты по месяцам'
+        if len(сезонность) > 0:
+            # Календарные месяцы за все годы
+            инциденты_по_месяцам = сезонность.sum().rename_axis('Month').reset_index(name='Инциденты')
+            
+            # График
+            fig = px.line(
+                инциденты_по_месяцам,
+                x='Month',
+                y='Инциденты',
+                markers=True,
+                title='Инциденты по месяцам'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Тепловая карта год по месяцам
+            подписи_сезонности = {'Incidents': 'Инциденты'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                подписи_сезонности['Victims'] = 'Жертвы (погибшие и пропавшие)'
+            показатель_сезонности = st.radio(
+                "Показатель тепловой карты",
+                options=list(подписи_сезонности),
+                format_func=подписи_сезонности.get,
+                horizontal=True
+            )
+            матрица_сезонности = iomdata.section(набор_данных, состояние_фильтров, 'seasonality', показатель_сезонности)
+            
+            fig = px.imshow(
+                матрица_сезонности,
+                y=матрица_сезонности.index.astype(str),
+                labels=dict(x='Месяц', y='Год', color=подписи_сезонности[показатель_сезонности]),
+                color_continuous_scale='Reds',
+                aspect='auto',
+                title=f"{подписи_сезонности[показатель_сезонности]} по годам и месяцам"
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+    
+    # Жертвы на инцидент, объединённые из подсчётов значений по разделам
+    if 'Total Number of Dead and Missing' in df.columns:
+        st.markdown("---")
+        st.subheader("Жертвы на инцидент")
+        
+        распределение = iomdata.section(набор_данных, состояние_фильтров, 'distribution', 'Total Number of Dead and Missing', None)
+        if len(распределение) > 0:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Медиана", f"{распределение['Median'].iloc[0]:,.0f}")
+            col2.metric("90-й процентиль", f"{распределение['P90'].iloc[0]:,.0f}")
+            col3.metric("99-й процентиль", f"{распределение['P99'].iloc[0]:,.0f}")
+            col4.metric("Крупнейший инцидент", f"{распределение['Max'].iloc[0]:,.0f}")
+            
+            гистограмма = iomdata.section(набор_данных, состояние_фильтров, 'histogram', 'Total Number of Dead and Missing', iomdata.VICTIM_BUCKETS).reset_index()
+            гистограмма.columns = ['Жертвы', 'Инциденты']
+            
+            fig = px.bar(
+                гистограмма,
+                x='Жертвы',
+                y='Инциденты',
+                log_y=True,
+                color_discrete_sequence=['#1f77b4'],
+                title='Инциденты по числу жертв'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            подписи_разбивки = {'Region of Incident': "Регион", 'Migration Route': "Маршрут"}
+            разбивка_по = st.radio(
+                "Разбивка по",
+                options=[col for col in подписи_разбивки if col in df.columns],
+                format_func=подписи_разбивки.get,
+                horizontal=True
+            )
+            if разбивка_по is not None:
+                разбивка = iomdata.section(набор_данных, состояние_фильтров, 'distribution', 'Total Number of Dead and Missing', разбивка_по)
+                st.dataframe(
+                    iomdata.decoded_columns(разбивка).round(1).rename(columns={
+                        разбивка_по: подписи_разбивки[разбивка_по],
+                        'Incidents': 'Инциденты',
+                        'Mean': 'Среднее',
+                        'Median': 'Медиана',
+                        'P90': 'P90',
+                        'P99': 'P99',
+                        'Max': 'Максимум'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
                 )
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-            except:
-                st.warning("Невозможно создать график сезонности из-за проблем с форматом месяцев.")
     
     # Корреляции между числовыми переменными
     st.markdown("---")
     st.subheader("Корреляции между переменными")
     
-    # Выбор только числовых столбцов для корреляции
-    числовые_столбцы = df.select_dtypes(include=['number']).columns.tolist()
+    # Корреляция числовых столбцов без широты и долготы
+    корреляция = iomdata.section(набор_данных, состояние_фильтров, 'correlation')
     
-    # Удаление широты и долготы, чтобы не искажать корреляцию
-    числовые_столбцы = [col for col in числовые_столбцы if col.upper() not in ['LATITUDE', 'LONGITUDE']]
-    
-    if len(числовые_столбцы) >= 3:
-        # Расчет корреляционной матрицы
-        корреляция = df[числовые_столбцы].corr()
-        
+    if корреляция is not None:
         # Создание тепловой карты
         fig = px.imshow(
             корреляция,
@@ -603,12 +864,26 @@ with tab4:
     st.markdown("---")
     st.subheader("Исследование отдельных данных")
     
-    # Позволить пользователю выбирать определенные записи
-    n_записей = min(10, len(df))
-    показать_записей = st.slider("Количество записей для отображения", 1, min(50, len(df)), n_записей)
+    # Отфильтрованные строки разбиты на страницы в порядке сортировки; в браузер передаётся только видимая страница
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        текст_поиска = st.text_input("Поиск", placeholder="Ключевые слова в месте, причине смерти или источнике")
+    with col2:
+        столбец_сортировки = st.selectbox(
+            "Сортировать по",
+            options=[None] + list(df.columns),
+            format_func=lambda column: "Порядок таблицы" if column is None else column
+        )
+    with col3:
+        по_возрастанию = st.radio("Порядок", options=[True, False], format_func=lambda ascending: "По возрастанию" if ascending else "По убыванию")
+    with col4:
+        размер_страницы = st.selectbox("Строк на странице", options=[10, 25, 50, 100], index=1)
     
-    # Отображение данных
-    st.dataframe(df.head(показать_записей))
+    порядок_строк = iomdata.section(набор_данных, состояние_фильтров, 'row_order', столбец_сортировки, по_возрастанию, текст_поиска.strip() or None)
+    число_страниц = max(1, -(-len(порядок_строк) // размер_страницы))
+    номер_страницы = st.number_input(f"Страница (из {число_страниц:,})", min_value=1, max_value=число_страниц, value=1, step=1)
+    st.caption(f"Записей: {len(порядок_строк):,}")
+    st.dataframe(набор_данных.page(порядок_строк, номер_страницы - 1, размер_страницы))
     
     # Опция для скачивания отфильтрованных данных
     st.download_button(
@@ -5,10 +5,9 @@ import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 import seaborn as sns
-import calendar
 from datetime import datetime
 import pycountry
-from wordcloud import WordCloud
+import iomdata
 
 # Configuração da página
 st.set_page_config(
@@ -18,6 +17,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Pré-aquecer o conjunto de dados padrão e os filtros populares em segundo plano
+iomdata.start_warmup()
+
 # Título e descrição
 st.title("Dashboard de Análise de Incidentes Migratórios")
 st.markdown("""
@@ -25,46 +27,56 @@ Este dashboard analisa dados sobre incidentes envolvendo imigrantes, fornecendo
 tendências e estatísticas relacionadas a estas ocorrências ao redor do mundo.
 """)
 
-# Função para carregar dados
-@st.cache_data
-def carregar_dados(arquivo=None):
-    if arquivo is not None:
-        try:
-            # Verificar extensão do arquivo
-            if arquivo.name.endswith('.csv'):
-                df = pd.read_csv(arquivo)
-            else:
-                df = pd.read_excel(arquivo)
-            return df, None
-        except Exception as e:
-            return None, str(e)
-    else:
-        # Criar DataFrame de exemplo com estrutura similar aos dados reais
-        # (apenas para demonstração quando não há upload)
-        data = {
-            'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
-            'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
-            'Incident Type': ['Shipwreck', 'Vehicle Accident', 'Dehydration', 'Violence', 'Drowning', 'Hypothermia'],
-            'Region of Incident': ['North America', 'North America', 'North America', 'North America', 'Europe', 'North America'],
-            'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
-            'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
-            'Month': ['January', 'February', 'March', 'April', 'May', 'June'],
-            'Number of Dead': [12, 5, 3, 8, 15, 2],
-            'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
-            'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
-            'Number of Survivors': [8, 12, 5, 3, 2, 4],
-            'Number of Females': [6, 7, 2, 5, 8, 1],
-            'Number of Males': [14, 10, 6, 7, 14, 5],
-            'Number of Children': [3, 4, 1, 2, 7, 0],
-            'Country of Origin': ['Guatemala', 'Mexico', 'Honduras', 'El Salvador', 'Syria', 'Mexico'],
-            'Region of Origin': ['Central America', 'North America', 'Central America', 'Central America', 'Middle East', 'North America'],
-            'Cause of Death': ['Drowning', 'Trauma', 'Dehydration', 'Violence', 'Drowning', 'Exposure'],
-            'Country of Incident': ['United States', 'United States', 'United States', 'United States', 'Finland', 'United States'],
-            'Migration Route': ['Mexico to US', 'Mexico to US', 'Central America to US', 'Central America to US', 'Middle East to Europe', 'Mexico to US'],
-            'Location of Incident': ['Desert', 'Highway', 'Desert', 'Border', 'Sea', 'Mountains']
-        }
-        df = pd.DataFrame(data)
-        return df, None
+# Função para carregar o conjunto de dados exibido sem upload
+@st.cache_resource
+def carregar_dados():
+    # Conjunto de dados incluído, já carregado pelo pré-aquecimento quando disponível
+    dataset = iomdata.default_dataset()
+    if dataset is not None:
+        return dataset
+
+    # Criar DataFrame de exemplo com estrutura similar aos dados reais
+    # (apenas para demonstração quando não há upload)
+    data = {
+        'LATITUDE': [31.650259, 31.59713, 31.94026, 31.506777, 59.1551, 32.45435],
+        'LONGITUDE': [-110.366453, -111.73756, -113.01125, -109.315632, 28, -113.18402],
+        'Incident Type': ['Shipwreck', 'Vehicle Accident', 'Dehydration', 'Violence', 'Drowning', 'Hypothermia'],
+        'Region of Incident': ['North America', 'North America', 'North America', 'North America', 'Europe', 'North America'],
+        'Incident Date': ['2023-01-15', '2023-02-20', '2023-03-10', '2023-04-05', '2023-05-12', '2023-06-08'],
+        'Incident Year': [2023, 2023, 2023, 2023, 2023, 2023],
+        'Month': ['January', 'February', 'March', 'April', 'May', 'June'],
+        'Number of Dead': [12, 5, 3, 8, 15, 2],
+        'Minimum Estimated Number of Missing': [3, 0, 2, 1, 5, 0],
+        'Total Number of Dead and Missing': [15, 5, 5, 9, 20, 2],
+        'Number of Survivors': [8, 12, 5, 3, 2, 4],
+        'Number of Females': [6, 7, 2, 5, 8, 1],
+        'Number of Males': [14, 10, 6, 7, 14, 5],
+        'Number of Children': [3, 4, 1, 2, 7, 0],
+        'Country of Origin': ['Guatemala', 'Mexico', 'Honduras', 'El Salvador', 'Syria', 'Mexico'],
+        'Region of Origin': ['Central America', 'North America', 'Central America', 'Central America', 'Middle East', 'North America'],
+        'Cause of Death': ['Drowning', 'Trauma', 'Dehydration', 'Violence', 'Drowning', 'Exposure'],
+        'Country of Incident': ['United States', 'United States', 'United States', 'United States', 'Finland', 'United States'],
+        'Migration Route': ['Mexico to US', 'Mexico to US', 'Central America to US', 'Central America to US', 'Middle East to Europe', 'Mexico to US'],
+        'Location of Incident': ['Desert', 'Highway', 'Desert', 'Border', 'Sea', 'Mountains']
+    }
+    return iomdata.Dataset.from_frame(pd.DataFrame(data), 'exemplo', sample=True)
+
+# Etapas do processamento de um upload, exibidas na barra de progresso
+ETAPAS_PROCESSAMENTO = {
+    'queued': "Aguardando processamento de",
+    'parsing': "Lendo",
+    'normalizing': "Normalizando",
+    'indexing': "Indexando",
+}
+
+# Progresso do upload, atualizado a cada segundo durante o processamento
+@st.fragment(run_every=1)
+def mostrar_progresso_processamento(processamento):
+    if processamento.done:
+        # Trocar o painel inteiro para o novo conjunto de dados de uma vez
+        st.rerun()
+    st.progress(processamento.progress, text=f"⏳ {ETAPAS_PROCESSAMENTO[processamento.stage]} {processamento.name}...")
+    st.caption("O painel continua mostrando os dados atuais até o arquivo ficar pronto.")
 
 # Opção para upload de arquivo
 st.sidebar.header("📊 Dados")
@@ -72,37 +84,42 @@ uploaded_file = st.sidebar.file_uploader("Carregar arquivo de dados", type=["xls
 
 # Carregar dados
 if uploaded_file is not None:
-    df, erro = carregar_dados(uploaded_file)
-    if erro:
-        st.error(f"Erro ao carregar o arquivo: {erro}")
+    # Uploads são processados em segundo plano; arquivos idênticos compartilham o mesmo processamento
+    if st.session_state.get('arquivo_processamento') != uploaded_file.file_id:
+        st.session_state['arquivo_processamento'] = uploaded_file.file_id
+        st.session_state['processamento'] = iomdata.ingest(uploaded_file.getvalue(), uploaded_file.name)
+    processamento = st.session_state['processamento']
+    if processamento.error:
+        st.error(f"Erro ao carregar o arquivo: {processamento.error}")
         st.stop()
-    else:
+    elif processamento.done:
+        dataset = processamento.dataset
         st.sidebar.success("✅ Dados carregados com sucesso!")
+    else:
+        # Conjunto de dados anterior até o upload ficar pronto
+        dataset = st.session_state['reserva_dataset'].dataset if 'reserva_dataset' in st.session_state else carregar_dados()
+        with st.sidebar:
+            mostrar_progresso_processamento(processamento)
 else:
-    df, _ = carregar_dados()
-    st.sidebar.warning("⚠️ Usando dados de exemplo. Carregue seu arquivo para análise real.")
-
-# Converter Incident Date para datetime, se necessário
-if 'Incident Date' in df.columns:
-    try:
-        df['Incident Date'] = pd.to_datetime(df['Incident Date'])
-    except:
-        pass
-
-# Verificar e preencher valores nulos nos campos numéricos
-colunas_numericas = [
-    'Number of Dead', 'Minimum Estimated Number of Missing', 
-    'Total Number of Dead and Missing', 'Number of Survivors',
-    'Number of Females', 'Number of Males', 'Number of Children'
-]
-
-for col in colunas_numericas:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        df[col] = df[col].fillna(0)
+    # Descartar o processamento concluído para que um upload removido possa ser liberado
+    st.session_state.pop('processamento', None)
+    st.session_state.pop('arquivo_processamento', None)
+    dataset = carregar_dados()
+    if dataset.sample:
+        st.sidebar.warning("⚠️ Usando dados de exemplo. Carregue seu arquivo para análise real.")
+    else:
+        st.sidebar.info(f"ℹ️ Usando o conjunto de dados incluído ({dataset.name}). Carregue seu arquivo para analisar outros dados.")
+
+# Reservar o conjunto de dados exibido enquanto esta sessão o usa; uploads sem uso são liberados
+if 'reserva_dataset' not in st.session_state or st.session_state['reserva_dataset'].dataset is not dataset:
+    st.session_state['reserva_dataset'] = iomdata.lease(dataset)
+
+# Datas e campos numéricos já são normalizados ao carregar o conjunto de dados
+df = dataset.frame
 
 # Sidebar para filtros
 st.sidebar.header("🔍 Filtros")
+estado_filtros = iomdata.FilterState()
 
 # Filtro de período
 if 'Incident Year' in df.columns:
@@ -113,8 +130,21 @@ if 'Incident Year' in df.columns:
             options=anos_disponiveis,
             default=anos_disponiveis
         )
-        if ano_selecionado:
-            df = df[df['Incident Year'].isin(ano_selecionado)]
+        estado_filtros = estado_filtros.replace(years=iomdata.selection(ano_selecionado, anos_disponiveis))
+        df = dataset.filtered(estado_filtros)
+
+# Filtro de intervalo de datas, resolvido por busca binária no índice de datas
+limites_datas = dataset.date_bounds()
+if limites_datas is not None and limites_datas[0] < limites_datas[1]:
+    datas_selecionadas = st.sidebar.slider(
+        "Data do Incidente",
+        min_value=limites_datas[0],
+        max_value=limites_datas[1],
+        value=limites_datas,
+        format="DD/MM/YYYY"
+    )
+    estado_filtros = estado_filtros.replace(dates=iomdata.date_window(datas_selecionadas, limites_datas))
+    df = dataset.filtered(estado_filtros)
 
 # Filtro de região
 if 'Region of Incident' in df.columns:
@@ -125,8 +155,8 @@ if 'Region of Incident' in df.columns:
             options=regioes_disponiveis,
             default=regioes_disponiveis
         )
-        if regiao_selecionada:
-            df = df[df['Region of Incident'].isin(regiao_selecionada)]
+        estado_filtros = estado_filtros.replace(regions=iomdata.selection(regiao_selecionada, regioes_disponiveis))
+        df = dataset.filtered(estado_filtros)
 
 # Filtro de tipo de incidente
 if 'Incident Type' in df.columns:
@@ -137,14 +167,68 @@ if 'Incident Type' in df.columns:
             options=tipos_disponiveis,
             default=tipos_disponiveis
         )
-        if tipo_selecionado:
-            df = df[df['Incident Type'].isin(tipo_selecionado)]
+        estado_filtros = estado_filtros.replace(types=iomdata.selection(tipo_selecionado, tipos_disponiveis))
+        df = dataset.filtered(estado_filtros)
+
+# Manter a área selecionada no mapa como filtro de todo o dashboard
+def guardar_selecao_mapa():
+    st.session_state['map_bounds'] = iomdata.selection_bounds(st.session_state['mapa_incidentes'].selection.points)
+
+def limpar_selecao_mapa():
+    st.session_state['map_bounds'] = None
+
+# Filtro por proximidade, respondido pelo índice espacial
+if dataset.spatial_index is not None:
+    with st.sidebar.expander("📍 Proximidade de um local"):
+        local_personalizado = "Coordenadas personalizadas"
+        local = st.selectbox(
+            "Ponto de referência",
+            options=[None] + list(iomdata.PLACES) + [local_personalizado],
+            format_func=lambda option: "Qualquer lugar" if option is None else option
+        )
+        if local is not None:
+            if local == local_personalizado:
+                latitude_local = st.number_input("Latitude", min_value=-90.0, max_value=90.0, value=0.0)
+                longitude_local = st.number_input("Longitude", min_value=-180.0, max_value=180.0, value=0.0)
+            else:
+                latitude_local, longitude_local = iomdata.PLACES[local]
+            raio_km = st.slider("Raio (km)", 5, 1000, 50, step=5)
+            estado_filtros = estado_filtros.replace(near=(latitude_local, longitude_local, float(raio_km)))
+            df = dataset.filtered(estado_filtros)
+
+    # Área selecionada no mapa (caixa ou laço na aba Análise Geográfica)
+    if st.session_state.get('map_bounds') is not None:
+        estado_filtros = estado_filtros.replace(bounds=st.session_state['map_bounds'])
+        df = dataset.filtered(estado_filtros)
+        st.sidebar.caption("🗺️ Filtrado pela área selecionada no mapa")
+        st.sidebar.button("Limpar seleção do mapa", on_click=limpar_selecao_mapa)
+
+# Valores clicados nos gráficos (barras ou países) filtram todo o dashboard
+def guardar_selecao_grafico(grafico, coluna, campo):
+    selecoes = dict(st.session_state.get('chart_picks') or {})
+    selecoes[coluna] = iomdata.picked(st.session_state[grafico].selection.points, campo)
+    st.session_state['chart_picks'] = selecoes
+
+def limpar_selecoes_graficos():
+    st.session_state['chart_picks'] = {}
+
+selecoes_graficos = iomdata.chart_picks(st.session_state.get('chart_picks'))
+if selecoes_graficos is not None:
+    estado_filtros = estado_filtros.replace(picks=selecoes_graficos)
+    df = dataset.filtered(estado_filtros)
+    rotulos_selecoes = {'Incident Type': "Tipo de incidente", 'Migration Route': "Rota", 'Country of Incident': "País"}
+    for coluna, valores in selecoes_graficos:
+        st.sidebar.caption(f"🖱️ {rotulos_selecoes.get(coluna, coluna)}: {', '.join(map(str, valores))}")
+    st.sidebar.button("Limpar seleção dos gráficos", on_click=limpar_selecoes_graficos)
 
 # Verificar se há dados após a filtragem
 if len(df) == 0:
     st.warning("Não há dados disponíveis para os filtros selecionados.")
     st.stop()
 
+# Registrar os filtros usados, para que o próximo pré-aquecimento os calcule
+iomdata.record_usage(estado_filtros, st.session_state)
+
 # Dividir o dashboard em seções
 tab1, tab2, tab3, tab4 = st.tabs(["📈 Visão Geral", "🗺️ Análise Geográfica", "👥 Demografia", "📊 Análise Detalhada"])
 
@@ -153,6 +237,7 @@ with tab1:
     
     # KPIs principais
     col1, col2, col3, col4 = st.columns(4)
+    totais = iomdata.section(dataset, estado_filtros, 'column_sums')
     
     with col1:
         total_incidentes = len(df)
@@ -160,17 +245,17 @@ with tab1:
     
     with col2:
         if 'Total Number of Dead and Missing' in df.columns:
-            total_mortos_desaparecidos = int(df['Total Number of Dead and Missing'].sum())
+            total_mortos_desaparecidos = int(totais['Total Number of Dead and Missing'])
             st.metric("Total de Vítimas", f"{total_mortos_desaparecidos:,}")
     
     with col3:
         if 'Number of Survivors' in df.columns:
-            total_sobreviventes = int(df['Number of Survivors'].sum())
+            total_sobreviventes = int(totais['Number of Survivors'])
             st.metric("Total de Sobreviventes", f"{total_sobreviventes:,}")
     
     with col4:
         if 'Number of Children' in df.columns:
-            total_criancas = int(df['Number of Children'].sum())
+            total_criancas = int(totais['Number of Children'])
             st.metric("Crianças Afetadas", f"{total_criancas:,}")
     
     st.markdown("---")
@@ -179,29 +264,36 @@ with tab1:
     if 'Incident Date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Incident Date']):
         st.subheader("Tendência de Incidentes ao Longo do Tempo")
         
-        # Agrupamento por mês
-        df_tempo = df.copy()
-        df_tempo['Mês'] = df_tempo['Incident Date'].dt.to_period('M')
-        incidentes_por_mes = df_tempo.groupby('Mês').size().reset_index(name='Incidentes')
-        incidentes_por_mes['Mês'] = incidentes_por_mes['Mês'].astype(str)
-        
-        # Mortos e desaparecidos por mês
+        # Mortos e desaparecidos ao longo do tempo
         if 'Total Number of Dead and Missing' in df.columns:
-            vitimas_por_mes = df_tempo.groupby('Mês')['Total Number of Dead and Missing'].sum().reset_index()
-            vitimas_por_mes['Mês'] = vitimas_por_mes['Mês'].astype(str)
+            rotulos_granularidade = {'day': 'Dia', 'week': 'Semana', 'month': 'Mês', 'quarter': 'Trimestre', 'year': 'Ano'}
+            granularidade = st.radio(
+                "Granularidade",
+                options=list(rotulos_granularidade),
+                index=2,
+                format_func=rotulos_granularidade.get,
+                horizontal=True
+            )
+            
+            # Série agregada a partir de valores diários pré-calculados
+            tendencia = iomdata.section(dataset, estado_filtros, 'trend', granularidade)
+            
+            # Limitar os pontos enviados ao navegador, preservando os picos
+            pontos_incidentes = iomdata.downsample(tendencia['Incidents'])
+            pontos_vitimas = iomdata.downsample(tendencia['Victims'])
             
             # Gráfico de linha combinado
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=incidentes_por_mes['Mês'],
-                y=incidentes_por_mes['Incidentes'],
+            fig.add_trace(iomdata.scatter_type(len(pontos_incidentes))(
+                x=pontos_incidentes.index,
+                y=pontos_incidentes,
                 name='Número de Incidentes',
                 line=dict(color='blue', width=2)
             ))
             
-            fig.add_trace(go.Scatter(
-                x=vitimas_por_mes['Mês'],
-                y=vitimas_por_mes['Total Number of Dead and Missing'],
+            fig.add_trace(iomdata.scatter_type(len(pontos_vitimas))(
+                x=pontos_vitimas.index,
+                y=pontos_vitimas,
                 name='Vítimas (mortos e desaparecidos)',
                 line=dict(color='red', width=2),
                 yaxis='y2'
@@ -209,7 +301,7 @@ with tab1:
             
             fig.update_layout(
                 title='Evolução de Incidentes e Vítimas ao Longo do Tempo',
-                xaxis=dict(title='Mês'),
+                xaxis=dict(title=rotulos_granularidade[granularidade]),
                 yaxis=dict(title='Número de Incidentes', showgrid=False),
                 yaxis2=dict(title='Número de Vítimas', overlaying='y', side='right', showgrid=False),
                 legend=dict(x=0.01, y=0.99),
@@ -225,11 +317,11 @@ with tab1:
         with col1:
             st.subheader("Incidentes por Tipo")
             
-            incidentes_por_tipo = df['Incident Type'].value_counts().reset_index()
+            incidentes_por_tipo = iomdata.section(dataset, estado_filtros, 'top_values', 'Incident Type', 10).reset_index()
             incidentes_por_tipo.columns = ['Tipo de Incidente', 'Contagem']
             
             fig = px.bar(
-                incidentes_por_tipo.sort_values('Contagem', ascending=False).head(10),
+                incidentes_por_tipo,
                 x='Tipo de Incidente',
                 y='Contagem',
                 color='Contagem',
@@ -237,13 +329,19 @@ with tab1:
                 title='Top 10 Tipos de Incidentes'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='grafico_tipos',
+                on_select=lambda: guardar_selecao_grafico('grafico_tipos', 'Incident Type', 'x'),
+                selection_mode='points'
+            )
         
         with col2:
             st.subheader("Vítimas por Tipo de Incidente")
             
             if 'Total Number of Dead and Missing' in df.columns:
-                vitimas_por_tipo = df.groupby('Incident Type')['Total Number of Dead and Missing'].sum().reset_index()
+                vitimas_por_tipo = iomdata.section(dataset, estado_filtros, 'group_sum', 'Incident Type', 'Total Number of Dead and Missing').reset_index()
                 vitimas_por_tipo.columns = ['Tipo de Incidente', 'Total de Vítimas']
                 
                 fig = px.pie(
@@ -280,68 +378,140 @@ with tab2:
             else:
                 df_map['marker_size'] = 5
             
-            # Adicionar texto para hover
-            hover_text = []
-            for idx, row in df_map.iterrows():
-                texto = f"Local: {row.get('Location of Incident', 'N/A')}<br>"
-                if 'Incident Type' in df_map.columns:
-                    texto += f"Tipo: {row['Incident Type']}<br>"
-                if 'Incident Date' in df_map.columns:
-                    data = row['Incident Date']
-                    if pd.api.types.is_datetime64_any_dtype(data):
-                        texto += f"Data: {data.strftime('%d/%m/%Y')}<br>"
-                    else:
-                        texto += f"Data: {data}<br>"
-                if 'Total Number of Dead and Missing' in df_map.columns:
-                    texto += f"Vítimas: {int(row['Total Number of Dead and Missing'])}"
-                hover_text.append(texto)
+            # Campos do hover; acima do limite compacto os rótulos são enviados uma vez
+            hover_fields = {'Local': df_map['Location of Incident'] if 'Location of Incident' in df_map.columns else 'N/A'}
+            if 'Incident Type' in df_map.columns:
+                hover_fields['Tipo'] = df_map['Incident Type']
+            if 'Incident Date' in df_map.columns:
+                hover_fields['Data'] = df_map['Incident Date']
+            if 'Total Number of Dead and Missing' in df_map.columns:
+                hover_fields['Vítimas'] = df_map['Total Number of Dead and Missing'].fillna(0).astype(int)
             
             # Criar mapa de densidade
             fig = go.Figure()
             
-            # Adicionar mapa de calor
-            fig.add_densitymapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
-                z=df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))),
-                radius=20,
-                colorscale='Reds',
-                colorbar=dict(title='Intensidade'),
-                hoverinfo='none',
-                opacity=0.7
-            )
+            # Adicionar mapa de calor, a menos que o servidor de tiles o renderize
+            if not iomdata.serves_tiles(dataset):
+                fig.add_densitymapbox(
+                    lat=iomdata.quantize(df_map['LATITUDE']),
+                    lon=iomdata.quantize(df_map['LONGITUDE']),
+                    z=iomdata.quantize(df_map.get('Total Number of Dead and Missing', np.ones(len(df_map))), 0),
+                    radius=20,
+                    colorscale='Reds',
+                    colorbar=dict(title='Intensidade'),
+                    hoverinfo='none',
+                    opacity=0.7
+                )
             
             # Adicionar pontos individuais
             fig.add_scattermapbox(
-                lat=df_map['LATITUDE'],
-                lon=df_map['LONGITUDE'],
+                lat=iomdata.quantize(df_map['LATITUDE']),
+                lon=iomdata.quantize(df_map['LONGITUDE']),
                 mode='markers',
                 marker=dict(
-                    size=df_map['marker_size'],
+                    size=iomdata.quantize(df_map['marker_size'], 1),
                     color='rgb(220, 20, 60)',
                     opacity=0.7
                 ),
-                text=hover_text,
-                hoverinfo='text'
+                **iomdata.hover(hover_fields, len(df_map))
             )
             
             # Configurar layout do mapa
             fig.update_layout(
-                mapbox_style="carto-positron",
+                mapbox_style=iomdata.MAP_STYLE,
                 mapbox=dict(
                     center=dict(lat=df_map['LATITUDE'].mean(), lon=df_map['LONGITUDE'].mean()),
-                    zoom=2
+                    zoom=2,
+                    layers=iomdata.tile_layers(dataset, estado_filtros)
                 ),
                 margin=dict(r=0, t=0, l=0, b=0),
                 height=500
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='mapa_incidentes',
+                on_select=guardar_selecao_mapa,
+                selection_mode=('box', 'lasso')
+            )
         else:
             st.warning("Não há coordenadas válidas para exibir no mapa.")
     else:
         st.warning("As colunas de latitude e longitude não foram encontradas nos dados.")
     
+    # Hotspots: aglomerados de incidentes próximos
+    st.subheader("Hotspots de Incidentes")
+    
+    if 'LATITUDE' in df.columns and 'LONGITUDE' in df.columns:
+        col1, col2 = st.columns(2)
+        with col1:
+            raio_hotspot = st.slider("Raio do aglomerado (km)", 5, 200, 25, step=5)
+        with col2:
+            min_incidentes_hotspot = st.slider("Mínimo de incidentes por hotspot", 2, 50, 10)
+        
+        hotspots = iomdata.section(dataset, estado_filtros, 'hotspots', float(raio_hotspot), min_incidentes_hotspot)
+        
+        if hotspots is not None and len(hotspots) > 0:
+            # Um polígono por hotspot, separados por None
+            latitudes_poligono, longitudes_poligono = [], []
+            for contorno in hotspots['Hull']:
+                longitudes_poligono += [point[0] for point in contorno] + [None]
+                latitudes_poligono += [point[1] for point in contorno] + [None]
+            
+            fig = go.Figure()
+            fig.add_scattermapbox(
+                lat=latitudes_poligono,
+                lon=longitudes_poligono,
+                mode='lines',
+                fill='toself',
+                fillcolor='rgba(220, 20, 60, 0.25)',
+                line=dict(color='rgb(220, 20, 60)', width=1),
+                hoverinfo='skip'
+            )
+            fig.add_scattermapbox(
+                lat=hotspots['Latitude'],
+                lon=hotspots['Longitude'],
+                mode='markers',
+                marker=dict(
+                    size=np.log1p(hotspots['Victims']) * 4 + 6,
+                    color='rgb(139, 0, 0)',
+                    opacity=0.8
+                ),
+                text=[
+                    f"Incidentes: {incidents}<br>Vítimas: {victims}"
+                    for incidents, victims in zip(hotspots['Incidents'], hotspots['Victims'])
+                ],
+                hoverinfo='text'
+            )
+            fig.update_layout(
+                mapbox_style=iomdata.MAP_STYLE,
+                mapbox=dict(
+                    center=dict(lat=hotspots['Latitude'].mean(), lon=hotspots['Longitude'].mean()),
+                    zoom=2,
+                    layers=iomdata.tile_layers()
+                ),
+                margin=dict(r=0, t=0, l=0, b=0),
+                height=500,
+                showlegend=False
+            )
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("Envoltória convexa de cada aglomerado; o tamanho do marcador segue o número de vítimas.")
+            
+            st.dataframe(
+                iomdata.decoded_columns(hotspots.drop(columns='Hull')).round({'Latitude': 3, 'Longitude': 3}).rename(columns={
+                    'Incidents': 'Incidentes',
+                    'Victims': 'Vítimas',
+                    'Latitude': 'Latitude',
+                    'Longitude': 'Longitude',
+                    'Locations': 'Locais'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Nenhum hotspot encontrado com estas configurações.")
+    
     # Análise por região/país
     st.markdown("---")
     
@@ -351,7 +521,7 @@ with tab2:
         if 'Country of Incident' in df.columns:
             st.subheader("Incidentes por País")
             
-            paises_incidentes = df['Country of Incident'].value_counts().reset_index()
+            paises_incidentes = iomdata.section(dataset, estado_filtros, 'value_counts', 'Country of Incident').reset_index()
             paises_incidentes.columns = ['País', 'Incidentes']
             
             fig = px.choropleth(
@@ -363,17 +533,23 @@ with tab2:
                 title='Número de Incidentes por País',
                 height=400
             )
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='grafico_paises',
+                on_select=lambda: guardar_selecao_grafico('grafico_paises', 'Country of Incident', 'location'),
+                selection_mode='points'
+            )
     
     with col2:
         if 'Migration Route' in df.columns:
             st.subheader("Rotas Migratórias Mais Comuns")
             
-            rotas = df['Migration Route'].value_counts().reset_index()
+            rotas = iomdata.section(dataset, estado_filtros, 'top_values', 'Migration Route', 10).reset_index()
             rotas.columns = ['Rota', 'Frequência']
             
             fig = px.bar(
-                rotas.sort_values('Frequência', ascending=False).head(10),
+                rotas,
                 x='Rota',
                 y='Frequência',
                 color='Frequência',
@@ -381,7 +557,55 @@ with tab2:
                 title='Top 10 Rotas Migratórias'
             )
             fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(
+                fig,
+                use_container_width=True,
+                key='grafico_rotas',
+                on_select=lambda: guardar_selecao_grafico('grafico_rotas', 'Migration Route', 'x'),
+                selection_mode='points'
+            )
+
+    # Fluxos da região de origem até onde o incidente aconteceu
+    if 'Region of Origin' in df.columns:
+        st.markdown("---")
+        st.subheader("Fluxos Migratórios")
+        
+        destinos_fluxo = {col: label for col, label in {'Region of Incident': "Região do incidente", 'Country of Incident': "País do incidente"}.items() if col in df.columns}
+        if destinos_fluxo:
+            col1, col2 = st.columns(2)
+            destino_fluxo = col1.radio(
+                "Destino",
+                options=list(destinos_fluxo),
+                format_func=destinos_fluxo.get,
+                horizontal=True
+            )
+            rotulos_fluxo = {'Incidents': 'Incidentes'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                rotulos_fluxo['Victims'] = 'Vítimas (mortos e desaparecidos)'
+            medida_fluxo = col2.radio(
+                "Medida do fluxo",
+                options=list(rotulos_fluxo),
+                format_func=rotulos_fluxo.get,
+                horizontal=True
+            )
+            fluxos = iomdata.section(dataset, estado_filtros, 'flows', 'Region of Origin', destino_fluxo)
+            fluxos = fluxos[fluxos[medida_fluxo] > 0].nlargest(25, medida_fluxo)
+            
+            if len(fluxos) > 0:
+                # Origens e destinos são nós distintos, então uma região pode ser as duas coisas
+                origens_fluxo = list(fluxos['Origin'].unique())
+                alvos_fluxo = list(fluxos['Destination'].unique())
+                fig = go.Figure(go.Sankey(
+                    node=dict(label=origens_fluxo + alvos_fluxo, pad=12, thickness=14),
+                    link=dict(
+                        source=fluxos['Origin'].map({name: i for i, name in enumerate(origens_fluxo)}),
+                        target=fluxos['Destination'].map({name: len(origens_fluxo) + i for i, name in enumerate(alvos_fluxo)}),
+                        value=fluxos[medida_fluxo].round(2)
+                    )
+                ))
+                fig.update_layout(title=f"Top 25 Fluxos: {rotulos_fluxo[medida_fluxo]}", height=600)
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption("Incidentes com várias regiões de origem são divididos igualmente entre elas.")
 
 with tab3:
     st.header("Análise Demográfica")
@@ -395,7 +619,7 @@ with tab3:
             
             total_genero = {
                 'Gênero': ['Masculino', 'Feminino'],
-                'Total': [df['Number of Males'].sum(), df['Number of Females'].sum()]
+                'Total': [totais['Number of Males'], totais['Number of Females']]
             }
             
             fig = px.pie(
@@ -411,8 +635,8 @@ with tab3:
         with col2:
             st.subheader("Presença de Crianças")
             
-            total_criancas = df['Number of Children'].sum()
-            total_adultos = df['Number of Males'].sum() + df['Number of Females'].sum() - total_criancas
+            total_criancas = totais['Number of Children']
+            total_adultos = totais['Number of Males'] + totais['Number of Females'] - total_criancas
             
             dados_idade = {
                 'Categoria': ['Adultos', 'Crianças'],
@@ -440,11 +664,11 @@ with tab3:
         if 'Country of Origin' in df.columns:
             st.subheader("Principais Países de Origem")
             
-            paises_origem = df['Country of Origin'].value_counts().reset_index()
+            paises_origem = iomdata.section(dataset, estado_filtros, 'top_values', 'Country of Origin', 10).reset_index()
             paises_origem.columns = ['País de Origem', 'Contagem']
             
             fig = px.bar(
-                paises_origem.sort_values('Contagem', ascending=False).head(10),
+                paises_origem,
                 x='País de Origem',
                 y='Contagem',
                 color='Contagem',
@@ -457,7 +681,7 @@ with tab3:
         if 'Region of Origin' in df.columns:
             st.subheader("Regiões de Origem")
             
-            regioes_origem = df['Region of Origin'].value_counts().reset_index()
+            regioes_origem = iomdata.section(dataset, estado_filtros, 'value_counts', 'Region of Origin').reset_index()
             regioes_origem.columns = ['Região de Origem', 'Contagem']
             
             fig = px.pie(
@@ -476,16 +700,8 @@ with tab3:
         
         # Calcular taxa de sobrevivência por tipo de incidente
         if 'Incident Type' in df.columns:
-            taxa_sobrev = df.groupby('Incident Type').agg({
-                'Number of Survivors': 'sum',
-                'Total Number of Dead and Missing': 'sum'
-            }).reset_index()
-            
-            taxa_sobrev['Total'] = taxa_sobrev['Number of Survivors'] + taxa_sobrev['Total Number of Dead and Missing']
-            taxa_sobrev['Taxa de Sobrevivência (%)'] = (taxa_sobrev['Number of Survivors'] / taxa_sobrev['Total'] * 100).round(1)
-            
-            # Ordenar por taxa e filtrar apenas os tipos com mais de 5 pessoas envolvidas
-            taxa_sobrev = taxa_sobrev[taxa_sobrev['Total'] >= 5].sort_values('Taxa de Sobrevivência (%)', ascending=False)
+            # Maior taxa primeiro, apenas para tipos com pelo menos 5 pessoas envolvidas
+            taxa_sobrev = iomdata.section(dataset, estado_filtros, 'survival_rate').rename('Taxa de Sobrevivência (%)').reset_index()
             
             fig = px.bar(
                 taxa_sobrev,
@@ -506,21 +722,13 @@ with tab4:
     if 'Cause of Death' in df.columns:
         st.subheader("Principais Causas de Morte")
         
-        causas = df['Cause of Death'].value_counts().reset_index()
+        causas = iomdata.section(dataset, estado_filtros, 'top_values', 'Cause of Death', 10).reset_index()
         causas.columns = ['Causa', 'Contagem']
         
         # Criar nuvem de palavras
         try:
-            wordcloud_data = dict(zip(causas['Causa'], causas['Contagem']))
-            
-            # Gerar nuvem de palavras
-            wordcloud = WordCloud(
-                width=800,
-                height=400,
-                background_color='white',
-                colormap='Blues',
-                max_words=50
-            ).generate_from_frequencies(wordcloud_data)
+            # Gerar nuvem de palavras (renderizada uma vez por estado de filtros)
+            wordcloud = iomdata.section(dataset, estado_filtros, 'cause_wordcloud')
             
             # Exibir
             fig, ax = plt.subplots(figsize=(10, 5))
@@ -530,7 +738,7 @@ with tab4:
         except:
             # Fallback se wordcloud falhar
             fig = px.pie(
-                causas.head(10),
+                causas,
                 values='Contagem',
                 names='Causa',
                 title='Top 10 Causas de Morte'
@@ -538,56 +746,109 @@ with tab4:
             st.plotly_chart(fig, use_container_width=True)
     
     # Análise sazonal (por mês)
-    if 'Month' in df.columns:
+    if 'Month' in df.columns and 'Incident Year' in df.columns:
         st.markdown("---")
         st.subheader("Padrão Sazonal de Incidentes")
         
-        # Converter mês para ordem numérica para ordenação correta
-        meses_ordem = {month: i for i, month in enumerate(calendar.month_name[1:], 1)}
+        # Matriz ano x mês, somada das contagens mensais pré-calculadas por partição
+        sazonalidade = iomdata.section(dataset, estado_filtros, 'seasonality', 'Incidents')
         
-        # Verificar se os meses estão como texto
-        if df['Month'].dtype == 'object':
-            try:
-                # Tentar mapear os meses para números
-                df_mes = df.copy()
-                df_mes['Month_Num'] = df_mes['Month'].map(meses_ordem)
-                
-                # Agrupar por mês
-                incidentes_por_mes = df_mes.groupby('Month').size().reset_index(name='Incidentes')
-                
-                # Adicionar número do mês para ordenação
-                incidentes_por_mes['Month_Num'] = incidentes_por_mes['Month'].map(meses_ordem)
-                
-                # Ordenar por mês
-                incidentes_por_mes = incidentes_por_mes.sort_values('Month_Num')
-                
-                # Gráfico
-                fig = px.line(
-                    incidentes_por_mes,
-                    x='Month',
-                    y='Incidentes',
-                    markers=True,
-                    title='Incidentes por Mês'
+        if len(sazonalidade) > 0:
+            # Meses do calendário somados sobre todos os anos
+            incidentes_por_mes = sazonalidade.sum().rename_axis('Month').reset_index(name='Incidentes')
+            
+            # Gráfico
+            fig = px.line(
+                incidentes_por_mes,
+                x='Month',
+                y='Incidentes',
+                markers=True,
+                title='Incidentes por Mês'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Mapa de calor ano por mês
+            rotulos_sazonalidade = {'Incidents': 'Incidentes'}
+            if 'Total Number of Dead and Missing' in df.columns:
+                rotulos_sazonalidade['Victims'] = 'Vítimas (mortos e desaparecidos)'
+            medida_sazonalidade = st.radio(
+                "Medida do mapa de calor",
+                options=list(rotulos_sazonalidade),
+                format_func=rotulos_sazonalidade.get,
+                horizontal=True
+            )
+            matriz_sazonalidade = iomdata.section(dataset, estado_filtros, 'seasonality', medida_sazonalidade)
+            
+            fig = px.imshow(
+                matriz_sazonalidade,
+                y=matriz_sazonalidade.index.astype(str),
+                labels=dict(x='Mês', y='Ano', color=rotulos_sazonalidade[medida_sazonalidade]),
+                color_continuous_scale='Reds',
+                aspect='auto',
+                title=f"{rotulos_sazonalidade[medida_sazonalidade]} por Ano e Mês"
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+    
+    # Vítimas por incidente, combinadas a partir das contagens por partição
+    if 'Total Number of Dead and Missing' in df.columns:
+        st.markdown("---")
+        st.subheader("Vítimas por Incidente")
+        
+        distribuicao = iomdata.section(dataset, estado_filtros, 'distribution', 'Total Number of Dead and Missing', None)
+        if len(distribuicao) > 0:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Mediana", f"{distribuicao['Median'].iloc[0]:,.0f}")
+            col2.metric("Percentil 90", f"{distribuicao['P90'].iloc[0]:,.0f}")
+            col3.metric("Percentil 99", f"{distribuicao['P99'].iloc[0]:,.0f}")
+            col4.metric("Maior incidente", f"{distribuicao['Max'].iloc[0]:,.0f}")
+            
+            histograma = iomdata.section(dataset, estado_filtros, 'histogram', 'Total Number of Dead and Missing', iomdata.VICTIM_BUCKETS).reset_index()
+            histograma.columns = ['Vítimas', 'Incidentes']
+            
+            fig = px.bar(
+                histograma,
+                x='Vítimas',
+                y='Incidentes',
+                log_y=True,
+                color_discrete_sequence=['#1f77b4'],
+                title='Incidentes por Número de Vítimas'
+            )
+            fig.update_layout(height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            rotulos_detalhamento = {'Region of Incident': "Região", 'Migration Route': "Rota"}
+            detalhar_por = st.radio(
+                "Detalhar por",
+                options=[col for col in rotulos_detalhamento if col in df.columns],
+                format_func=rotulos_detalhamento.get,
+                horizontal=True
+            )
+            if detalhar_por is not None:
+                detalhamento = iomdata.section(dataset, estado_filtros, 'distribution', 'Total Number of Dead and Missing', detalhar_por)
+                st.dataframe(
+                    iomdata.decoded_columns(detalhamento).round(1).rename(columns={
+                        detalhar_por: rotulos_detalhamento[detalhar_por],
+                        'Incidents': 'Incidentes',
+                        'Mean': 'Média',
+                        'Median': 'Mediana',
+                        'P90': 'P90',
+                        'P99': 'P99',
+                        'Max': 'Máximo'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
                 )
-                fig.update_layout(height=400)
-                st.plotly_chart(fig, use_container_width=True)
-            except:
-                st.warning("Não foi possível criar o gráfico de sazonalidade devido a problemas com o formato dos meses.")
     
     # Correlações entre variáveis numéricas
     st.markdown("---")
     st.subheader("Correlações Entre Variáveis")
     
-    # Selecionar apenas colunas numéricas para correlação
-    colunas_num = df.select_dtypes(include=['number']).columns.tolist()
+    # Correlação das colunas numéricas, sem latitude e longitude
+    corr = iomdata.section(dataset, estado_filtros, 'correlation')
     
-    # Remover latitude e longitude para não distorcer a correlação
-    colunas_num = [col for col in colunas_num if col.upper() not in ['LATITUDE', 'LONGITUDE']]
-    
-    if len(colunas_num) >= 3:
-        # Calcular matriz de correlação
-        corr = df[colunas_num].corr()
-        
+    if corr is not None:
         # Criar heatmap
         fig = px.imshow(
             corr,
@@ -603,12 +864,26 @@ with tab4:
     st.markdown("---")
     st.subheader("Exploração de Dados Individuais")
     
-    # Permitir ao usuário selecionar registros específicos
-    n_registros = min(10, len(df))
-    mostrar_registros = st.slider("Número de registros para mostrar", 1, min(50, len(df)), n_registros)
+    # As linhas filtradas são paginadas na ordem escolhida; só a página visível vai para o navegador
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        texto_busca = st.text_input("Buscar", placeholder="Palavras-chave no local, causa da morte ou fonte")
+    with col2:
+        coluna_ordenacao = st.selectbox(
+            "Ordenar por",
+            options=[None] + list(df.columns),
+            format_func=lambda column: "Ordem da tabela" if column is None else column
+        )
+    with col3:
+        ordem_crescente = st.radio("Ordem", options=[True, False], format_func=lambda ascending: "Crescente" if ascending else "Decrescente")
+    with col4:
+        tamanho_pagina = st.selectbox("Linhas por página", options=[10, 25, 50, 100], index=1)
     
-    # Exibir dados
-    st.dataframe(df.head(mostrar_registros))
+    ordem_linhas = iomdata.section(dataset, estado_filtros, 'row_order', coluna_ordenacao, ordem_crescente, texto_busca.strip() or None)
+    total_paginas = max(1, -(-len(ordem_linhas) // tamanho_pagina))
+    numero_pagina = st.number_input(f"Página (de {total_paginas:,})", min_value=1, max_value=total_paginas, value=1, step=1)
+    st.caption(f"{len(ordem_linhas):,} registros")
+    st.dataframe(dataset.page(ordem_linhas, numero_pagina - 1, tamanho_pagina))
     
     # Opção para download dos dados filtrados
     st.download_button(
@@ -0,0 +1,43 @@
+"""Shared data engine for the migration incidents dashboards."""
+from .aggregations import VICTIM_BUCKETS
+from .api import MAP_STYLE, serves_tiles, tile_layers
+from .columnstore import read_columns, write_columns
+from .compact import COMPACT_POINTS, hover, quantize, scatter_type
+from .data import NUMERIC_COLUMNS, decoded_columns, prepare, read_file
+from .downsample import downsample
+from .engine import (
+    QUANTILES, Dataset, DatasetLease, FilterState, chart_picks, date_window, default_dataset, default_datasets,
+    get_dataset, lease, load_columns, load_dataset, load_path, load_store, picked, section, selection, store_totals,
+)
+from .flows import FlowTable
+from .hotspots import HotspotIndex
+from .ingest import IngestJob, ingest
+from .index import DateIndex, ValueIndex
+from .sharedcache import DiskBackend, MemoryBackend, RedisBackend, set_shared_cache, shared_cache
+from .singleflight import SingleFlight
+from .sketches import CountMinSketch, HeavyHitters, SpaceSaving
+from .spatial import PLACES, GridIndex, haversine, selection_bounds
+from .store import PARTITION_COLUMNS, PartitionStore, write_store
+from .textindex import TEXT_COLUMNS, TextIndex
+from .timeseries import GRANULARITIES, TimeSeries
+from .warmup import record_usage, start_warmup
+
+__all__ = [
+    'VICTIM_BUCKETS',
+    'MAP_STYLE', 'serves_tiles', 'tile_layers',
+    'read_columns', 'write_columns',
+    'COMPACT_POINTS', 'hover', 'quantize', 'scatter_type',
+    'NUMERIC_COLUMNS', 'decoded_columns', 'prepare', 'read_file',
+    'downsample',
+    'QUANTILES', 'Dataset', 'DatasetLease', 'FilterState', 'chart_picks', 'date_window', 'default_dataset', 'default_datasets',
+    'get_dataset', 'lease', 'load_columns', 'load_dataset', 'load_path', 'load_store', 'picked', 'section', 'selection',
+    'store_totals',
+    'FlowTable', 'HotspotIndex', 'IngestJob', 'ingest', 'DateIndex', 'ValueIndex', 'GRANULARITIES', 'TimeSeries',
+    'DiskBackend', 'MemoryBackend', 'RedisBackend', 'set_shared_cache', 'shared_cache',
+    'SingleFlight',
+    'CountMinSketch', 'HeavyHitters', 'SpaceSaving',
+    'PLACES', 'GridIndex', 'haversine', 'selection_bounds',
+    'PARTITION_COLUMNS', 'PartitionStore', 'write_store',
+    'TEXT_COLUMNS', 'TextIndex',
+    'record_usage', 'start_warmup',
+]
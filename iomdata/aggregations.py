@@ -0,0 +1,161 @@
+"""Aggregations behind the dashboard sections.
+
+Each function takes an already filtered frame and returns the object the
+dashboard plots (before any localized relabeling), so results can be cached
+and shared between sessions and locales.
+"""
+import numpy as np
+import pandas as pd
+
+from .data import MONTHS, NUMERIC_COLUMNS, decoded
+from .flows import FlowTable
+
+VICTIMS = 'Total Number of Dead and Missing'
+
+# Bucket edges of the victims per incident histogram
+VICTIM_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Fewest people involved for an incident type to get a survival rate
+SURVIVAL_MIN_PEOPLE = 5
+
+
+def value_counts(df, column):
+    # Categoricals also count the unused categories of the shared string pool
+    counts = df[column].value_counts()
+    return decoded(counts[counts > 0])
+
+
+def group_sum(df, by, column):
+    return decoded(df.groupby(by, observed=True)[column].sum())
+
+
+def column_sums(df):
+    return df[[col for col in NUMERIC_COLUMNS if col in df.columns]].sum()
+
+
+def survival_by_type(df):
+    return decoded(df.groupby('Incident Type', observed=True).agg({
+        'Number of Survivors': 'sum',
+        VICTIMS: 'sum'
+    }))
+
+
+def survival_rates(survival):
+    """Survival rate in percent per incident type from :func:`survival_by_type`, highest first.
+
+    Types with fewer than ``SURVIVAL_MIN_PEOPLE`` survivors and victims get
+    no rate: a single survivor would make 100%.
+    """
+    total = survival['Number of Survivors'] + survival[VICTIMS]
+    rate = (survival['Number of Survivors'] / total * 100).round(1)
+    return rate[total >= SURVIVAL_MIN_PEOPLE].sort_values(ascending=False).rename('Survival Rate (%)')
+
+
+def survival_rate(df):
+    return survival_rates(survival_by_type(df))
+
+
+def month_counts(df):
+    # Month is an ordered categorical: the groups come in calendar order
+    return decoded(df.groupby('Month', observed=False).size())
+
+
+def season_matrix(years, months, weights=None):
+    """Sum of ``weights`` (1 per row by default) by year and month code, one row per year."""
+    years = np.asarray(years, dtype=float)
+    months = np.asarray(months)
+    valid = ~np.isnan(years) & (months >= 0)
+    found, inverse = np.unique(years[valid], return_inverse=True)
+    weights = None if weights is None else np.asarray(weights, dtype=float)[valid]
+    sums = np.bincount(inverse * 12 + months[valid], weights=weights, minlength=len(found) * 12)
+    return pd.DataFrame(sums.reshape(len(found), 12), columns=MONTHS,
+                        index=pd.Index(found.astype(int), name='Incident Year'))
+
+
+def seasonality(df, measure):
+    """``'Incidents'`` or ``'Victims'`` by year (rows) and calendar month (columns)."""
+    weights = None if measure == 'Incidents' else df[VICTIMS]
+    return season_matrix(df['Incident Year'], df['Month'].cat.codes, weights)
+
+
+def correlation_columns(df):
+    num_cols = df.select_dtypes(include=['number']).columns.tolist()
+    # Latitude and longitude would only distort the matrix
+    return [col for col in num_cols if col.upper() not in ['LATITUDE', 'LONGITUDE']]
+
+
+# Words drawn in the cause of death word cloud
+WORDCLOUD_WORDS = 50
+
+
+def flows(df, origin, destination):
+    return FlowTable.from_frame(df, origin, destination, VICTIMS).flows()
+
+
+def wordcloud(frequencies):
+    """800x400 word cloud image of ``frequencies``."""
+    from wordcloud import WordCloud
+
+    # Laid out on a half-size canvas with coarser font steps and drawn at
+    # twice the scale: a third of the time, and the smallest words still fit
+    wordcloud = WordCloud(
+        width=400,
+        height=200,
+        scale=2,
+        min_font_size=2,
+        font_step=2,
+        background_color='white',
+        colormap='Blues',
+        max_words=WORDCLOUD_WORDS
+    ).generate_from_frequencies(dict(frequencies))
+    return wordcloud.to_array()
+
+
+SECTIONS = {
+    'value_counts': value_counts,
+    'group_sum': group_sum,
+    'column_sums': column_sums,
+    'survival_by_type': survival_by_type,
+}
+
+# Everything the dashboard asks for on a full render, used for warm-up
+DASHBOARD_SECTIONS = [
+    ('column_sums',),
+    ('trend', 'month'),
+    ('top_values', 'Incident Type', 10),
+    ('group_sum', 'Incident Type', VICTIMS),
+    ('value_counts', 'Country of Incident'),
+    ('top_values', 'Migration Route', 10),
+    ('top_values', 'Country of Origin', 10),
+    ('value_counts', 'Region of Origin'),
+    ('survival_rate',),
+    ('top_values', 'Cause of Death', 10),
+    ('cause_wordcloud',),
+    ('month_counts',),
+    ('seasonality', 'Incidents'),
+    ('seasonality', 'Victims'),
+    ('flows', 'Region of Origin', 'Region of Incident'),
+    ('distribution', VICTIMS, None),
+    ('distribution', VICTIMS, 'Region of Incident'),
+    ('histogram', VICTIMS, VICTIM_BUCKETS),
+    ('correlation',),
+    ('hotspots', 25.0, 10),
+]
+
+
+def required_columns(name, *args):
+    """Columns a section needs; sections are skipped when one is missing."""
+    if name in ('value_counts', 'group_sum', 'flows'):
+        return list(args)
+    if name in ('top_values', 'heavy_hitters'):
+        return list(args[:1])
+    if name in ('distribution', 'histogram'):
+        return [col for col in args[:2] if isinstance(col, str)]
+    return {
+        'trend': ['Incident Date', VICTIMS],
+        'survival_by_type': ['Incident Type', 'Number of Survivors', VICTIMS],
+        'survival_rate': ['Incident Type', 'Number of Survivors', VICTIMS],
+        'month_counts': ['Month'],
+        'seasonality': ['Incident Year', 'Month'] + ([VICTIMS] if args == ('Victims',) else []),
+        'cause_wordcloud': ['Cause of Death'],
+        'hotspots': ['LATITUDE', 'LONGITUDE'],
+    }.get(name, [])
@@ -0,0 +1,393 @@
+"""Local HTTP API serving the dashboard's aggregations.
+
+Endpoints answer from the same sections and filter states as the dashboards,
+so other tools get the same numbers from the same caches::
+
+    python -m iomdata.api --port 8765
+    curl 'http://127.0.0.1:8765/routes?years=2023&regions=Mediterranean&n=5'
+    curl -H 'Accept: application/vnd.apache.arrow.stream' 'http://127.0.0.1:8765/trend?granularity=year'
+
+Filters are query parameters: ``years``, ``regions`` and ``types`` (repeated
+for several values), ``start``/``end`` ISO dates (either one alone is
+bounded by the dataset's first or last incident date), ``near=lat,lon,km``,
+``bounds=south,west,north,east`` and ``picks`` (chart selections as JSON
+``{column: [values]}``); ``dataset`` picks a loaded dataset by key.
+Responses are JSON, or Arrow IPC streams with ``format=arrow`` or the Arrow
+``Accept`` header (needs the optional pyarrow package). Datasets never change
+under a key, so every response has an ETag derived from the request alone:
+a matching ``If-None-Match`` is answered with 304 before anything is
+computed, and encoded bodies are kept in an LRU cache.
+
+The server also renders the map's tiles (see :mod:`iomdata.tiles`):
+``/tiles/density/{z}/{x}/{y}.png`` takes the same filters, and
+``/tiles/base/{z}/{x}/{y}.png`` is the offline base layer. Dashboards use
+them when ``IOMDATA_TILE_URL`` holds the server's address as the browser
+sees it.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pandas as pd
+
+from . import engine, tiles
+from .aggregations import VICTIM_BUCKETS, VICTIMS
+from .sharedcache import cache_key
+from .timeseries import GRANULARITIES
+
+logger = logging.getLogger(__name__)
+
+API_CACHE_SIZE = int(os.environ.get('IOMDATA_API_CACHE_SIZE', 256))
+ARROW = 'application/vnd.apache.arrow.stream'
+JSON = 'application/json'
+PNG = 'image/png'
+FILTER_PARAMS = ('years', 'regions', 'types', 'start', 'end', 'near', 'bounds', 'picks')
+TILE_PATH = re.compile(r'tiles/(base|density)/(\d+)/(\d+)/(\d+)\.png')
+# Address of this server as the dashboards' browsers reach it
+TILE_URL = os.environ.get('IOMDATA_TILE_URL', '').rstrip('/')
+# With a tile server the base map is one of its layers, so no online style is needed
+MAP_STYLE = 'white-bg' if TILE_URL else 'carto-positron'
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _numbers(text, count, name):
+    try:
+        values = tuple(float(value) for value in text.split(','))
+    except ValueError:
+        values = ()
+    if len(values) != count:
+        raise BadRequest(f"{name} takes {count} comma-separated numbers")
+    return values
+
+
+def _date(params, name):
+    try:
+        return datetime.date.fromisoformat(params[name][0])
+    except ValueError:
+        raise BadRequest(f"{name} must be an ISO date (YYYY-MM-DD)") from None
+
+
+def filter_state(params, dataset=None):
+    """Filter state of the query parameters ``params`` (as from ``parse_qs``) for ``dataset``."""
+    data = {}
+    try:
+        if 'years' in params:
+            data['years'] = [int(float(value)) for value in params['years']]
+    except ValueError:
+        raise BadRequest("years must be numbers") from None
+    for field in ('regions', 'types'):
+        if field in params:
+            data[field] = params[field]
+    if 'start' in params or 'end' in params:
+        bounds = None if dataset is None else dataset.date_bounds()
+        start = _date(params, 'start') if 'start' in params else bounds and bounds[0]
+        end = _date(params, 'end') if 'end' in params else bounds and bounds[1]
+        if start and end and start > end:
+            raise BadRequest("start must not be after end")
+        # Without incident dates there is nothing to bound the open side with, nor to filter
+        if start and end:
+            data['dates'] = [start.isoformat(), end.isoformat()]
+    if 'near' in params:
+        data['near'] = _numbers(params['near'][0], 3, 'near')
+    if 'bounds' in params:
+        data['bounds'] = _numbers(params['bounds'][0], 4, 'bounds')
+    if 'picks' in params:
+        try:
+            data['picks'] = json.loads(params['picks'][0])
+        except ValueError:
+            raise BadRequest("picks must be a JSON object") from None
+        if not isinstance(data['picks'], dict) or not all(isinstance(v, list) for v in data['picks'].values()):
+            raise BadRequest("picks must be a JSON object of value lists")
+    return engine.FilterState.from_dict(data)
+
+
+def filter_query(state):
+    """Query string of ``state``, the inverse of :func:`filter_state`."""
+    params = []
+    for field in ('years', 'regions', 'types'):
+        params += [(field, value) for value in getattr(state, field) or ()]
+    if state.dates is not None:
+        params += [('start', state.dates[0]), ('end', state.dates[1])]
+    for field in ('near', 'bounds'):
+        if getattr(state, field) is not None:
+            params.append((field, ','.join(str(value) for value in getattr(state, field))))
+    if state.picks is not None:
+        params.append(('picks', json.dumps({column: list(values) for column, values in state.picks})))
+    return urlencode(params)
+
+
+def serves_tiles(dataset):
+    """Whether the tile server renders ``dataset``: it loads the default datasets."""
+    return bool(TILE_URL) and any(default.key == dataset.key for default in engine.default_datasets())
+
+
+def tile_layers(dataset=None, state=None):
+    """Mapbox layers from the tile server: the base map, plus the density of ``dataset`` under ``state``."""
+    if not TILE_URL:
+        return []
+    layers = [dict(sourcetype='raster', source=[f'{TILE_URL}/tiles/base/{{z}}/{{x}}/{{y}}.png'], below='traces')]
+    if dataset is not None and serves_tiles(dataset):
+        query = urlencode([('dataset', dataset.key)]) + '&' + filter_query(state or engine.FilterState())
+        layers.append(dict(sourcetype='raster', source=[f'{TILE_URL}/tiles/density/{{z}}/{{x}}/{{y}}.png?{query}'],
+                           below='traces'))
+    return layers
+
+
+def _first(params, name, default, convert=str):
+    try:
+        return convert(params[name][0]) if name in params else default
+    except ValueError:
+        raise BadRequest(f"invalid {name}") from None
+
+
+def _counts(series):
+    return series.rename('Incidents' if series.name == 'count' else series.name).reset_index()
+
+
+def _kpis(dataset, state, params):
+    totals = engine.section(dataset, state, 'column_sums')
+    rows = [('Incidents', len(dataset.filtered(state)))] + [(measure, int(value)) for measure, value in totals.items()]
+    return pd.DataFrame(rows, columns=['Measure', 'Value'])
+
+
+def _top(column):
+    def endpoint(dataset, state, params):
+        return _counts(engine.section(dataset, state, 'top_values', column, _first(params, 'n', 10, int)))
+    return endpoint
+
+
+def _heavy(column):
+    def endpoint(dataset, state, params):
+        # Approximate for the unfiltered dataset, from the stream sketches
+        return _counts(engine.section(dataset, state, 'heavy_hitters', column, _first(params, 'n', 10, int)))
+    return endpoint
+
+
+def _victims_by_type(dataset, state, params):
+    return engine.section(dataset, state, 'group_sum', 'Incident Type', VICTIMS).reset_index()
+
+
+def _countries(dataset, state, params):
+    return _counts(engine.section(dataset, state, 'value_counts', 'Country of Incident'))
+
+
+def _trend(dataset, state, params):
+    if dataset.timeseries is None:
+        raise BadRequest("the dataset has no incident dates")
+    granularity = _first(params, 'granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise BadRequest(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    return engine.section(dataset, state, 'trend', granularity).reset_index()
+
+
+def _survival(dataset, state, params):
+    sums = engine.section(dataset, state, 'survival_by_type')
+    # Types with too few people involved have sums but no rate
+    rates = engine.section(dataset, state, 'survival_rate')
+    return sums.join(rates).sort_values('Survival Rate (%)', ascending=False).reset_index()
+
+
+def _months(dataset, state, params):
+    return engine.section(dataset, state, 'month_counts').rename('Incidents').reset_index()
+
+
+def _distribution(dataset, state, params):
+    return engine.section(dataset, state, 'distribution', VICTIMS, _first(params, 'by', None))
+
+
+def _histogram(dataset, state, params):
+    histogram = engine.section(dataset, state, 'histogram', VICTIMS, VICTIM_BUCKETS)
+    return histogram.rename('Incidents').rename_axis('Victims').reset_index()
+
+
+def _hotspots(dataset, state, params):
+    hotspots = engine.section(dataset, state, 'hotspots', _first(params, 'radius', 25.0, float),
+                              _first(params, 'min_incidents', 10, int))
+    return None if hotspots is None else hotspots.drop(columns='Hull')
+
+
+def _correlation(dataset, state, params):
+    corr = engine.section(dataset, state, 'correlation')
+    return None if corr is None else corr.rename_axis('Variable').reset_index()
+
+
+ENDPOINTS = {
+    'kpis': _kpis,
+    'incidents-by-type': _top('Incident Type'),
+    'victims-by-type': _victims_by_type,
+    'countries': _countries,
+    'routes': _top('Migration Route'),
+    'origins': _top('Country of Origin'),
+    'causes': _top('Cause of Death'),
+    'locations': _heavy('Location of Incident'),
+    'sources': _heavy('Information Source'),
+    'trend': _trend,
+    'survival': _survival,
+    'months': _months,
+    'victims-distribution': _distribution,
+    'victims-histogram': _histogram,
+    'hotspots': _hotspots,
+    'correlation': _correlation,
+}
+
+
+def encode(frame, fmt):
+    """Body of ``frame`` in ``fmt`` (``'json'`` or ``'arrow'``)."""
+    if fmt == 'arrow':
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return frame.to_json(orient='split', index=False, date_format='iso').encode('utf-8')
+
+
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'iomdata'
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def _send(self, status, body=b'', content_type=JSON, etag=None, cache_control='no-cache'):
+        self.send_response(status)
+        # Map tiles are fetched by the dashboards' pages, served from another origin
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+        if status != 304:
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode('utf-8'))
+
+    def _not_modified(self, etag):
+        return etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+
+    def _dataset(self, params):
+        key = params.pop('dataset', [None])[0]
+        return engine.default_dataset() if key is None else engine.get_dataset(key)
+
+    def _tile(self, name, params):
+        match = TILE_PATH.fullmatch(name)
+        z, x, y = (int(value) for value in match.groups()[1:]) if match else (-1, 0, 0)
+        if not tiles.valid_tile(z, x, y):
+            return self._error(404, f"no tile {name!r}")
+        if match.group(1) == 'base':
+            etag = '"' + cache_key('tile', 'base', tiles.BASE_TILES, z, x, y) + '"'
+            if self._not_modified(etag):
+                return self._send(304, etag=etag)
+            return self._send(200, tiles.base_tile(z, x, y), PNG, etag, 'max-age=86400')
+        dataset = self._dataset(params)
+        if dataset is None:
+            return self._error(404, "dataset not loaded")
+        try:
+            state = filter_state(params, dataset)
+        except BadRequest as e:
+            return self._error(400, str(e))
+        etag = '"' + cache_key('tile', dataset.key, state, z, x, y) + '"'
+        if self._not_modified(etag):
+            return self._send(304, etag=etag)
+        if not {'LATITUDE', 'LONGITUDE'} <= set(dataset.frame.columns):
+            return self._error(404, "not available for this dataset")
+        self._send(200, tiles.density_tile(dataset, state, z, x, y), PNG, etag, 'max-age=3600')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        name = url.path.strip('/')
+        params = parse_qs(url.query)
+        if name == '':
+            return self._send(200, json.dumps({'endpoints': sorted(ENDPOINTS)}).encode('utf-8'))
+        if name == 'datasets':
+            datasets = [{'key': dataset.key, 'name': dataset.name, 'rows': len(dataset.frame)}
+                        for dataset in engine.default_datasets()]
+            return self._send(200, json.dumps(datasets).encode('utf-8'))
+        if name.startswith('tiles/'):
+            return self._tile(name, params)
+        if name not in ENDPOINTS:
+            return self._error(404, f"unknown endpoint {name!r}")
+
+        dataset = self._dataset(params)
+        if dataset is None:
+            return self._error(404, "dataset not loaded")
+        fmt = params.pop('format', [None])[0] or ('arrow' if ARROW in self.headers.get('Accept', '') else 'json')
+        if fmt not in ('json', 'arrow'):
+            return self._error(400, "format must be json or arrow")
+        try:
+            state = filter_state(params, dataset)
+        except BadRequest as e:
+            return self._error(400, str(e))
+
+        options = sorted((field, values) for field, values in params.items() if field not in FILTER_PARAMS)
+        etag = '"' + cache_key('api', dataset.key, name, state, options, fmt) + '"'
+        if self._not_modified(etag):
+            return self._send(304, etag=etag)
+        with _responses_lock:
+            cached = _responses.get(etag)
+            if cached is not None:
+                _responses.move_to_end(etag)
+        if cached is None:
+            try:
+                frame = ENDPOINTS[name](dataset, state, params)
+            except BadRequest as e:
+                return self._error(400, str(e))
+            except KeyError as e:
+                return self._error(404, f"column {e} not in the dataset")
+            if frame is None:
+                return self._error(404, "not available for this dataset")
+            try:
+                cached = (ARROW if fmt == 'arrow' else JSON, encode(frame, fmt))
+            except ImportError:
+                return self._error(406, "Arrow responses need the pyarrow package")
+            with _responses_lock:
+                _responses[etag] = cached
+                while len(_responses) > API_CACHE_SIZE:
+                    _responses.popitem(last=False)
+        self._send(200, cached[1], cached[0], etag)
+
+
+def serve(host='127.0.0.1', port=8765):
+    """Serve the API until interrupted."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    logger.info("Serving on http://%s:%d", host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard aggregations over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    # Loads the default datasets and precomputes the default sections
+    from .warmup import warm_up
+    warm_up()
+    serve(args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compact browser payloads for large point traces.
+
+Plotly figures reach the browser as JSON: every coordinate as a full
+precision decimal and every hover label as its own HTML string. Above
+``COMPACT_POINTS`` points a trace switches to a compact encoding, so the
+payload and the render time stay flat as the data grows:
+
+* coordinates and marker sizes are quantized to float32, which plotly 6 and
+  later send as base64 typed arrays; older plotly versions write every
+  number out in the JSON, so there they are rounded instead, which keeps
+  about a metre of precision and shortens the text; either way coordinates
+  move by less than the padding of map selections;
+* hover labels go once into a ``hovertemplate`` and the values into
+  ``customdata``, rather than one preformatted string per point; the values
+  are formatted in Python, so the labels read exactly as before;
+* scatters that are not on a map are drawn with WebGL (``Scattergl``).
+"""
+import os
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+
+# Points above which traces use the compact encoding; 0 disables it
+COMPACT_POINTS = int(os.environ.get('IOMDATA_COMPACT_POINTS', 5000))
+# Plotly encodes numpy arrays as base64 typed arrays from version 6
+TYPED_ARRAYS = int(plotly.__version__.split('.')[0]) >= 6
+# Decimals kept by rounding when typed arrays are not available (1e-5 degrees is about a metre)
+COORDINATE_DECIMALS = 5
+
+
+def is_large(count):
+    """Whether a trace of ``count`` points uses the compact encoding."""
+    return 0 < COMPACT_POINTS < count
+
+
+def quantize(values, decimals=COORDINATE_DECIMALS):
+    """``values`` as sent to the browser: float32 (or rounded) when large, as is otherwise."""
+    if not is_large(len(values)):
+        return values
+    if TYPED_ARRAYS:
+        return np.asarray(values, dtype=np.float32)
+    return np.round(np.asarray(values, dtype=np.float64), decimals)
+
+
+def scatter_type(count):
+    """Trace class for a (non-map) scatter of ``count`` points."""
+    return go.Scattergl if is_large(count) else go.Scatter
+
+
+def hover(fields, count):
+    """Trace arguments showing ``fields`` on hover for ``count`` points.
+
+    ``fields`` maps each label to its values (or to one value for every
+    point). Values are shown as f-strings format them, missing ones included.
+    """
+    values = [np.full(count, f'{value}', dtype=object) if np.isscalar(value)
+              else np.array([f'{item}' for item in value], dtype=object) for value in fields.values()]
+    if is_large(count):
+        template = '<br>'.join(f'{label}: %{{customdata[{i}]}}' for i, label in enumerate(fields))
+        return {'customdata': np.column_stack(values), 'hovertemplate': template + '<extra></extra>'}
+    text = ['<br>'.join(f'{label}: {value}' for label, value in zip(fields, row)) for row in zip(*values)]
+    return {'text': text, 'hoverinfo': 'text'}
@@ -0,0 +1,165 @@
+"""Reading and normalizing IOM Missing Migrants datasets."""
+import calendar
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Logs and caches written at run time, outside the checkout
+CACHE_DIR = os.environ.get('IOMDATA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'iomdata'))
+
+NUMERIC_COLUMNS = [
+    'Number of Dead', 'Minimum Estimated Number of Missing',
+    'Total Number of Dead and Missing', 'Number of Survivors',
+    'Number of Females', 'Number of Males', 'Number of Children'
+]
+
+MONTHS = list(calendar.month_name[1:])
+# Months as small ordered codes: they sort and group in calendar order
+MONTH_DTYPE = pd.CategoricalDtype(MONTHS, ordered=True)
+
+
+def default_dataset_paths():
+    """Datasets loaded when nothing is uploaded.
+
+    ``IOMDATA_DEFAULT_DATASETS`` holds a list of paths separated by
+    ``os.pathsep``; without it the bundled ``migrants.xlsx`` is used. A
+    directory is read as a column store (see :mod:`iomdata.columnstore`) or
+    a partition store (see :mod:`iomdata.store`).
+    """
+    configured = os.environ.get('IOMDATA_DEFAULT_DATASETS')
+    if configured:
+        return [path for path in configured.split(os.pathsep) if path]
+    return [os.path.join(ROOT, 'migrants.xlsx')]
+
+
+def content_key(payload):
+    """Stable key for a dataset given the raw bytes it was parsed from."""
+    return hashlib.sha1(payload).hexdigest()
+
+
+def frame_key(df):
+    """Stable key for a dataset that only exists as a DataFrame."""
+    hashed = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+class ProgressReader(io.BytesIO):
+    """In-memory file calling ``report(fraction)`` as its bytes are consumed.
+
+    Parsers read their input roughly front to back (workbooks are zip members
+    inflated as rows are parsed), so the share of bytes read so far tracks
+    parsing progress.
+    """
+
+    def __init__(self, payload, report):
+        super().__init__(payload)
+        self.size = max(len(payload), 1)
+        self.consumed = 0
+        self.report = report
+
+    def _count(self, n):
+        self.consumed += n
+        self.report(min(self.consumed / self.size, 1.0))
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self._count(len(data))
+        return data
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self._count(n)
+        return n
+
+    # The CSV parser reads through the buffered-reader methods
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self._count(len(data))
+        return data
+
+    def readinto1(self, buffer):
+        n = super().readinto1(buffer)
+        self._count(n)
+        return n
+
+
+def read_file(source, name):
+    # CSV is detected by extension, everything else goes through Excel
+    if name.endswith('.csv'):
+        return pd.read_csv(source)
+    return pd.read_excel(source)
+
+
+def encode_strings(df):
+    """Dictionary-encode the text columns in place against one shared string pool.
+
+    Every text column becomes a categorical of the same dtype, whose sorted
+    categories hold each distinct string once; rows only keep integer codes.
+    """
+    text = [col for col in df.columns
+            if not isinstance(df[col].dtype, pd.CategoricalDtype)
+            and pd.api.types.infer_dtype(df[col], skipna=True) == 'string']
+    if not text:
+        return df
+    strings = np.concatenate([df[col].dropna().to_numpy(dtype=object) for col in text])
+    dtype = pd.CategoricalDtype(pd.Index(pd.unique(strings)).sort_values())
+    for col in text:
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def encode_months(df):
+    """Store ``Month`` in place as an ordered categorical of the calendar months.
+
+    Full names, abbreviations and month numbers are recognized; anything else
+    becomes missing.
+    """
+    if 'Month' not in df.columns or df['Month'].dtype == MONTH_DTYPE:
+        return df
+    names = {name.lower(): name for name in MONTHS}
+    names.update((abbr.lower(), name) for abbr, name in zip(calendar.month_abbr[1:], MONTHS))
+    names.update((str(number), name) for number, name in enumerate(MONTHS, 1))
+    values = df['Month'].astype(object)
+    # Each distinct value is looked up once
+    lookup = {value: names.get(str(value).strip().lower().removesuffix('.0')) for value in values.dropna().unique()}
+    df['Month'] = values.map(lookup).astype(MONTH_DTYPE)
+    return df
+
+
+def decoded(series):
+    """``series`` with a categorical index turned back into plain values, for display."""
+    if isinstance(series.index, pd.CategoricalIndex):
+        series = series.set_axis(series.index.astype(series.index.categories.dtype))
+    return series
+
+
+def decoded_columns(df):
+    """``df`` with its categorical columns turned back into plain values, for display.
+
+    Text columns share one string pool: sent to the browser as categoricals,
+    a few rows would carry every string of the pool.
+    """
+    categorical = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.astype({col: df[col].cat.categories.dtype for col in categorical})
+
+
+def prepare(df):
+    """Normalize a raw frame in place: parse dates, zero-fill counts, order months and encode text."""
+    if 'Incident Date' in df.columns:
+        try:
+            df['Incident Date'] = pd.to_datetime(df['Incident Date'])
+        except (ValueError, TypeError):
+            pass
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+            df[col] = df[col].fillna(0)
+    return encode_strings(encode_months(df))
@@ -0,0 +1,75 @@
+"""Point reduction for long time series traces.
+
+A chart cannot show more points than it has pixels, so long series are
+reduced before being sent to the browser, keeping their visual shape and
+peaks.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Roughly the pixel width of a full-width chart; 0 disables downsampling
+MAX_POINTS = int(os.environ.get('IOMDATA_MAX_POINTS', 1200))
+
+
+def lttb(x, y, n_out):
+    """Indices selected by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between keeps the
+    point forming the largest triangle with the previously selected point
+    and the average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float) - float(x[0])
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Bucket averages from prefix sums, shifted to give each bucket the next one
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    width = ends - starts
+    next_x = np.append(((cx[ends] - cx[starts]) / width)[1:], x[-1])
+    next_y = np.append(((cy[ends] - cy[starts]) / width)[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - next_x[i]) * (by - y[a]) - (x[a] - bx) * (next_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, n_out):
+    """Indices of the minimum and maximum of each bucket, fully vectorized."""
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    buckets = np.arange(n) * ((n_out - 2) // 2) // n
+    order = np.lexsort((np.asarray(y, dtype=float), buckets))
+    first = np.flatnonzero(np.diff(buckets[order], prepend=-1))
+    last = np.append(first[1:] - 1, n - 1)
+    return np.unique(np.concatenate((order[first], order[last], [0, n - 1])))
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
+
+
+def downsample(series, max_points=None, method='lttb'):
+    """At most ``max_points`` points of ``series``, selected by ``method``."""
+    max_points = MAX_POINTS if max_points is None else max_points
+    if not max_points or len(series) <= max_points:
+        return series
+    index = series.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.arange(len(series))
+    return series.iloc[METHODS[method](x, series.to_numpy(), max_points)]
@@ -0,0 +1,827 @@
+"""Datasets, filter state and the shared section cache."""
+import copy
+import dataclasses
+import datetime
+import io
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import aggregations, stats
+from .columnstore import is_column_store, read_columns
+from .data import (
+    MONTHS, ProgressReader, content_key, decoded_columns, default_dataset_paths, encode_strings, frame_key, prepare,
+    read_file,
+)
+from .flows import FlowTable
+from .hotspots import HotspotGraph
+from .index import DateIndex, ValueIndex
+from .partitions import Partitions, group_slices
+from .sharedcache import cache_key, shared_cache
+from .sketches import STREAM_COLUMNS, HeavyHitters
+from .singleflight import SingleFlight
+from .spatial import GridIndex
+from .store import PartitionStore
+from .stats import Distribution, MomentTable, moments
+from .textindex import TextIndex
+from .timeseries import TimeSeries, daily_from_rows, rollup
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.environ.get('IOMDATA_CACHE_SIZE', 512))
+
+# Quantiles reported by the distribution section
+QUANTILES = {'Median': 0.5, 'P90': 0.9, 'P99': 0.99}
+
+FILTER_COLUMNS = {
+    'years': 'Incident Year',
+    'regions': 'Region of Incident',
+    'types': 'Incident Type',
+}
+
+
+def _plain(value):
+    # numpy scalars -> python scalars, so states hash and serialize cleanly
+    return value.item() if hasattr(value, 'item') else value
+
+
+def selection(selected, options):
+    """Normalize a multiselect value: ``None`` means "no restriction"."""
+    if not selected or len(set(selected)) >= len(options):
+        return None
+    return tuple(sorted((_plain(v) for v in selected), key=str))
+
+
+def date_window(selected, bounds):
+    """Normalize a date range slider value: ``None`` means the full range."""
+    start, end = selected
+    if (start, end) == tuple(bounds):
+        return None
+    return start.isoformat(), end.isoformat()
+
+
+def picked(points, field):
+    """Values clicked on a chart, read from ``field`` of its selection points."""
+    values = {_plain(point[field]) for point in points if point.get(field) is not None}
+    return tuple(sorted(values, key=str)) or None
+
+
+def chart_picks(picks):
+    """Normalize ``{column: values}`` chart selections for ``FilterState.picks``."""
+    picks = {column: values for column, values in (picks or {}).items() if values}
+    return tuple(sorted((column, tuple(values)) for column, values in picks.items())) or None
+
+
+@dataclasses.dataclass(frozen=True)
+class FilterState:
+    """Sidebar filter selection; ``None`` fields do not filter.
+
+    ``dates`` is an inclusive ``(start, end)`` pair of ISO dates, ``near``
+    a ``(lat, lon, km)`` radius, ``bounds`` a ``(south, west, north,
+    east)`` box and ``picks`` the ``(column, values)`` pairs clicked on the
+    charts; these are resolved by the dataset indexes.
+    """
+    years: tuple = None
+    regions: tuple = None
+    types: tuple = None
+    dates: tuple = None
+    near: tuple = None
+    bounds: tuple = None
+    picks: tuple = None
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+    @property
+    def spatial(self):
+        return self.near is not None or self.bounds is not None
+
+    @property
+    def row_level(self):
+        """Whether filters the time series cube cannot resolve are set."""
+        return self.spatial or self.picks is not None
+
+    @property
+    def cell_aligned(self):
+        """Whether the selection is a union of partition cells."""
+        return self.dates is None and not self.row_level
+
+    def apply(self, df):
+        """Apply the categorical filters (row-level filters are resolved by the dataset indexes)."""
+        mask = None
+        for field, column in FILTER_COLUMNS.items():
+            values = getattr(self, field)
+            if values is None or column not in df.columns:
+                continue
+            current = df[column].isin(values)
+            mask = current if mask is None else mask & current
+        return df if mask is None else df[mask]
+
+    def to_dict(self):
+        return {field: None if values is None else list(values)
+                for field, values in dataclasses.asdict(self).items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(**{field: None if data.get(field) is None else tuple(data[field])
+                       for field in list(FILTER_COLUMNS) + ['dates', 'near', 'bounds']})
+        return state.replace(picks=chart_picks(dict(data.get('picks') or ())))
+
+
+class Dataset:
+    """A normalized frame plus everything derived from it.
+
+    Datasets are shared read-only between sessions; ``key`` identifies the
+    content and is part of every cache key.
+    """
+
+    def __init__(self, frame, key, name, sample=False):
+        self.frame = frame
+        self.key = key
+        self.name = name
+        self.sample = sample
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+        # Indexes and selections requested by several sessions at once are built once
+        self._flights = SingleFlight()
+        self._date_index = None
+        self._timeseries = None
+        self._partitions = None
+        self._cell_slices = None
+        self._moments = None
+        self._spatial_index = None
+        self._hotspot_graphs = OrderedDict()
+        self._value_indexes = {}
+        self._value_tables = {}
+        self._season_tables = {}
+        self._flow_tables = {}
+        self._distributions = {}
+        self._sort_orders = {}
+        self._row_hashes = None
+        self._text_index = None
+        self._heavy_hitters = None
+
+    @classmethod
+    def from_frame(cls, frame, name, sample=False):
+        frame = prepare(frame)
+        return register(cls(frame, frame_key(frame), name, sample))
+
+    @property
+    def date_index(self):
+        """Index of rows sorted by date, or ``None`` without parsed dates."""
+        if self._date_index is None:
+            dates = self.frame.get('Incident Date')
+            if dates is None or not pd.api.types.is_datetime64_any_dtype(dates):
+                return None
+            self._date_index = DateIndex(dates)
+        return self._date_index
+
+    def date_bounds(self):
+        """First and last incident dates, as ``datetime.date``."""
+        index = self.date_index
+        return None if index is None else index.bounds()
+
+    @property
+    def timeseries(self):
+        """Daily series cube, or ``None`` without parsed dates."""
+        if self._timeseries is None and self.date_index is not None:
+            self._timeseries = self._flights.do('timeseries', TimeSeries, self.frame, FILTER_COLUMNS.values())
+        return self._timeseries
+
+    @property
+    def partitions(self):
+        """Cells of the filter dimensions."""
+        return self._partitioned()[0]
+
+    @property
+    def partition_codes(self):
+        """Cell of every row."""
+        return self._partitioned()[1]
+
+    def _partitioned(self):
+        if self._partitions is None:
+            self._partitions = self._flights.do('partitions', self._build_partitions)
+        return self._partitions
+
+    def _build_partitions(self):
+        partitions = Partitions(col for col in FILTER_COLUMNS.values() if col in self.frame.columns)
+        return partitions, partitions.assign(self.frame)
+
+    def cell_rows(self, state):
+        """Positions of the rows in the cells matching ``state``'s categorical filters, in table order."""
+        partitions = self.partitions
+        if self._cell_slices is None:
+            self._cell_slices = group_slices(self.partition_codes, len(partitions))
+        order, bounds = self._cell_slices
+        cells = partitions.select(state)
+        # Only the rows of the selected cells are visited
+        return np.sort(np.concatenate([order[bounds[cell]:bounds[cell + 1]] for cell in cells]
+                                      + [np.empty(0, dtype=order.dtype)]))
+
+    @property
+    def moments(self):
+        """Correlation moments per partition cell."""
+        if self._moments is None:
+            self._moments = self._flights.do('moments', self._build_moments)
+        return self._moments
+
+    def _build_moments(self):
+        partitions = self.partitions
+        table = MomentTable(aggregations.correlation_columns(self.frame))
+        values = self.frame[table.columns].to_numpy(dtype=float)
+        table.add(values, self.partition_codes, len(partitions))
+        return table
+
+    @property
+    def spatial_index(self):
+        """Grid index over the coordinates, or ``None`` without them."""
+        if self._spatial_index is None and {'LATITUDE', 'LONGITUDE'} <= set(self.frame.columns):
+            self._spatial_index = self._flights.do('spatial_index', GridIndex, self.frame['LATITUDE'], self.frame['LONGITUDE'])
+        return self._spatial_index
+
+    def value_index(self, column):
+        """Rows grouped by the values of ``column``, built on first use."""
+        if column not in self._value_indexes:
+            self._value_indexes[column] = self._flights.do(('value_index', column), ValueIndex, self.frame[column])
+        return self._value_indexes[column]
+
+    def value_table(self, column):
+        """Exact counts of every value code of ``column`` per partition cell."""
+        if column not in self._value_tables:
+            self._value_tables[column] = self._flights.do(('value_table', column), self._build_value_table, column)
+        return self._value_tables[column]
+
+    def _build_value_table(self, column):
+        partitions = self.partitions
+        index = self.value_index(column)
+        n_values = len(index.values)
+        valid = index.row_codes >= 0
+        cells = self.partition_codes[valid] * n_values + index.row_codes[valid]
+        counts = np.bincount(cells, minlength=len(partitions) * n_values)
+        return counts.reshape(len(partitions), n_values)
+
+    def season_table(self, measure):
+        """Incidents or victims of every partition cell by calendar month, ``(cells, 12)``."""
+        if measure not in self._season_tables:
+            self._season_tables[measure] = self._flights.do(('season_table', measure), self._build_season_table, measure)
+        return self._season_tables[measure]
+
+    def _build_season_table(self, measure):
+        partitions = self.partitions
+        months = self.frame['Month'].cat.codes.to_numpy()
+        valid = months >= 0
+        weights = None if measure == 'Incidents' else self.frame[aggregations.VICTIMS].to_numpy(dtype=float)[valid]
+        cells = self.partition_codes[valid] * 12 + months[valid]
+        return np.bincount(cells, weights=weights, minlength=len(partitions) * 12).reshape(len(partitions), 12)
+
+    def flow_table(self, origin, destination):
+        """Sparse ``origin`` x ``destination`` incidents and victims per partition cell."""
+        key = (origin, destination)
+        if key not in self._flow_tables:
+            self._flow_tables[key] = self._flights.do(('flow_table',) + key, self._build_flow_table, origin, destination)
+        return self._flow_tables[key]
+
+    def _build_flow_table(self, origin, destination):
+        partitions = self.partitions
+        return FlowTable(self.frame[origin], self.frame[destination], self.partition_codes, len(partitions),
+                         self.frame.get(aggregations.VICTIMS))
+
+    @property
+    def heavy_hitters(self):
+        """Stream sketches of the high-cardinality columns, updated as rows are appended."""
+        if self._heavy_hitters is None:
+            columns = [col for col in STREAM_COLUMNS if col in self.frame.columns]
+            self._heavy_hitters = self._flights.do('heavy_hitters', HeavyHitters(columns).update, self.frame)
+        return self._heavy_hitters
+
+    def distribution(self, column, by=None):
+        """Value counts of ``column`` per partition cell and value of ``by``."""
+        if (column, by) not in self._distributions:
+            groups = None if by is None else self.value_index(by).row_codes
+            self._distributions[column, by] = self._flights.do(
+                ('distribution', column, by), Distribution, self.frame[column], self.partition_codes, groups)
+        return self._distributions[column, by]
+
+    @property
+    def text_index(self):
+        """Keyword index over the free-text columns."""
+        if self._text_index is None:
+            self._text_index = self._flights.do('text_index', TextIndex, self.frame)
+        return self._text_index
+
+    def sort_order(self, column, ascending=True):
+        """Permutation of all rows sorted by ``column``, missing values last."""
+        key = (column, ascending)
+        if key not in self._sort_orders:
+            self._sort_orders[key] = self._flights.do(('sort_order',) + key, self._build_sort_order, column, ascending)
+        return self._sort_orders[key]
+
+    def _build_sort_order(self, column, ascending):
+        values = self.frame[column].reset_index(drop=True)
+        try:
+            ordered = values.sort_values(ascending=ascending, na_position='last', kind='stable')
+        except TypeError:
+            # Mixed types (e.g. numbers among strings) sort as text
+            ordered = values.astype(str).where(values.notna()).sort_values(
+                ascending=ascending, na_position='last', kind='stable')
+        return ordered.index.to_numpy()
+
+    def positions(self, state):
+        """Row positions selected by ``state``, in table order."""
+        return self.frame.index.get_indexer(self.filtered(state).index)
+
+    def page(self, positions, number, size):
+        """Rows of page ``number`` (from 0) of ``positions``, decoded for display."""
+        return decoded_columns(self.frame.iloc[positions[number * size:(number + 1) * size]])
+
+    def _rows(self, state):
+        """Positions selected by the row-level filters, or ``None`` for all rows."""
+        found = []
+        if any(getattr(state, field) is not None for field in FILTER_COLUMNS):
+            found.append(self.cell_rows(state))
+        if state.dates is not None and self.date_index is not None:
+            start, end = (datetime.date.fromisoformat(day) for day in state.dates)
+            # Binary search on the date index
+            found.append(self.date_index.window(start, end))
+        if state.near is not None and self.spatial_index is not None:
+            found.append(self.spatial_index.radius(*state.near))
+        if state.bounds is not None and self.spatial_index is not None:
+            found.append(self.spatial_index.bbox(*state.bounds))
+        for column, values in state.picks or ():
+            if column in self.frame.columns:
+                found.append(self.value_index(column).rows(values))
+        if not found:
+            return None
+        rows = found[0]
+        for positions in found[1:]:
+            rows = np.intersect1d(rows, positions, assume_unique=True)
+        return rows
+
+    def _select(self, state):
+        rows = self._rows(state)
+        return self.frame if rows is None else self.frame.iloc[rows]
+
+    def filtered(self, state):
+        with self._lock:
+            if state in self._filtered:
+                self._filtered.move_to_end(state)
+                return self._filtered[state]
+        df = self._flights.do(('filtered', state), self._select, state)
+        with self._lock:
+            self._filtered[state] = df
+            while len(self._filtered) > 16:
+                self._filtered.popitem(last=False)
+        return df
+
+    @property
+    def row_hashes(self):
+        """Hash of every row, to recognize files that extend this one."""
+        if self._row_hashes is None:
+            self._row_hashes = pd.util.hash_pandas_object(self.frame, index=False).to_numpy()
+        return self._row_hashes
+
+    def hotspot_graph(self, eps_km):
+        """Pairs of locations within ``eps_km``, shared by every filter state."""
+        eps_km = float(eps_km)
+        with self._lock:
+            if eps_km in self._hotspot_graphs:
+                self._hotspot_graphs.move_to_end(eps_km)
+                return self._hotspot_graphs[eps_km]
+        graph = self._flights.do(('hotspot_graph', eps_km), HotspotGraph.from_frame, self.frame, eps_km)
+        with self._lock:
+            self._hotspot_graphs[eps_km] = graph
+            # Wide radii pair millions of locations: keep a few
+            while len(self._hotspot_graphs) > 4:
+                self._hotspot_graphs.popitem(last=False)
+        return graph
+
+    def hotspots(self, state, eps_km, min_samples):
+        """Hotspot clustering of the rows selected by ``state``."""
+        rows = None if state == FilterState() else self.positions(state)
+        return self.hotspot_graph(eps_km).clusters(rows, self.frame.get(aggregations.VICTIMS), min_samples)
+
+    def appended(self, frame, name=None, key=None):
+        """New dataset with ``frame``'s rows added after these.
+
+        Hotspot graphs and stream sketches already built are carried over
+        and only extended with the new rows.
+        """
+        chunk = prepare(frame)
+        # Chunks have their own string pools: concatenation decodes, so encode again
+        combined = encode_strings(pd.concat([self.frame, chunk], ignore_index=True))
+        dataset = Dataset(combined, key or frame_key(combined), name or self.name, self.sample)
+        with self._lock:
+            graphs = list(self._hotspot_graphs.items())
+        for eps_km, graph in graphs:
+            dataset._hotspot_graphs[eps_km] = copy.deepcopy(graph).extend(chunk['LATITUDE'], chunk['LONGITUDE'])
+        if self._heavy_hitters is not None:
+            dataset._heavy_hitters = copy.deepcopy(self._heavy_hitters).update(chunk)
+        return register(dataset)
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+_leases = {}
+_default_lock = threading.Lock()
+_default = []
+
+
+def register(dataset):
+    """Share one instance per content key."""
+    with _datasets_lock:
+        return _datasets.setdefault(dataset.key, dataset)
+
+
+def get_dataset(key):
+    with _datasets_lock:
+        return _datasets.get(key)
+
+
+class DatasetLease:
+    """A session's hold on a shared dataset, released when garbage collected.
+
+    Keep the lease in the session state: when the session ends or switches
+    to another dataset the lease is dropped, and a dataset that no session
+    holds any more is unregistered and its cached sections evicted. Default
+    datasets are never freed.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        with _datasets_lock:
+            _datasets.setdefault(dataset.key, dataset)
+            _leases[dataset.key] = _leases.get(dataset.key, 0) + 1
+        weakref.finalize(self, _release, dataset.key)
+
+
+def lease(dataset):
+    """Hold ``dataset`` for as long as the returned lease is referenced."""
+    return DatasetLease(dataset)
+
+
+def _release(key):
+    with _datasets_lock:
+        _leases[key] -= 1
+        if _leases[key] or any(dataset.key == key for dataset in _default):
+            return
+        del _leases[key]
+        _datasets.pop(key, None)
+    with _cache_lock:
+        for cached in [cached for cached in _cache if cached[0] == key]:
+            del _cache[cached]
+    logger.info("Freed dataset %s", key)
+
+
+def load_dataset(payload, name, progress=None):
+    """Parse uploaded bytes, reusing an already loaded dataset with the same content.
+
+    ``progress(stage, fraction)`` is called while the file is parsed
+    (``'parsing'``) and normalized (``'normalizing'``).
+    """
+    key = content_key(payload)
+    dataset = get_dataset(key)
+    if dataset is None:
+        backend = shared_cache()
+        if backend is None:
+            frame = _parse(payload, name, progress)
+        else:
+            # Parsed once per deployment, whichever process gets the file first
+            frame = backend.get_or_compute(cache_key('dataset', key), _parse, payload, name, progress)
+        dataset = _extension(frame, key, name) or register(Dataset(frame, key, name))
+    return dataset
+
+
+def _extension(frame, key, name):
+    """``frame`` as rows appended to a loaded dataset it starts with, or ``None``.
+
+    Exports are usually re-downloaded with new incidents at the end: the
+    indexes already built for the previous export are then extended rather
+    than rebuilt.
+    """
+    with _datasets_lock:
+        loaded = sorted(_datasets.values(), key=lambda dataset: len(dataset.frame), reverse=True)
+    hashes = None
+    for base in loaded:
+        if base.sample or not 0 < len(base.frame) < len(frame) or list(base.frame.columns) != list(frame.columns):
+            continue
+        if hashes is None:
+            hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        if np.array_equal(hashes[:len(base.frame)], base.row_hashes):
+            return base.appended(frame.iloc[len(base.frame):].copy(), name, key)
+    return None
+
+
+def _parse(payload, name, progress=None):
+    if progress is None:
+        source = io.BytesIO(payload)
+    else:
+        source = ProgressReader(payload, lambda fraction: progress('parsing', fraction))
+    frame = read_file(source, name)
+    if progress is not None:
+        progress('normalizing', 0.0)
+    return prepare(frame)
+
+
+_stores = {}
+
+
+def open_store(root):
+    """Partition store under ``root``, reading its manifest once per process."""
+    with _datasets_lock:
+        if root not in _stores:
+            _stores[root] = PartitionStore(root)
+        return _stores[root]
+
+
+def load_store(root, state=None):
+    """Dataset of the partitions of the store under ``root`` that ``state`` can select (all by default).
+
+    Only those partitions are read from disk; years and regions outside the
+    selection cost neither memory nor scan time.
+    """
+    store = open_store(root)
+    # Parquet round trips change some dtypes: not the same dataset as the source file
+    key = f'{store.key}:parquet'
+    ids = None if state is None else store.select(state)
+    if ids is not None and len(ids) < len(store):
+        key = f'{key}:{content_key(ids.astype(np.int64).tobytes())[:12]}'
+    dataset = get_dataset(key)
+    if dataset is None:
+        dataset = register(Dataset(store.read(ids), key, os.path.basename(os.path.normpath(root))))
+    return dataset
+
+
+def store_totals(root, state):
+    """Incidents and column sums selected by ``state`` from the store manifest, reading no partition.
+
+    ``None`` when ``state`` filters on more than the partition columns.
+    """
+    store = open_store(root)
+    if state.dates is not None or state.row_level or any(
+            getattr(state, field) is not None and column not in store.partition_columns
+            for field, column in FILTER_COLUMNS.items()):
+        return None
+    return store.totals(store.select(state))
+
+
+def load_columns(root):
+    """Dataset of the column store under ``root``, its columns memory-mapped.
+
+    The mapped pages are shared by every process that opens the store, and
+    the keyword index saved with it is not rebuilt.
+    """
+    key, frame = read_columns(root)
+    # Compacted dtypes: not the same dataset as the source file
+    key = f'{key}:columns'
+    dataset = get_dataset(key)
+    if dataset is None:
+        dataset = Dataset(frame, key, os.path.basename(os.path.normpath(root)))
+        dataset._text_index = TextIndex.load(root)
+        dataset = register(dataset)
+    return dataset
+
+
+def default_datasets():
+    """Load the configured default datasets once per process."""
+    with _default_lock:
+        if not _default:
+            for path in default_dataset_paths():
+                if not os.path.exists(path):
+                    logger.warning("Default dataset %s not found", path)
+                    continue
+                _default.append(load_path(path))
+        return list(_default)
+
+
+def load_path(path):
+    """Dataset of the file, column store or partition store at ``path``."""
+    if is_column_store(path):
+        return load_columns(path)
+    if os.path.isdir(path):
+        return load_store(path)
+    with open(path, 'rb') as f:
+        return load_dataset(f.read(), os.path.basename(path))
+
+
+def default_dataset():
+    datasets = default_datasets()
+    return datasets[0] if datasets else None
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def _daily_series(dataset, state):
+    if state.row_level:
+        return daily_from_rows(dataset.filtered(state))
+    return dataset.timeseries.daily(state)
+
+
+def _trend(dataset, state, granularity):
+    # Rolled up from the cached daily series, whatever the granularity
+    return rollup(section(dataset, state, 'daily_series'), granularity)
+
+
+def _top_values(dataset, state, column, n):
+    """The ``n`` most frequent values, like ``value_counts().head(n)``."""
+    if not state.cell_aligned:
+        return aggregations.value_counts(dataset.filtered(state), column).head(n)
+    table = dataset.value_table(column)
+    counts = table[dataset.partitions.select(state)].sum(axis=0)
+    top = np.argsort(-counts, kind='stable')[:n]
+    top = top[counts[top] > 0]
+    values = dataset.value_index(column).values
+    return pd.Series(counts[top], index=pd.Index(values[top], name=column), name='count')
+
+
+def _heavy_hitters(dataset, state, column, n):
+    """Approximate ``top_values`` of a high-cardinality column, from the stream sketches.
+
+    The sketches cover every row: filtered states are counted from the selected rows.
+    """
+    if state != FilterState() or column not in dataset.heavy_hitters.columns:
+        return aggregations.value_counts(dataset.filtered(state), column).head(n)
+    return dataset.heavy_hitters.top(column, n)
+
+
+def _merged_distribution(dataset, state, column, by):
+    if state.cell_aligned:
+        distribution = dataset.distribution(column, by)
+        return distribution, distribution.merged(dataset.partitions.select(state))
+    # Row-level filters: a distribution over the selected rows only
+    df = dataset.filtered(state)
+    groups = None if by is None else pd.Index(dataset.value_index(by).values).get_indexer(df[by])
+    distribution = Distribution(df[column], np.zeros(len(df), dtype=np.int64), groups)
+    return distribution, distribution.merged()
+
+
+def _distribution(dataset, state, column, by=None):
+    """Incidents, quantiles and maximum of ``column``, overall or per value of ``by``."""
+    distribution, counts = _merged_distribution(dataset, state, column, by)
+    labels = ['All'] if by is None else list(dataset.value_index(by).values[:distribution.n_groups])
+    rows = []
+    for label, group in zip(labels, counts):
+        n = group.sum()
+        if not n:
+            continue
+        present = distribution.values[group > 0]
+        rows.append({
+            by or 'Group': label,
+            'Incidents': int(n),
+            'Mean': float(group @ distribution.values / n),
+            **dict(zip(QUANTILES, stats.quantiles(distribution.values, group, list(QUANTILES.values())))),
+            'Max': float(present[-1]),
+        })
+    columns = [by or 'Group', 'Incidents', 'Mean'] + list(QUANTILES) + ['Max']
+    return pd.DataFrame(rows, columns=columns).sort_values('Incidents', ascending=False, ignore_index=True)
+
+
+def _histogram(dataset, state, column, edges):
+    distribution, counts = _merged_distribution(dataset, state, column, None)
+    return stats.histogram(distribution.values, counts.sum(axis=0), np.asarray(edges, dtype=float))
+
+
+def _search(dataset, state, query):
+    """Positions of the rows selected by ``state`` matching the keywords of ``query``."""
+    matches = dataset.text_index.search(query)
+    return np.intersect1d(dataset.positions(state), matches, assume_unique=True)
+
+
+def _row_order(dataset, state, column=None, ascending=True, query=None):
+    """Positions of the rows selected by ``state`` and ``query``, sorted by ``column``."""
+    positions = dataset.positions(state) if query is None else section(dataset, state, 'search', query)
+    if column is None:
+        return positions
+    # The selected rows, picked out of the precomputed permutation
+    selected = np.zeros(len(dataset.frame), dtype=bool)
+    selected[positions] = True
+    order = dataset.sort_order(column, ascending)
+    return order[selected[order]]
+
+
+def _seasonality(dataset, state, measure):
+    if not state.cell_aligned or 'Incident Year' not in dataset.partitions.dimensions:
+        return aggregations.seasonality(dataset.filtered(state), measure)
+    # Every cell lies in one year: the selected cells' monthly rows are summed by year
+    cells = dataset.partitions.select(state)
+    table = dataset.season_table(measure)[cells]
+    years = dataset.partitions.keys['Incident Year'].to_numpy(dtype=float)[cells]
+    matrix = aggregations.season_matrix(np.repeat(years, 12), np.tile(np.arange(12), len(cells)), table.ravel())
+    return matrix.astype(np.int64) if measure == 'Incidents' else matrix
+
+
+def _flows(dataset, state, origin, destination):
+    if not state.cell_aligned:
+        return aggregations.flows(dataset.filtered(state), origin, destination)
+    return dataset.flow_table(origin, destination).flows(dataset.partitions.select(state))
+
+
+def _month_counts(dataset, state):
+    # Counted from Month alone: rows without a year still have their month
+    if not state.cell_aligned:
+        return aggregations.month_counts(dataset.filtered(state))
+    counts = dataset.season_table('Incidents')[dataset.partitions.select(state)].sum(axis=0)
+    return pd.Series(counts.astype(np.int64), index=pd.Index(MONTHS, name='Month'))
+
+
+def _hotspots(dataset, state, eps_km, min_samples):
+    if dataset.spatial_index is None:
+        return None
+    return dataset.hotspots(state, eps_km, min_samples)
+
+
+def _cause_wordcloud(dataset, state):
+    # Laid out from the indexed counts instead of the selected rows
+    return aggregations.wordcloud(_top_values(dataset, state, 'Cause of Death', aggregations.WORDCLOUD_WORDS))
+
+
+def _survival_rate(dataset, state):
+    # From the cached sums the dashboards also show
+    return aggregations.survival_rates(section(dataset, state, 'survival_by_type'))
+
+
+def _correlation(dataset, state):
+    table = dataset.moments
+    if len(table.columns) < 3:
+        return None
+    if not state.cell_aligned:
+        # Date windows and areas cut across cells: one pass over the selected rows
+        values = dataset.filtered(state)[table.columns].to_numpy(dtype=float)
+        return stats.correlation(moments(values), table.columns)
+    return table.correlation(dataset.partitions.select(state))
+
+
+# Sections answered from per-dataset indexes rather than the filtered rows
+INDEXED_SECTIONS = {
+    'daily_series': _daily_series,
+    'trend': _trend,
+    'correlation': _correlation,
+    'survival_rate': _survival_rate,
+    'hotspots': _hotspots,
+    'cause_wordcloud': _cause_wordcloud,
+    'seasonality': _seasonality,
+    'month_counts': _month_counts,
+    'flows': _flows,
+    'top_values': _top_values,
+    'heavy_hitters': _heavy_hitters,
+    'distribution': _distribution,
+    'histogram': _histogram,
+    'search': _search,
+    'row_order': _row_order,
+}
+
+
+def section(dataset, state, name, *args):
+    """Aggregation ``name`` for ``dataset`` under ``state``, computed once."""
+    key = (dataset.key, state, name, args)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    # Sessions asking for the same section at once share one computation
+    return _flights.do(key, _compute, key, dataset, state, name, args)
+
+
+def _compute(key, dataset, state, name, args):
+    with _cache_lock:
+        # Another caller may have finished between the cache lookup and now
+        if key in _cache:
+            return _cache[key]
+    backend = shared_cache()
+    if backend is None or dataset.key is None:
+        result = _run_section(dataset, state, name, args)
+    else:
+        # Other processes of the deployment may have computed it already
+        result = backend.get_or_compute(cache_key('section', *key), _run_section, dataset, state, name, args)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _run_section(dataset, state, name, args):
+    if name in INDEXED_SECTIONS:
+        return INDEXED_SECTIONS[name](dataset, state, *args)
+    return aggregations.SECTIONS[name](dataset.filtered(state), *args)
+
+
+def warm(dataset, state):
+    """Compute every dashboard section for ``state`` ahead of time."""
+    df = dataset.filtered(state)
+    for spec in aggregations.DASHBOARD_SECTIONS:
+        if not all(col in df.columns for col in aggregations.required_columns(*spec)):
+            continue
+        if spec[0] == 'trend' and dataset.timeseries is None:
+            continue
+        try:
+            section(dataset, state, *spec)
+        except Exception:
+            logger.exception("Warm-up of %s failed for %s", spec, dataset.name)
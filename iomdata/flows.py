@@ -0,0 +1,76 @@
+"""Origin-to-destination flows of incidents.
+
+Flows are kept per partition cell as sparse ``(origin, destination)`` sums
+of incidents and victims, sorted by cell, so the flows of a filter state are
+the merge of its cells' entries without going back to the rows. Origins
+may list several places separated by commas; such an incident is split
+evenly between them, so flows add up to the incident and victim totals.
+"""
+import numpy as np
+import pandas as pd
+
+SEPARATOR = ','
+
+
+def split_values(series):
+    """``(rows, ids, names)``: one entry per listed value of every row, and the distinct names."""
+    codes, uniques = pd.factorize(series)
+    names = {}
+    ids = []
+    # Each distinct value is split once
+    for value in uniques:
+        parts = [part.strip() for part in str(value).split(SEPARATOR)]
+        ids.append([names.setdefault(part, len(names)) for part in parts if part])
+    lengths = np.array([len(value_ids) for value_ids in ids] + [0], dtype=np.int64)
+    flat = np.array([i for value_ids in ids for i in value_ids], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    # Missing values (code -1) pick the trailing empty entry
+    row_lengths = lengths[codes]
+    rows = np.repeat(np.arange(len(codes)), row_lengths)
+    within = np.arange(len(rows)) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+    return rows, flat[starts[codes][rows] + within], np.array(list(names), dtype=object)
+
+
+class FlowTable:
+    """Sparse origin x destination sums of every partition cell."""
+
+    def __init__(self, origins, destinations, cells, n_cells, victims=None):
+        rows, origin_ids, self.origins = split_values(origins)
+        destination_codes, destinations = pd.factorize(destinations)
+        self.destinations = np.asarray(destinations, dtype=object)
+        self.n_destinations = len(self.destinations)
+        # Share of the row given to each of its origins
+        weights = 1 / np.bincount(rows, minlength=len(destination_codes))[rows]
+        keep = destination_codes[rows] >= 0
+        rows, origin_ids, weights = rows[keep], origin_ids[keep], weights[keep]
+        n_pairs = len(self.origins) * self.n_destinations
+        pairs = origin_ids * self.n_destinations + destination_codes[rows]
+        keys, inverse = np.unique(np.asarray(cells, dtype=np.int64)[rows] * n_pairs + pairs, return_inverse=True)
+        self.cells = keys // n_pairs
+        self.pairs = keys % n_pairs
+        self.incidents = np.bincount(inverse, weights=weights, minlength=len(keys))
+        victims = np.zeros(len(destination_codes)) if victims is None else np.nan_to_num(np.asarray(victims, dtype=float))
+        self.victims = np.bincount(inverse, weights=weights * victims[rows], minlength=len(keys))
+        self.bounds = np.searchsorted(self.cells, np.arange(n_cells + 1))
+
+    @classmethod
+    def from_frame(cls, df, origin, destination, victims=None):
+        """Flows of the rows of ``df`` as a single cell."""
+        return cls(df[origin], df[destination], np.zeros(len(df), dtype=np.int64), 1,
+                   None if victims is None or victims not in df.columns else df[victims])
+
+    def flows(self, cells=None):
+        """Flows of ``cells`` (all by default), largest first: Origin, Destination, Incidents, Victims."""
+        if cells is None:
+            entries = np.arange(len(self.pairs))
+        else:
+            entries = np.concatenate([np.arange(self.bounds[cell], self.bounds[cell + 1]) for cell in cells]
+                                     + [np.empty(0, dtype=np.int64)])
+        pairs, inverse = np.unique(self.pairs[entries], return_inverse=True)
+        flows = pd.DataFrame({
+            'Origin': self.origins[pairs // self.n_destinations],
+            'Destination': self.destinations[pairs % self.n_destinations],
+            'Incidents': np.bincount(inverse, weights=self.incidents[entries], minlength=len(pairs)),
+            'Victims': np.bincount(inverse, weights=self.victims[entries], minlength=len(pairs)),
+        })
+        return flows.sort_values(['Incidents', 'Victims'], ascending=False, ignore_index=True)
@@ -0,0 +1,381 @@
+"""Density-based hotspot clustering of incident locations.
+
+DBSCAN with great-circle distances, accelerated by a grid on unit-sphere
+coordinates: with cells of side ``eps / sqrt(3)`` every pair of points in a
+cell is within ``eps`` of each other, so a cell holding ``min_samples``
+incidents is all core points, and neighbours are only searched in the
+``5 x 5 x 5`` block of cells around a point. Identical coordinates are
+merged into weighted points first.
+
+Inserting points never splits a cluster, so :meth:`HotspotIndex.extend`
+only revisits the cells around new points and keeps the union-find built
+so far.
+
+Filter states cluster different subsets of one dataset, so the dashboard
+uses a :class:`HotspotGraph` instead: the pairs of locations within
+``eps`` are found once per dataset and radius, and clustering a selection
+only weighs its rows onto those pairs.
+"""
+import numpy as np
+import pandas as pd
+
+from .spatial import EARTH_RADIUS_KM
+
+_BIAS = 1 << 20
+# Points whose neighbours are searched at once, to bound memory at wide radii
+_CHUNK = 2048
+_REACH = 2
+_OFFSETS = np.array([
+    (dx << 42) + (dy << 21) + dz
+    for dx in range(-_REACH, _REACH + 1)
+    for dy in range(-_REACH, _REACH + 1)
+    for dz in range(-_REACH, _REACH + 1)
+], dtype=np.int64)
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _expand(lo, counts):
+    # Concatenation of range(lo[i], lo[i] + counts[i]) for every i
+    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    return starts + np.arange(counts.sum())
+
+
+def _components(n, a, b):
+    """Root node of the connected component of every node of ``range(n)``, given the edges ``(a, b)``."""
+    labels = np.arange(n)
+    while len(a):
+        # Hook the root of either end under the smaller root
+        low = np.minimum(labels[a], labels[b])
+        np.minimum.at(labels, labels[a], low)
+        np.minimum.at(labels, labels[b], low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        # Edges inside one tree are done
+        apart = labels[a] != labels[b]
+        a, b = a[apart], b[apart]
+    return labels
+
+
+def _octagon_inside(lon, lat):
+    """Points strictly inside the octagon of extreme points, which cannot be hull vertices (Akl-Toussaint)."""
+    corners = [np.argmin(lon), np.argmin(lon + lat), np.argmin(lat), np.argmax(lon - lat),
+               np.argmax(lon), np.argmax(lon + lat), np.argmax(lat), np.argmin(lon - lat)]
+    corners = [c for i, c in enumerate(corners) if c != corners[i - 1]]
+    inside = np.full(len(lon), len(corners) >= 3)
+    for o, a in zip(corners, corners[1:] + corners[:1]):
+        inside &= (lon[a] - lon[o]) * (lat - lat[o]) - (lat[a] - lat[o]) * (lon - lon[o]) > 0
+    return inside
+
+
+def convex_hull(lon, lat):
+    """Hull of a point set as closed ``(lon, lat)`` rings (monotone chain)."""
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    if len(lon) > 16:
+        outside = ~_octagon_inside(lon, lat)
+        lon, lat = lon[outside], lat[outside]
+    points = sorted(set(zip(lon.tolist(), lat.tolist())))
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    hull = lower[:-1] + upper[:-1]
+    return hull + hull[:1]
+
+
+def summaries(labels, lat, lon, weight, victims):
+    """One row per cluster label of the points, largest first, with its hull polygon."""
+    clustered = np.flatnonzero(labels >= 0)
+    n = int(labels[clustered].max()) + 1 if len(clustered) else 0
+    order = clustered[np.argsort(labels[clustered], kind='stable')]
+    bounds = np.searchsorted(labels[order], np.arange(n + 1))
+    groups = labels[clustered]
+    incidents = np.bincount(groups, weights=weight[clustered], minlength=n)
+    columns = ['Incidents', 'Victims', 'Latitude', 'Longitude', 'Locations', 'Hull']
+    return pd.DataFrame({
+        'Incidents': incidents.astype(np.int64),
+        'Victims': np.bincount(groups, weights=victims[clustered], minlength=n).astype(np.int64),
+        'Latitude': np.bincount(groups, weights=(lat * weight)[clustered], minlength=n) / incidents,
+        'Longitude': np.bincount(groups, weights=(lon * weight)[clustered], minlength=n) / incidents,
+        'Locations': np.bincount(groups, minlength=n),
+        'Hull': [convex_hull(lon[order[lo:hi]], lat[order[lo:hi]]) for lo, hi in zip(bounds[:-1], bounds[1:])],
+    }, columns=columns).sort_values('Victims', ascending=False, ignore_index=True)
+
+
+class HotspotIndex:
+    """Incremental grid DBSCAN over weighted locations."""
+
+    def __init__(self, eps_km=25.0, min_samples=10):
+        self.eps_km = float(eps_km)
+        self.min_samples = min_samples
+        self.chord = 2 * np.sin(self.eps_km / EARTH_RADIUS_KM / 2)
+        self.side = self.chord / np.sqrt(3)
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.weight = np.empty(0)
+        self.victims = np.empty(0)
+        self.xyz = np.empty((0, 3))
+        self.codes = np.empty(0, dtype=np.int64)
+        self.core = np.empty(0, dtype=bool)
+        self.border = np.empty(0, dtype=np.int64)
+        self.parent = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, eps_km=25.0, min_samples=10, victims='Total Number of Dead and Missing'):
+        index = cls(eps_km, min_samples)
+        index.extend(df['LATITUDE'], df['LONGITUDE'], df[victims] if victims in df.columns else None)
+        return index
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _rebuild_grid(self):
+        self.order = np.argsort(self.codes, kind='stable')
+        self.cell_codes, self.cell_start = np.unique(self.codes[self.order], return_index=True)
+        self.cell_end = np.append(self.cell_start[1:], len(self.codes))
+        cell = np.searchsorted(self.cell_codes, self.codes)
+        self.cell_weight = np.bincount(cell, weights=self.weight, minlength=len(self.cell_codes))
+        self.point_cell = cell
+        # Neighbouring cell of every cell for every offset, -1 when empty
+        target = self.cell_codes[:, None] + _OFFSETS[None, :]
+        found = np.minimum(np.searchsorted(self.cell_codes, target), len(self.cell_codes) - 1)
+        self.cell_neighbours = np.where(self.cell_codes[found] == target, found, -1)
+
+    def _candidates(self, sources):
+        """Pairs (source, point) for points in the cells around each source."""
+        neighbours = self.cell_neighbours[self.point_cell[sources]]
+        hit = neighbours >= 0
+        cells = neighbours[hit]
+        lo, hi = self.cell_start[cells], self.cell_end[cells]
+        counts = hi - lo
+        src = np.repeat(np.broadcast_to(sources[:, None], neighbours.shape)[hit], counts)
+        return src, self.order[_expand(lo, counts)]
+
+    def _neighbours(self, sources, targets_mask=None):
+        src, tgt = self._candidates(sources)
+        if targets_mask is not None:
+            keep = targets_mask[tgt]
+            src, tgt = src[keep], tgt[keep]
+        close = ((self.xyz[src] - self.xyz[tgt]) ** 2).sum(axis=1) <= self.chord ** 2
+        return src[close], tgt[close]
+
+    def _find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def _union(self, a, b):
+        for i, j in zip(a, b):
+            ri, rj = self._find(i), self._find(j)
+            if ri != rj:
+                self.parent[max(ri, rj)] = min(ri, rj)
+
+    def _add(self, lat, lon, victims=None):
+        """Add incidents as weighted points, without clustering; returns the point of each (-1 when invalid)."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        victims = np.zeros(len(lat)) if victims is None else np.asarray(victims, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        points = np.full(len(lat), -1, dtype=np.int64)
+        if not valid.any():
+            return points
+        # Identical coordinates become one weighted point
+        batch = pd.DataFrame({'lat': lat[valid], 'lon': lon[valid], 'victims': victims[valid]})
+        groups = batch.groupby(['lat', 'lon'], sort=False)
+        points[valid] = len(self.lat) + groups.ngroup().to_numpy()
+        batch = groups.agg(
+            weight=('victims', 'size'),
+            victims=('victims', 'sum'),
+        ).reset_index()
+
+        xyz = _unit_vectors(batch['lat'].to_numpy(), batch['lon'].to_numpy())
+        keys = np.floor(xyz / self.side).astype(np.int64) + _BIAS
+        self.lat = np.append(self.lat, batch['lat'].to_numpy())
+        self.lon = np.append(self.lon, batch['lon'].to_numpy())
+        self.weight = np.append(self.weight, batch['weight'].to_numpy(dtype=float))
+        self.victims = np.append(self.victims, batch['victims'].to_numpy())
+        self.xyz = np.vstack([self.xyz, xyz])
+        self.codes = np.append(self.codes, (keys[:, 0] << 42) | (keys[:, 1] << 21) | keys[:, 2])
+        self.core = np.append(self.core, np.zeros(len(batch), dtype=bool))
+        self.border = np.append(self.border, np.full(len(batch), -1, dtype=np.int64))
+        self.parent = np.append(self.parent, np.arange(len(self.parent), len(self.lat)))
+        self._rebuild_grid()
+        return points
+
+    def extend(self, lat, lon, victims=None):
+        """Add incidents and update the clustering around them."""
+        start = len(self.lat)
+        if not (self._add(lat, lon, victims) >= 0).any():
+            return self
+
+        # Points whose neighbourhood may have changed
+        new = np.arange(start, len(self.lat))
+        if start:
+            mask = np.zeros(len(self.lat), dtype=bool)
+            mask[self._candidates(new)[1]] = True
+            mask[new] = True
+            affected = np.flatnonzero(mask)
+        else:
+            affected = new
+
+        # Core points: dense cells at once, the others by summing neighbour weights
+        was_core = self.core[affected]
+        dense = self.cell_weight[self.point_cell[affected]] >= self.min_samples
+        self.core[affected[dense]] = True
+        sparse = affected[~dense & ~self.core[affected]]
+        if len(sparse):
+            src, tgt = self._neighbours(sparse)
+            counts = np.bincount(src, weights=self.weight[tgt], minlength=len(self.lat))
+            self.core[sparse[counts[sparse] >= self.min_samples]] = True
+        cores = affected[self.core[affected]]
+        if not len(cores):
+            return self
+
+        # Core points of a cell are all within eps: join them to the cell's first core
+        core_points = np.flatnonzero(self.core)
+        cells, first = np.unique(self.point_cell[core_points], return_index=True)
+        leader = np.full(len(self.cell_codes), -1, dtype=np.int64)
+        leader[cells] = core_points[first]
+        self._union(cores, leader[self.point_cell[cores]])
+
+        # Across cells, one link per pair of cells is enough
+        src, tgt = self._neighbours(cores, self.core)
+        a, b = leader[self.point_cell[src]], leader[self.point_cell[tgt]]
+        n = len(self.lat)
+        links = np.unique(np.minimum(a, b) * n + np.maximum(a, b))
+        self._union(links // n, links % n)
+
+        # Border points: non-core points near a core point, including old
+        # noise around points that just became core
+        mask = np.zeros(len(self.lat), dtype=bool)
+        mask[self._candidates(affected[self.core[affected] & ~was_core])[1]] = True
+        mask[affected] = True
+        others = np.flatnonzero(mask & ~self.core)
+        if len(others):
+            src, tgt = self._neighbours(others, self.core)
+            found, first = np.unique(src, return_index=True)
+            self.border[others] = -1
+            self.border[found] = tgt[first]
+        return self
+
+    def labels(self):
+        """Cluster label of every point, ``-1`` for noise."""
+        roots = np.full(len(self.lat), -1, dtype=np.int64)
+        for i in np.flatnonzero(self.core):
+            roots[i] = self._find(i)
+        attached = (~self.core) & (self.border >= 0)
+        roots[attached] = roots[self.border[attached]]
+        labels = np.full(len(self.lat), -1, dtype=np.int64)
+        clustered = roots >= 0
+        labels[clustered] = pd.factorize(roots[clustered])[0]
+        return labels
+
+    def clusters(self):
+        """One row per hotspot, largest first, with its hull polygon."""
+        return summaries(self.labels(), self.lat, self.lon, self.weight, self.victims)
+
+
+class HotspotGraph:
+    """Locations of a dataset and every pair of them within ``eps_km``.
+
+    The pairs are found once, on the grid of a :class:`HotspotIndex`.
+    Clustering the incidents of a filter state then measures no distance:
+    its rows are weighed onto their locations, core locations are those
+    whose neighbourhood weighs ``min_samples`` and hotspots are the
+    connected core locations with the locations bordering them, as DBSCAN
+    over the selected rows finds them.
+    """
+
+    def __init__(self, eps_km=25.0):
+        self.grid = HotspotIndex(eps_km)
+        self.eps_km = self.grid.eps_km
+        # Location of every row, -1 without coordinates
+        self.points = np.empty(0, dtype=np.int64)
+        # Pairs of locations within eps_km, first < second
+        self.first = np.empty(0, dtype=np.int64)
+        self.second = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, eps_km=25.0):
+        return cls(eps_km).extend(df['LATITUDE'], df['LONGITUDE'])
+
+    def __len__(self):
+        return len(self.grid)
+
+    def extend(self, lat, lon):
+        """Add rows after the current ones, pairing their new locations with the locations around them."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        coordinates = pd.MultiIndex.from_arrays([lat[valid], lon[valid]])
+        # Rows at a known location join it, the others add new locations
+        found = pd.MultiIndex.from_arrays([self.grid.lat, self.grid.lon]).get_indexer(coordinates)
+        start = len(self.grid)
+        codes, fresh = pd.factorize(coordinates[found < 0])
+        found[found < 0] = start + codes
+        points = np.full(len(lat), -1, dtype=np.int64)
+        points[valid] = found
+        self.points = np.append(self.points, points)
+        if not len(fresh):
+            return self
+        self.grid._add(fresh.get_level_values(0), fresh.get_level_values(1))
+        first, second = [self.first], [self.second]
+        new = np.arange(start, len(self.grid))
+        for sources in np.array_split(new, -(-len(new) // _CHUNK)):
+            src, tgt = self.grid._neighbours(sources)
+            # Pairs of two new locations are found from both ends
+            keep = (tgt < start) | (src < tgt)
+            first.append(np.minimum(src[keep], tgt[keep]))
+            second.append(np.maximum(src[keep], tgt[keep]))
+        self.first = np.concatenate(first)
+        self.second = np.concatenate(second)
+        return self
+
+    def clusters(self, rows=None, victims=None, min_samples=10):
+        """Hotspots of the rows at positions ``rows`` (all by default), as :meth:`HotspotIndex.clusters`.
+
+        ``victims`` holds the victims of every row.
+        """
+        n = len(self.grid)
+        points = self.points if rows is None else self.points[rows]
+        victims = np.zeros(len(self.points)) if victims is None else np.asarray(victims, dtype=float)
+        victims = victims if rows is None else victims[rows]
+        located = points >= 0
+        weight = np.bincount(points[located], minlength=n).astype(float)
+        victims = np.bincount(points[located], weights=victims[located], minlength=n)
+        present = weight > 0
+        live = present[self.first] & present[self.second]
+        a, b = self.first[live], self.second[live]
+        # Weight within eps of every location, its own included
+        reach = weight + np.bincount(a, weights=weight[b], minlength=n) + np.bincount(b, weights=weight[a], minlength=n)
+        core = present & (reach >= min_samples)
+        linked = core[a] & core[b]
+        roots = np.where(core, _components(n, a[linked], b[linked]), n)
+        # Border locations join the hotspot of a core neighbour, the same whatever the pair order
+        to_b, to_a = ~core[a] & core[b], core[a] & ~core[b]
+        np.minimum.at(roots, np.concatenate([a[to_b], b[to_a]]), roots[np.concatenate([b[to_b], a[to_a]])])
+        roots[roots == n] = -1
+        labels = np.full(n, -1, dtype=np.int64)
+        labels[roots >= 0] = pd.factorize(roots[roots >= 0])[0]
+        return summaries(labels, self.grid.lat, self.grid.lon, weight, victims)
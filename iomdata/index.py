@@ -0,0 +1,62 @@
+"""Indexes built once per dataset to answer filters without scanning rows."""
+import numpy as np
+import pandas as pd
+
+from .partitions import group_slices
+
+
+class DateIndex:
+    """Row positions sorted by ``Incident Date``.
+
+    Any date window maps to a contiguous slice of ``positions``, found with
+    two binary searches.
+    """
+
+    def __init__(self, dates):
+        days = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        valid = np.flatnonzero(~np.isnat(days))
+        order = np.argsort(days[valid], kind='stable')
+        self.positions = valid[order]
+        self.days = days[valid][order]
+
+    def __len__(self):
+        return len(self.days)
+
+    def bounds(self):
+        if not len(self.days):
+            return None
+        return self.days[0].item(), self.days[-1].item()
+
+    def slice(self, start, end):
+        """Slice of ``positions`` with ``start <= date <= end``."""
+        lo = np.searchsorted(self.days, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.days, np.datetime64(end, 'D'), side='right')
+        return slice(lo, hi)
+
+    def window(self, start, end):
+        """Row positions of the window, in table order."""
+        return np.sort(self.positions[self.slice(start, end)])
+
+
+class ValueIndex:
+    """Row positions grouped by the value of one column.
+
+    The rows of any set of values are the concatenation of their groups,
+    without comparing a single row.
+    """
+
+    def __init__(self, values):
+        self.row_codes, uniques = pd.factorize(values)
+        # Plain values, also for dictionary-encoded columns
+        self.values = np.asarray(uniques)
+        self.order, self.bounds = group_slices(self.row_codes, len(self.values))
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def rows(self, values):
+        """Row positions holding any of ``values``, in table order."""
+        groups = [self.order[self.bounds[code]:self.bounds[code + 1]]
+                  for code in (self.codes.get(value) for value in values) if code is not None]
+        return np.sort(np.concatenate(groups)) if groups else np.empty(0, dtype=np.int64)
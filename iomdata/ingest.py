@@ -0,0 +1,99 @@
+"""Background ingestion of uploaded files.
+
+Parsing a large workbook takes seconds. :func:`ingest` hands it to a worker
+thread and returns an :class:`IngestJob` that the dashboard polls for
+progress while it keeps serving the dataset it already shows. The job builds
+exactly what ``load_dataset`` would (same parsing, same content key) and only
+exposes it once its default sections are computed, so sessions switch over
+in one step. Identical uploads share one job.
+
+A job holds a lease on its dataset until the job itself is dropped, as when
+a session replaces or removes its upload: a dataset that no session went on
+to use is then freed like any other.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import engine
+from .data import content_key
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.environ.get('IOMDATA_INGEST_WORKERS', 1))
+
+# Share of the progress bar given to each stage; parsing dominates
+STAGES = {'queued': (0.0, 0.0), 'parsing': (0.0, 0.8), 'normalizing': (0.8, 0.9), 'indexing': (0.9, 1.0)}
+
+_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='iomdata-ingest')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class IngestJob:
+    """Parsing and indexing of one uploaded file, run on the ingestion pool."""
+
+    def __init__(self, payload, name, key):
+        self.key = key
+        self.name = name
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.dataset = None
+        self.error = None
+        self._lease = None
+        self._payload = payload
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns its dataset (``None`` on error)."""
+        self._done.wait(timeout)
+        return self.dataset
+
+    def _report(self, stage, fraction):
+        start, end = STAGES[stage]
+        self.stage = stage
+        self.progress = start + (end - start) * fraction
+
+    def _run(self):
+        try:
+            dataset = engine.load_dataset(self._payload, self.name, self._report)
+            self._lease = engine.lease(dataset)
+            self._report('indexing', 0.0)
+            engine.warm(dataset, engine.FilterState())
+            self.dataset = dataset
+            self.progress = 1.0
+        except Exception as e:
+            logger.exception("Ingestion of %s failed", self.name)
+            self.error = str(e)
+        finally:
+            self._payload = None
+            # Later uploads find the dataset registered, and a failed one can be retried
+            with _jobs_lock:
+                _jobs.pop(self.key, None)
+            self._done.set()
+
+
+def ingest(payload, name):
+    """Job loading ``payload`` in the background, shared by identical uploads."""
+    key = content_key(payload)
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None:
+            return job
+        job = _jobs[key] = IngestJob(payload, name, key)
+    dataset = engine.get_dataset(key)
+    if dataset is not None:
+        # Already ingested, e.g. by another session
+        job.dataset, job.stage, job.progress = dataset, 'indexing', 1.0
+        job._lease = engine.lease(dataset)
+        job._done.set()
+        with _jobs_lock:
+            _jobs.pop(key, None)
+    else:
+        _pool.submit(job._run)
+    return job
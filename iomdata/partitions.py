@@ -0,0 +1,61 @@
+"""Partitioning of rows into cells of the filter dimensions.
+
+Every combination of the sidebar filters (years, regions, types) is a union
+of cells, so aggregates kept per cell can be merged for any filter state
+without going back to the rows.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _normalized(key):
+    # NaN != NaN, so missing values are mapped to None for dictionary lookups
+    return tuple(None if pd.isna(value) else value for value in key)
+
+
+class Partitions:
+    """Cell ids for rows, stable across appends."""
+
+    def __init__(self, dimensions):
+        self.dimensions = list(dimensions)
+        self._ids = {}
+        self._keys = []
+        self._frame = None
+
+    def __len__(self):
+        return max(len(self._keys), 1)
+
+    def assign(self, frame):
+        """Cell id of every row of ``frame``, registering new cells."""
+        if not self.dimensions:
+            return np.zeros(len(frame), dtype=np.int64)
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(frame[self.dimensions]))
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            normalized = _normalized(key)
+            if normalized not in self._ids:
+                self._ids[normalized] = len(self._keys)
+                self._keys.append(key)
+                self._frame = None
+            ids[i] = self._ids[normalized]
+        return ids[codes]
+
+    @property
+    def keys(self):
+        """One row per cell with its dimension values."""
+        if self._frame is None:
+            self._frame = pd.DataFrame(self._keys, columns=self.dimensions)
+        return self._frame
+
+    def select(self, state):
+        """Ids of the cells matching ``state`` (its date window excluded)."""
+        if not self.dimensions:
+            return np.zeros(1, dtype=np.int64)
+        return state.apply(self.keys).index.to_numpy()
+
+
+def group_slices(codes, n_cells):
+    """Row order and per-cell bounds to iterate rows cell by cell."""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(n_cells + 1))
+    return order, bounds
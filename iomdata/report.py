@@ -0,0 +1,328 @@
+"""Static dashboard reports rendered without Streamlit.
+
+The dataset is read, normalized and split into slices once in the parent
+process; every worker of the pool receives the frame once and builds a
+dataset per slice, so a report only pays for its own rows. Given a partition
+store (see :mod:`iomdata.store`) and slices by years and regions, workers read
+their own partitions instead and the full frame is never loaded; the
+``--years`` and ``--regions`` filters only read the partitions they select.
+Reports share one copy of plotly.js next to them and open offline::
+
+    python -m iomdata.report migrants.xlsx --by regions years --format html png
+    python -m iomdata.report store --by years --regions Mediterranean
+"""
+import argparse
+import html
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+
+from . import engine
+from .aggregations import VICTIM_BUCKETS, VICTIMS
+from .columnstore import is_column_store
+from .data import default_dataset_paths
+from .sharedcache import cache_key
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('html', 'png')
+
+_frame = None
+_root = None
+
+
+class ReportError(RuntimeError):
+    """Some reports failed to render; ``written`` lists the files of the others."""
+
+    def __init__(self, failed, written):
+        super().__init__(f"{len(failed)} report(s) failed: {', '.join(failed)}")
+        self.failed = failed
+        self.written = written
+
+
+def slices(frame, by):
+    """``(values, positions)`` for every combination of the ``by`` columns present in the data."""
+    columns = [engine.FILTER_COLUMNS[field] for field in by]
+    if not columns:
+        return [((), None)]
+    groups = frame.groupby(columns, sort=True, observed=True).indices
+    return [(values if isinstance(values, tuple) else (values,), positions)
+            for values, positions in groups.items()]
+
+
+def store_slices(store, by, ids=None):
+    """``(values, partition ids)`` for every combination of the ``by`` columns among partitions ``ids`` (all by default)."""
+    columns = [engine.FILTER_COLUMNS[field] for field in by]
+    if not columns:
+        return [((), ids)]
+    ids = np.arange(len(store)) if ids is None else np.asarray(ids)
+    groups = store.keys.iloc[ids].groupby(columns, sort=True).indices
+    return [(values if isinstance(values, tuple) else (values,), ids[positions]) for values, positions in groups.items()]
+
+
+def _scoped(key, state):
+    # Reports of a filtered selection are datasets of their own
+    return key if state == engine.FilterState() else f'{key}:{cache_key(state)[:12]}'
+
+
+def _label(value):
+    # Years come out of the frame as floats
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def _slug(text):
+    return re.sub(r'[^0-9A-Za-z]+', '-', str(text)).strip('-').lower()
+
+
+def report_name(by, values):
+    if not by:
+        return 'report-all'
+    return 'report-' + '-'.join(f'{field}-{_slug(_label(value))}' for field, value in zip(by, values))
+
+
+def _bar(counts, label, title):
+    fig = px.bar(x=counts.index, y=counts.values, color=counts.values,
+                 color_continuous_scale='Blues', title=title, labels={'x': label, 'y': 'Count', 'color': 'Count'})
+    fig.update_layout(height=400)
+    return fig
+
+
+def figures(dataset, state=engine.FilterState()):
+    """``(title, figure)`` for every dashboard section the data supports."""
+    df = dataset.filtered(state)
+    columns = set(df.columns)
+
+    def section(*spec):
+        return engine.section(dataset, state, *spec)
+
+    result = []
+    if dataset.timeseries is not None and VICTIMS in columns:
+        trend = section('trend', 'month')
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=trend.index, y=trend['Incidents'], name='Number of Incidents',
+                                 line=dict(color='blue', width=2)))
+        fig.add_trace(go.Scatter(x=trend.index, y=trend['Victims'], name='Victims (dead and missing)',
+                                 line=dict(color='red', width=2), yaxis='y2'))
+        fig.update_layout(yaxis=dict(title='Incidents'),
+                          yaxis2=dict(title='Victims', overlaying='y', side='right'), height=500)
+        result.append(('Incident Trend Over Time', fig))
+    if 'Incident Type' in columns:
+        result.append(('Incidents by Type', _bar(section('top_values', 'Incident Type', 10), 'Incident Type',
+                                                 'Top 10 Incident Types')))
+        if VICTIMS in columns:
+            victims = section('group_sum', 'Incident Type', VICTIMS).sort_values(ascending=False).head(10)
+            fig = px.pie(values=victims.values, names=victims.index, hole=0.4,
+                         title='Distribution of Victims by Incident Type',
+                         color_discrete_sequence=px.colors.sequential.Blues_r)
+            result.append(('Victims by Incident Type', fig))
+    if 'Country of Incident' in columns:
+        countries = section('value_counts', 'Country of Incident')
+        fig = px.choropleth(locations=countries.index, locationmode='country names', color=countries.values,
+                            color_continuous_scale='Blues', title='Number of Incidents by Country',
+                            labels={'color': 'Incidents'}, height=400)
+        result.append(('Incidents by Country', fig))
+    if {'LATITUDE', 'LONGITUDE'} <= columns:
+        hotspots = section('hotspots', 25.0, 10)
+        if hotspots is not None and len(hotspots):
+            fig = px.scatter_geo(hotspots, lat='Latitude', lon='Longitude', size='Victims',
+                                 hover_data=['Incidents', 'Victims'], title='Incident Hotspots')
+            result.append(('Incident Hotspots', fig))
+    for column, title in [('Migration Route', 'Most Common Migration Routes'),
+                          ('Country of Origin', 'Main Countries of Origin'),
+                          ('Region of Origin', 'Regions of Origin')]:
+        if column in columns and df[column].notna().any():
+            result.append((title, _bar(section('top_values', column, 10), column, title)))
+    if {'Incident Type', 'Number of Survivors', VICTIMS} <= columns:
+        rate = section('survival_rate')
+        if len(rate):
+            fig = px.bar(x=rate.index, y=rate.values, color=rate.values, color_continuous_scale='Blues',
+                         labels={'x': 'Incident Type', 'y': 'Survival Rate (%)', 'color': 'Survival Rate (%)'})
+            result.append(('Survival Rate by Incident Type', fig))
+    if 'Cause of Death' in columns and df['Cause of Death'].notna().any():
+        try:
+            fig = px.imshow(section('cause_wordcloud'), binary_string=True)
+            fig.update_xaxes(visible=False)
+            fig.update_yaxes(visible=False)
+        except ValueError:
+            fig = _bar(section('top_values', 'Cause of Death', 10), 'Cause', 'Top 10 Causes of Death')
+        result.append(('Main Causes of Death', fig))
+    if VICTIMS in columns:
+        histogram = section('histogram', VICTIMS, VICTIM_BUCKETS)
+        fig = px.bar(x=histogram.index, y=histogram.values, log_y=True,
+                     labels={'x': 'Victims', 'y': 'Incidents'}, title='Incidents by Number of Victims')
+        result.append(('Victims per Incident', fig))
+    if 'Month' in columns and df['Month'].notna().any():
+        months = section('month_counts')
+        fig = px.line(x=months.index, y=months.values, markers=True, labels={'x': 'Month', 'y': 'Incidents'})
+        result.append(('Seasonal Pattern of Incidents', fig))
+    corr = section('correlation')
+    if corr is not None:
+        fig = px.imshow(corr, text_auto='.2f', color_continuous_scale='RdBu_r', zmin=-1, zmax=1)
+        fig.update_layout(height=600)
+        result.append(('Variable Correlations', fig))
+    return result
+
+
+def _kpis(dataset, state):
+    totals = engine.section(dataset, state, 'column_sums')
+    rows = [('Total Incidents', len(dataset.filtered(state)))]
+    rows += [(label, int(totals[column])) for label, column in [
+        ('Total Victims', VICTIMS),
+        ('Total Survivors', 'Number of Survivors'),
+        ('Children Affected', 'Number of Children'),
+    ] if column in totals.index]
+    cells = ''.join(f'<td><b>{value:,}</b><br>{html.escape(label)}</td>' for label, value in rows)
+    return f'<table class="kpis"><tr>{cells}</tr></table>'
+
+
+def render(dataset, path, title, formats=('html',), state=engine.FilterState()):
+    """Write the report of ``dataset`` under ``state`` to ``path`` + extension; returns the files written."""
+    sections = figures(dataset, state)
+    written = []
+    if 'html' in formats:
+        body = [f'<h1>{html.escape(title)}</h1>', _kpis(dataset, state)]
+        for i, (heading, fig) in enumerate(sections):
+            body.append(f'<h2>{html.escape(heading)}</h2>')
+            body.append(fig.to_html(full_html=False, include_plotlyjs='directory' if i == 0 else False))
+        with open(path + '.html', 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                    f'<title>{html.escape(title)}</title>'
+                    '<style>body{font-family:sans-serif;margin:2em}.kpis td{padding:0 2em;text-align:center}</style>'
+                    '</head><body>\n' + '\n'.join(body) + '\n</body></html>\n')
+        written.append(path + '.html')
+    if 'png' in formats:
+        for i, (heading, fig) in enumerate(sections, 1):
+            image = f'{path}-{i:02d}-{_slug(heading)}.png'
+            fig.update_layout(title=f'{title}: {heading}')
+            fig.write_image(image, width=1200, height=fig.layout.height or 500)
+            written.append(image)
+    return written
+
+
+def _init_worker(frame, root=None):
+    global _frame, _root
+    _frame, _root = frame, root
+
+
+def _render_slice(key, name, title, positions, output, formats):
+    if _root is not None:
+        # Partition ids: only this slice's files are read
+        frame = engine.open_store(_root).read(positions)
+    else:
+        frame = _frame if positions is None else _frame.iloc[positions].reset_index(drop=True)
+    dataset = engine.Dataset(frame, f'{key}:{name}', title)
+    return render(dataset, os.path.join(output, name), title, formats)
+
+
+def _prepare_output(output, formats):
+    os.makedirs(output, exist_ok=True)
+    if 'html' in formats:
+        with open(os.path.join(output, 'plotly.min.js'), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+    if 'png' in formats:
+        # Static images need the optional kaleido package
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            logger.warning("PNG export needs the kaleido package; writing HTML only")
+            formats = [fmt for fmt in formats if fmt != 'png']
+    return formats
+
+
+def _tasks(key, name, by, groups):
+    tasks = []
+    for values, positions in groups:
+        scope = ', '.join(f'{engine.FILTER_COLUMNS[field]}: {_label(value)}' for field, value in zip(by, values))
+        tasks.append((key, report_name(by, values), f'{name} ({scope})' if scope else name, positions))
+    return tasks
+
+
+def generate(dataset, by=(), output='reports', formats=('html',), workers=None, state=engine.FilterState()):
+    """Render one report per combination of the ``by`` fields of the rows ``state`` selects; returns the files written.
+
+    Raises :class:`ReportError` once every report has been tried if any of them failed.
+    """
+    formats = _prepare_output(output, formats)
+    frame = dataset.filtered(state)
+    tasks = _tasks(_scoped(dataset.key, state), dataset.name, by, slices(frame, by))
+    return _run(tasks, output, formats, workers, (frame,))
+
+
+def generate_from_store(root, by=(), output='reports', formats=('html',), workers=None, state=engine.FilterState()):
+    """Like :func:`generate` for a partition store whose partition columns cover ``by`` and ``state``'s filters.
+
+    Only the partitions ``state`` selects are read.
+    """
+    store = engine.open_store(root)
+    formats = _prepare_output(output, formats)
+    name = os.path.basename(os.path.normpath(root))
+    tasks = _tasks(_scoped(store.key, state), name, by, store_slices(store, by, store.select(state)))
+    return _run(tasks, output, formats, workers, (None, root))
+
+
+def _run(tasks, output, formats, workers, initargs):
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        futures = {pool.submit(_render_slice, *task, output, formats): task[1] for task in tasks}
+        written = []
+        failed = []
+        for future, name in futures.items():
+            try:
+                written.extend(future.result())
+            except Exception:
+                logger.exception("Report %s failed", name)
+                failed.append(name)
+    if failed:
+        raise ReportError(failed, written)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render static dashboard reports per filter combination.")
+    parser.add_argument('dataset', nargs='?',
+                        help="CSV or Excel file, column store or partition store (default: the bundled dataset)")
+    parser.add_argument('--by', nargs='*', default=[], choices=list(engine.FILTER_COLUMNS),
+                        help="one report per combination of these fields")
+    parser.add_argument('--years', nargs='+', type=int, help="only these years")
+    parser.add_argument('--regions', nargs='+', help="only these regions of incident")
+    parser.add_argument('--format', nargs='+', default=['html'], choices=FORMATS, dest='formats')
+    parser.add_argument('--output', default='reports', help="output directory")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    path = args.dataset or default_dataset_paths()[0]
+    state = engine.FilterState(years=tuple(args.years) if args.years else None,
+                               regions=tuple(args.regions) if args.regions else None)
+    columns = {engine.FILTER_COLUMNS[field] for field in args.by}
+    columns |= {engine.FILTER_COLUMNS[field] for field in ('years', 'regions') if getattr(state, field) is not None}
+    partitioned = os.path.isdir(path) and not is_column_store(path)
+    if partitioned:
+        totals = engine.store_totals(path, state)
+        if totals is not None and not totals['Incidents']:
+            # Known from the manifest before anything is read
+            logger.warning("No incidents match the filters")
+            return 0
+    try:
+        if partitioned and columns <= set(engine.open_store(path).partition_columns):
+            files = generate_from_store(path, args.by, args.output, args.formats, args.workers, state)
+        else:
+            # From a store, only the partitions the filters select are read
+            dataset = engine.load_store(path, state) if partitioned else engine.load_path(path)
+            files = generate(dataset, args.by, args.output, args.formats, args.workers, state)
+    except ReportError as e:
+        logger.info("Wrote %d files to %s", len(e.written), args.output)
+        logger.error("%s", e)
+        return 1
+    logger.info("Wrote %d files to %s", len(files), args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""Cache shared by the dashboard processes of one deployment.
+
+Every locale runs in its own Streamlit process, often with replicas, and each
+process keeps its own in-memory caches. A shared backend lets parsed datasets
+and computed sections be reused by all of them: a process first looks a key
+up in the backend and, on a miss, takes the key's lock so that only one
+process computes it while the others wait and then read the stored value.
+
+The backend is chosen with ``IOMDATA_SHARED_CACHE``:
+
+* ``disk:/path/to/dir``: pickles in a local (or shared) directory, written
+  atomically and locked with ``flock``, and pruned of the least recently
+  used entries beyond ``IOMDATA_SHARED_CACHE_MAX_BYTES`` (1 GiB by default,
+  or ``disk:/path/to/dir?max_bytes=...``);
+* ``redis://host:6379/0``: a Redis-compatible server (needs the optional
+  ``redis`` package); any object with the same ``get``/``set``/``delete``
+  methods can be passed as ``client`` instead, e.g. a local stand-in in tests;
+* unset: no shared cache.
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE = os.environ.get('IOMDATA_SHARED_CACHE', '')
+# Part of every key: bump when stored values change shape, so stale entries are ignored
+FORMAT_VERSION = 2
+# Longest a computation may hold a key's lock before others compute it themselves
+LOCK_TIMEOUT = float(os.environ.get('IOMDATA_SHARED_CACHE_LOCK_TIMEOUT', 120))
+SHARED_CACHE_MAX_BYTES = int(os.environ.get('IOMDATA_SHARED_CACHE_MAX_BYTES', 1 << 30))
+
+# Returned by lookups that find nothing: ``None`` is a value like any other
+_MISSING = object()
+
+
+def cache_key(*parts):
+    """Stable key for ``parts`` across processes (their ``repr`` hashed)."""
+    return hashlib.sha1(repr((FORMAT_VERSION,) + parts).encode('utf-8')).hexdigest()
+
+
+class CacheBackend:
+    """Byte store with per-key locks; subclasses implement the four primitives."""
+
+    def get_bytes(self, key):
+        raise NotImplementedError
+
+    def set_bytes(self, key, payload):
+        raise NotImplementedError
+
+    def lock(self, key):
+        """Context manager held while ``key`` is being computed."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def get(self, key, default=None):
+        """Stored value of ``key``, or ``default``."""
+        payload = self.get_bytes(key)
+        if payload is None:
+            return default
+        try:
+            return pickle.loads(payload)
+        except Exception:
+            logger.warning("Discarding unreadable shared cache entry %s", key)
+            self.delete(key)
+            return default
+
+    def set(self, key, value):
+        try:
+            self.set_bytes(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            logger.exception("Could not store %s in the shared cache", key)
+
+    def get_or_compute(self, key, function, *args):
+        """Value of ``key``, computed by ``function(*args)`` in one process only."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self.lock(key):
+            # Computed by another process while this one waited for the lock
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = function(*args)
+                self.set(key, value)
+        return value
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend, for a single process or as a stand-in in tests."""
+
+    def __init__(self):
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_bytes(self, key):
+        return self._values.get(key)
+
+    def set_bytes(self, key, payload):
+        self._values[key] = payload
+
+    def delete(self, key):
+        self._values.pop(key, None)
+
+    def lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+class DiskBackend(CacheBackend):
+    """Pickles under ``root``, one file per key, shared by every process that mounts it.
+
+    With ``max_bytes``, the first write of a process and then every write
+    of another twentieth of ``max_bytes`` prune the directory back to it.
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'locks'), exist_ok=True)
+        self._local_locks = {}
+        self._lock = threading.Lock()
+        self._unpruned = max_bytes // 20 if max_bytes is not None else 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.pkl')
+
+    def get_bytes(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            return None
+        # Pruning goes by modification time: reading an entry keeps it
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return payload
+
+    def set_bytes(self, key, payload):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see a partial file: write aside, then rename over
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporary)
+            raise
+        if self.max_bytes is not None:
+            with self._lock:
+                self._unpruned += len(payload)
+                due = self._unpruned >= self.max_bytes // 20
+                if due:
+                    self._unpruned = 0
+            if due:
+                self.prune(self.max_bytes)
+
+    def delete(self, key):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(key))
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        with self._lock:
+            local = self._local_locks.setdefault(key, threading.Lock())
+        path = os.path.join(self.root, 'locks', key + '.lock')
+        # flock is per open file, so threads of this process also need a lock
+        with local:
+            f = self._acquire(path, key)
+            try:
+                yield
+            finally:
+                if f is not None:
+                    # Removed while held: processes waiting on this file notice and retry
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+
+    def _acquire(self, path, key):
+        """The lock file at ``path``, opened and flocked; ``None`` without flock or after a timeout."""
+        if fcntl is None:
+            return None
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            f = open(path, 'a')
+            try:
+                while True:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            logger.warning("Shared cache lock %s timed out", key)
+                            f.close()
+                            return None
+                        time.sleep(0.05)
+                # Still the file at ``path``, not one its last holder removed
+                with contextlib.suppress(FileNotFoundError):
+                    if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                        return f
+            except BaseException:
+                f.close()
+                raise
+            f.close()
+
+    def prune(self, max_bytes):
+        """Delete the least recently used entries until the store fits in ``max_bytes``."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.pkl'):
+                    path = os.path.join(directory, name)
+                    with contextlib.suppress(FileNotFoundError):
+                        stat = os.stat(path)
+                        entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+
+class RedisBackend(CacheBackend):
+    """Entries and locks in a Redis-compatible server."""
+
+    def __init__(self, url=None, client=None, prefix='iomdata:', ttl=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get_bytes(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set_bytes(self, key, payload):
+        self.client.set(self.prefix + key, payload, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        name = f'{self.prefix}lock:{key}'
+        token = os.urandom(8).hex()
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        # The lock expires on its own if its holder dies
+        while not self.client.set(name, token, nx=True, px=int(LOCK_TIMEOUT * 1000)):
+            if time.monotonic() > deadline:
+                logger.warning("Shared cache lock %s timed out", key)
+                break
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if self.client.get(name) in (token, token.encode()):
+                self.client.delete(name)
+
+
+def from_url(url):
+    """Backend for an ``IOMDATA_SHARED_CACHE`` value, ``None`` when empty."""
+    if not url:
+        return None
+    if url.startswith('disk:'):
+        root, _, query = url[len('disk:'):].partition('?')
+        max_bytes = parse_qs(query).get('max_bytes', [SHARED_CACHE_MAX_BYTES])[-1]
+        return DiskBackend(root, int(max_bytes))
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    if url == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown shared cache {url!r}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def shared_cache():
+    """The configured backend, created once per process (``None`` when disabled)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None and SHARED_CACHE:
+            try:
+                _backend = from_url(SHARED_CACHE)
+            except Exception:
+                logger.exception("Shared cache %s unavailable", SHARED_CACHE)
+                _backend = False
+        return _backend or None
+
+
+def set_shared_cache(backend):
+    """Use ``backend`` (or none) from now on, e.g. a stand-in in tests."""
+    global _backend
+    with _backend_lock:
+        _backend = backend if backend is not None else False
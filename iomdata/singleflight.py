@@ -0,0 +1,49 @@
+"""Coalescing of identical concurrent computations.
+
+When many sessions open the dashboard at once they all ask for the same
+sections of the same dataset. :class:`SingleFlight` lets the first caller
+for a key compute while later callers for that key wait and share its result
+(or its exception) instead of repeating the work.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """One computation per key at a time; concurrent callers share it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, function, *args):
+        """``function(*args)``, unless a call for ``key`` is running: then its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
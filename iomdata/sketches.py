@@ -0,0 +1,157 @@
+"""Bounded-memory frequency sketches for streamed categorical columns.
+
+Exact counts are kept for the charted columns (see ``Dataset.value_table``).
+Columns such as ``Location of Incident`` have tens of thousands of distinct
+values; as rows arrive in chunks, :class:`SpaceSaving` tracks their heavy
+hitters in ``k`` counters and :class:`CountMinSketch` estimates the count of
+any value. Both are updated with one pre-aggregated chunk at a time and can
+be merged.
+"""
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Columns with too many distinct values to count exactly as rows stream in
+STREAM_COLUMNS = ('Location of Incident', 'Information Source')
+
+
+def _chunk_counts(values, weights=None):
+    """Distinct values of a chunk with their (weighted) counts, largest first."""
+    # Only the values present: the shared string pool of a text column is much larger
+    codes, uniques = pd.factorize(pd.Series(values))
+    valid = codes >= 0
+    weights = None if weights is None else np.asarray(weights, dtype=float)[valid]
+    counts = np.bincount(codes[valid], weights=weights, minlength=len(uniques))
+    counts = pd.Series(counts, index=pd.Index(np.asarray(uniques, dtype=object)))
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+class SpaceSaving:
+    """Top-``k`` heavy hitters in ``k`` counters (Metwally et al.).
+
+    Every tracked value has a count that overestimates its true count by at
+    most its ``error``; any value more frequent than ``total / k`` is tracked.
+    """
+
+    def __init__(self, k=100):
+        self.k = k
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+        self._order = itertools.count()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _pop_min(self):
+        # The heap may hold stale entries for counters updated since
+        while True:
+            count, _, value = heapq.heappop(self._heap)
+            if self.counts.get(value) == count:
+                return value, count
+
+    def _push(self, value):
+        # The sequence number keeps values of different types from being compared
+        heapq.heappush(self._heap, (self.counts[value], next(self._order), value))
+
+    def update(self, values, weights=None):
+        for value, count in _chunk_counts(values, weights).items():
+            self.total += count
+            if value in self.counts:
+                self.counts[value] += count
+            elif len(self.counts) < self.k:
+                self.counts[value] = count
+                self.errors[value] = 0
+            else:
+                evicted, floor = self._pop_min()
+                del self.counts[evicted], self.errors[evicted]
+                self.counts[value] = floor + count
+                self.errors[value] = floor
+            self._push(value)
+        if len(self._heap) > 4 * self.k:
+            self._heap = []
+            for value in self.counts:
+                self._push(value)
+        return self
+
+    def merge(self, other):
+        """Counters of both sketches, trimmed back to ``k``."""
+        merged = SpaceSaving(self.k)
+        counts = pd.Series(self.counts, dtype=float).add(pd.Series(other.counts, dtype=float), fill_value=0)
+        errors = pd.Series(self.errors, dtype=float).add(pd.Series(other.errors, dtype=float), fill_value=0)
+        for value, count in counts.nlargest(self.k).items():
+            merged.counts[value] = count
+            merged.errors[value] = errors[value]
+            merged._push(value)
+        merged.total = self.total + other.total
+        return merged
+
+    def top(self, n=10):
+        """The ``n`` largest counters as a Series, largest first."""
+        counts = pd.Series(self.counts, dtype=float).sort_values(ascending=False, kind='stable')
+        return counts.head(n)
+
+
+class CountMinSketch:
+    """Count estimates for any value in ``depth x width`` counters.
+
+    Estimates never undercount; with probability ``1 - exp(-depth)`` they
+    overcount by at most ``e / width`` of the total.
+    """
+
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width))
+        self.total = 0
+
+    def _columns(self, values):
+        values = np.asarray(values, dtype=object)
+        return [pd.util.hash_array(values, hash_key=f'iomdata-cms-{row:04d}') % self.width
+                for row in range(self.depth)]
+
+    def update(self, values, weights=None):
+        counts = _chunk_counts(values, weights)
+        for row, columns in enumerate(self._columns(counts.index)):
+            np.add.at(self.table[row], columns, counts.to_numpy(dtype=float))
+        self.total += counts.sum()
+        return self
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError("Count-Min sketches of different shapes cannot be merged")
+        merged = CountMinSketch(self.width, self.depth)
+        merged.table = self.table + other.table
+        merged.total = self.total + other.total
+        return merged
+
+    def estimate(self, values):
+        """Estimated counts of ``values``."""
+        columns = self._columns(values)
+        return np.min([self.table[row, cols] for row, cols in enumerate(columns)], axis=0)
+
+
+class HeavyHitters:
+    """Space-Saving candidates with Count-Min estimates, per column of streamed chunks."""
+
+    def __init__(self, columns, k=100, width=2048, depth=5):
+        self.columns = list(columns)
+        self.candidates = {column: SpaceSaving(k) for column in self.columns}
+        self.sketches = {column: CountMinSketch(width, depth) for column in self.columns}
+
+    def update(self, frame):
+        for column in self.columns:
+            if column in frame.columns:
+                self.candidates[column].update(frame[column])
+                self.sketches[column].update(frame[column])
+        return self
+
+    def top(self, column, n=10):
+        """Heavy hitters of ``column``, counted with the tighter of both estimates."""
+        candidates = self.candidates[column].top(len(self.candidates[column]))
+        estimates = np.minimum(candidates.to_numpy(), self.sketches[column].estimate(candidates.index))
+        counts = pd.Series(estimates.astype(np.int64), index=pd.Index(candidates.index, name=column), name='count')
+        return counts.sort_values(ascending=False, kind='stable').head(n)
@@ -0,0 +1,115 @@
+"""Grid index over incident coordinates for radius and bounding box queries."""
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+# Error bound of the coordinates large maps send (float32 or 5 decimals), in degrees
+SELECTION_PADDING = 1e-5
+
+# Reference points offered by the "near location" filter
+PLACES = {
+    'Lampedusa': (35.5069, 12.6042),
+    'Calais': (50.9513, 1.8587),
+    'Darién Gap': (8.0, -77.3),
+    'Tucson': (32.2226, -110.9747),
+    'Canary Islands': (28.2916, -16.6291),
+    'Evros / Meriç river': (41.0, 26.3),
+    'Strait of Gibraltar': (35.95, -5.6),
+    'Bab-el-Mandeb': (12.6, 43.3),
+}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def selection_bounds(points):
+    """``(south, west, north, east)`` around points selected on a map.
+
+    The longitude span is the shortest one holding every point, so a
+    selection across the antimeridian gives ``west > east``.
+    """
+    lats = [point['lat'] for point in points if 'lat' in point and 'lon' in point]
+    lons = [point['lon'] for point in points if 'lat' in point and 'lon' in point]
+    if not lats:
+        return None
+    lons = np.sort(np.asarray(lons, dtype=float))
+    # The span leaves out the widest gap between neighbouring longitudes, around the globe
+    gaps = np.append(np.diff(lons), lons[0] + 360 - lons[-1])
+    widest = int(np.argmax(gaps))
+    west, east = lons[(widest + 1) % len(lons)], lons[widest]
+    # Large maps send quantized coordinates: widen by their error to keep the edge points
+    pad = SELECTION_PADDING
+    west, east = ((value + 180) % 360 - 180 for value in (west - pad, east + pad))
+    return float(min(lats)) - pad, float(west), float(max(lats)) + pad, float(east)
+
+
+class GridIndex:
+    """Points bucketed into a regular latitude/longitude grid.
+
+    Points are stored sorted by cell id (row-major), so the cells of one grid
+    row inside a longitude range are a contiguous slice found by binary
+    search; a query only looks at the points of the rows it spans.
+    """
+
+    def __init__(self, lat, lon, cell_degrees=1.0):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        positions = np.flatnonzero(valid)
+        self.cell_degrees = cell_degrees
+        self.n_rows = int(np.ceil(180 / cell_degrees))
+        self.n_cols = int(np.ceil(360 / cell_degrees))
+        cells = self._row(lat[valid]) * self.n_cols + self._col(lon[valid])
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.positions = positions[order]
+        self.lat = lat[valid][order]
+        self.lon = lon[valid][order]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_degrees).astype(np.int64), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return np.clip(((np.asarray(lon) + 180) // self.cell_degrees).astype(np.int64), 0, self.n_cols - 1)
+
+    def _candidates(self, south, west, north, east):
+        # Index ranges into the sorted arrays, one per grid row and longitude span
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = np.arange(self._row(south), self._row(north) + 1)
+        pieces = []
+        for w, e in spans:
+            first = rows * self.n_cols + self._col(w)
+            last = rows * self.n_cols + self._col(e)
+            lo = np.searchsorted(self.cells, first, side='left')
+            hi = np.searchsorted(self.cells, last, side='right')
+            pieces.extend(np.arange(a, b) for a, b in zip(lo, hi) if b > a)
+        return np.concatenate(pieces) if pieces else np.empty(0, dtype=np.int64)
+
+    def bbox(self, south, west, north, east):
+        """Row positions inside the box; ``west > east`` crosses the antimeridian."""
+        idx = self._candidates(south, west, north, east)
+        lat, lon = self.lat[idx], self.lon[idx]
+        inside = (lat >= south) & (lat <= north)
+        inside &= ((lon >= west) & (lon <= east)) if west <= east else ((lon >= west) | (lon <= east))
+        return np.sort(self.positions[idx[inside]])
+
+    def radius(self, lat, lon, km):
+        """Row positions within ``km`` kilometres (haversine) of a point."""
+        dlat = km / KM_PER_DEGREE
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        widest = np.cos(np.radians(max(abs(south), abs(north))))
+        if widest <= 0 or km / (KM_PER_DEGREE * widest) >= 180:
+            west, east = -180.0, 180.0
+        else:
+            dlon = km / (KM_PER_DEGREE * widest)
+            west, east = (lon - dlon + 180) % 360 - 180, (lon + dlon + 180) % 360 - 180
+        idx = self._candidates(south, west, north, east)
+        near = haversine(lat, lon, self.lat[idx], self.lon[idx]) <= km
+        return np.sort(self.positions[idx[near]])
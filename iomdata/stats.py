@@ -0,0 +1,108 @@
+"""Mergeable sufficient statistics for correlation matrices and distributions.
+
+For ``k`` columns the moments are four ``k x k`` matrices over the rows where
+both columns of a pair are present (pairwise deletion, as pandas does): the
+pair counts ``N``, sums ``A[i, j]`` of column ``i``, sums of squares
+``Q[i, j]`` of column ``i`` and cross products ``P``. Moments of disjoint
+row sets add up, so they can be kept per partition and summed.
+
+Distributions are kept as counts of distinct values, which add up the same
+way.
+"""
+import numpy as np
+import pandas as pd
+
+from .partitions import group_slices
+
+
+def moments(values):
+    """Stacked ``(N, A, Q, P)`` moments of a ``rows x k`` array."""
+    valid = ~np.isnan(values)
+    v = valid.astype(float)
+    x = np.where(valid, values, 0.0)
+    return np.stack([v.T @ v, x.T @ v, (x * x).T @ v, x.T @ x])
+
+
+def correlation(stacked, columns):
+    """Pearson correlation matrix from summed moments."""
+    n, a, q, p = stacked
+    cov = n * p - a * a.T
+    var = (n * q - a * a) * (n * q.T - a.T * a.T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / np.sqrt(var)
+    corr[~(var > 0)] = np.nan
+    return pd.DataFrame(np.clip(corr, -1, 1), index=columns, columns=columns)
+
+
+class MomentTable:
+    """Moments kept per partition cell."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.table = np.zeros((0, 4, k, k))
+
+    def add(self, values, codes, n_cells):
+        """Add rows to their cells; also used to append new data."""
+        k = len(self.columns)
+        if n_cells > len(self.table):
+            grown = np.zeros((n_cells - len(self.table), 4, k, k))
+            self.table = np.concatenate([self.table, grown])
+        order, bounds = group_slices(codes, n_cells)
+        for cell in np.flatnonzero(np.diff(bounds)):
+            self.table[cell] += moments(values[order[bounds[cell]:bounds[cell + 1]]])
+
+    def merged(self, cells):
+        return self.table[cells].sum(axis=0)
+
+    def correlation(self, cells):
+        return correlation(self.merged(cells), self.columns)
+
+
+def quantiles(values, counts, qs):
+    """Quantiles (linear interpolation, as numpy) of sorted ``values`` seen ``counts`` times."""
+    cumulative = np.cumsum(counts)
+    if not len(cumulative) or cumulative[-1] == 0:
+        return np.full(len(qs), np.nan)
+    ranks = np.asarray(qs, dtype=float) * (cumulative[-1] - 1)
+    lo = values[np.searchsorted(cumulative, np.floor(ranks), side='right')]
+    hi = values[np.searchsorted(cumulative, np.ceil(ranks), side='right')]
+    return lo + (hi - lo) * (ranks - np.floor(ranks))
+
+
+class Distribution:
+    """Counts of the distinct values of a column per partition cell and group.
+
+    Columns such as victims per incident take a few hundred distinct values,
+    so the counts are an exact quantile sketch: merging cells adds rows of
+    the table and a quantile is a binary search in the cumulative counts.
+    """
+
+    def __init__(self, values, cells, groups=None):
+        values = np.asarray(values, dtype=float)
+        groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups)
+        keep = ~np.isnan(values) & (groups >= 0)
+        self.n_groups = int(groups.max()) + 1 if len(groups) else 1
+        self.values, value_codes = np.unique(values[keep], return_inverse=True)
+        pairs, pair_codes = np.unique(cells[keep] * self.n_groups + groups[keep], return_inverse=True)
+        self.cells = pairs // self.n_groups
+        self.groups = pairs % self.n_groups
+        self.table = np.zeros((len(pairs), len(self.values)), dtype=np.int64)
+        np.add.at(self.table, (pair_codes, value_codes), 1)
+
+    def merged(self, cells=None):
+        """Value counts per group over ``cells`` (all cells for ``None``)."""
+        rows = slice(None) if cells is None else np.isin(self.cells, cells)
+        counts = np.zeros((self.n_groups, len(self.values)), dtype=np.int64)
+        np.add.at(counts, self.groups[rows], self.table[rows])
+        return counts
+
+
+def histogram(values, counts, edges):
+    """Counts summed into ``[edges[i], edges[i + 1])`` buckets, the last one open."""
+    buckets = np.searchsorted(edges, values, side='right') - 1
+    keep = buckets >= 0
+    totals = np.bincount(buckets[keep], weights=counts[keep], minlength=len(edges))
+    labels = [f'{lo:g}' if hi - lo == 1 else f'{lo:g}–{hi - 1:g}' for lo, hi in zip(edges, edges[1:])]
+    labels.append(f'{edges[-1]:g}+')
+    return pd.Series(totals.astype(np.int64), index=labels, name='count')
@@ -0,0 +1,191 @@
+"""Hive-style partitioned copies of a dataset on disk.
+
+The normalized frame is written as one Parquet file per year and region
+(``Incident Year=2019/Region of Incident=Mediterranean/part-0.parquet``)
+next to a manifest holding every partition's values, row count, column sums
+and date range. Opening a store only reads the manifest. A filter state is
+matched against it first, so only the partitions it selects are read, and
+the totals of a selection by year and region come from the manifest without
+touching the files. The dashboards load a store whole, as a cache that skips
+parsing the workbook; report workers read only the partitions of their own
+slice::
+
+    python -m iomdata.store migrants.xlsx --output store
+
+Parquet goes through pandas and needs the optional pyarrow package.
+"""
+import argparse
+import json
+import logging
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from .data import (
+    NUMERIC_COLUMNS, content_key, default_dataset_paths, encode_months, encode_strings, frame_key, prepare, read_file,
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '_manifest.json'
+PARTITION_COLUMNS = ('Incident Year', 'Region of Incident')
+
+# Directory name of missing partition values, as in Hive
+_MISSING = '__HIVE_DEFAULT_PARTITION__'
+
+
+def _plain(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _directory(columns, values):
+    parts = []
+    for column, value in zip(columns, values):
+        if value is None:
+            value = _MISSING
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        parts.append(f'{quote(column, safe=" ")}={quote(str(value), safe=" ")}')
+    return '/'.join(parts)
+
+
+def _mixed_columns(frame):
+    return [col for col in frame.columns if frame[col].dtype == object
+            and pd.api.types.infer_dtype(frame[col], skipna=True) not in ('string', 'empty')]
+
+
+def _as_text(series):
+    # Parquet columns hold one type: numbers among strings are written as text
+    return series.map(lambda value: None if pd.isna(value) else str(value)).astype(object)
+
+
+def _from_text(series):
+    numbers = pd.to_numeric(series, errors='coerce')
+    restored = series.astype(object)
+    found = numbers.notna()
+    restored[found] = [int(value) if float(value).is_integer() else float(value) for value in numbers[found]]
+    return restored
+
+
+def _summary(part):
+    sums = {col: float(part[col].sum()) for col in NUMERIC_COLUMNS if col in part.columns}
+    dates = part.get('Incident Date')
+    if dates is None or not pd.api.types.is_datetime64_any_dtype(dates) or dates.isna().all():
+        first = last = None
+    else:
+        first, last = dates.min().date().isoformat(), dates.max().date().isoformat()
+    return {'rows': len(part), 'sums': sums, 'first': first, 'last': last}
+
+
+def write_store(frame, root, by=PARTITION_COLUMNS, key=None):
+    """Write ``frame`` partitioned by the ``by`` columns under ``root``; returns the manifest."""
+    by = [col for col in by if col in frame.columns]
+    # Files hold plain strings: the shared pool would be repeated in every one
+    plain = frame.astype({col: frame[col].dtype.categories.dtype for col in frame.columns
+                          if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+    mixed = _mixed_columns(plain)
+    for col in mixed:
+        plain[col] = _as_text(plain[col])
+    groups = plain.groupby(by, sort=True, dropna=False).indices if by else {(): np.arange(len(plain))}
+    partitions = []
+    for values, positions in groups.items():
+        values = [_plain(value) for value in (values if isinstance(values, tuple) else (values,))]
+        directory = _directory(by, values)
+        part = plain.iloc[positions].reset_index(drop=True)
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        path = f'{directory}/part-0.parquet' if directory else 'part-0.parquet'
+        part.drop(columns=by).to_parquet(os.path.join(root, path), index=False)
+        partitions.append({'path': path, 'values': values, **_summary(part)})
+    manifest = {
+        'key': key or frame_key(frame),
+        'columns': list(frame.columns),
+        'dtypes': {col: str(frame[col].dtype) for col in by},
+        'partition_columns': by,
+        'mixed': mixed,
+        'partitions': partitions,
+    }
+    with open(os.path.join(root, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+class PartitionStore:
+    """Read side of a store written by :func:`write_store`."""
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.key = manifest['key']
+        self.columns = manifest['columns']
+        self.partition_columns = manifest['partition_columns']
+        self.dtypes = manifest['dtypes']
+        self.mixed = manifest['mixed']
+        self.partitions = manifest['partitions']
+        keys = pd.DataFrame([p['values'] for p in self.partitions], columns=self.partition_columns)
+        self.keys = keys.astype({col: dtype for col, dtype in self.dtypes.items() if dtype != 'category'})
+        self.rows = np.array([p['rows'] for p in self.partitions], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def select(self, state):
+        """Ids of the partitions that may hold rows selected by ``state``."""
+        ids = state.apply(self.keys).index.to_numpy()
+        if state.dates is not None:
+            start, end = state.dates
+            # Partitions without dates are kept: their rows are dropped by the row filters
+            ids = np.array([i for i in ids
+                            if self.partitions[i]['first'] is None
+                            or (self.partitions[i]['first'] <= end and self.partitions[i]['last'] >= start)],
+                           dtype=np.int64)
+        return ids
+
+    def totals(self, ids):
+        """Incidents and column sums of the partitions ``ids``, from the manifest."""
+        sums = pd.DataFrame([self.partitions[i]['sums'] for i in ids],
+                            columns=[col for col in NUMERIC_COLUMNS if col in self.columns])
+        return pd.concat([pd.Series({'Incidents': float(self.rows[ids].sum())}), sums.sum()])
+
+    def read(self, ids=None):
+        """Normalized frame of the partitions ``ids`` (all by default), in store order."""
+        ids = range(len(self.partitions)) if ids is None else ids
+        parts = []
+        for i in ids:
+            partition = self.partitions[i]
+            part = pd.read_parquet(os.path.join(self.root, partition['path']))
+            for col, value in zip(self.partition_columns, partition['values']):
+                part[col] = value
+            parts.append(part)
+        if not parts:
+            frame = pd.DataFrame(columns=self.columns)
+        else:
+            frame = pd.concat(parts, ignore_index=True)[self.columns]
+        for col in self.mixed:
+            frame[col] = _from_text(frame[col])
+        dtypes = {col: dtype for col, dtype in self.dtypes.items() if dtype != 'category'}
+        return encode_strings(encode_months(frame.astype(dtypes)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a dataset as Parquet partitions by year and region.")
+    parser.add_argument('dataset', nargs='?', help="CSV or Excel file (default: the bundled dataset)")
+    parser.add_argument('--output', default='store', help="store directory")
+    parser.add_argument('--by', nargs='*', default=list(PARTITION_COLUMNS), help="partition columns")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+    path = args.dataset or default_dataset_paths()[0]
+    with open(path, 'rb') as f:
+        payload = f.read()
+    frame = prepare(read_file(path, os.path.basename(path)))
+    manifest = write_store(frame, args.output, args.by, content_key(payload))
+    logger.info("Wrote %d partitions to %s", len(manifest['partitions']), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Inverted keyword index over the free-text columns."""
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from .partitions import group_slices
+
+TEXT_COLUMNS = ['Location of Incident', 'Cause of Death', 'Information Source']
+
+_WORD = re.compile(r'\w+')
+# Files of an index saved next to a column store
+VOCABULARY = 'text-vocabulary.json'
+POSTINGS = 'text-postings.npy'
+OFFSETS = 'text-offsets.npy'
+
+
+def tokenize(text):
+    """Lowercase words of ``text`` with accents removed ("Darién" -> "darien")."""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text)
+
+
+class TextIndex:
+    """Sorted vocabulary with one posting list of row positions per token.
+
+    Distinct strings are tokenized once, whatever the number of rows
+    repeating them. Posting lists are slices of a single ``int32`` array, so
+    a token lookup is a binary search in the vocabulary plus a slice.
+    """
+
+    def __init__(self, frame, columns=TEXT_COLUMNS):
+        self.columns = [col for col in columns if col in frame.columns]
+        token_ids = {}
+        pair_tokens, pair_rows = [], []
+        for column in self.columns:
+            codes, uniques = pd.factorize(frame[column])
+            order, bounds = group_slices(codes, len(uniques))
+            tokens, strings = [], []
+            for i, text in enumerate(uniques):
+                for token in set(tokenize(text)):
+                    tokens.append(token_ids.setdefault(token, len(token_ids)))
+                    strings.append(i)
+            tokens = np.asarray(tokens, dtype=np.int64)
+            strings = np.asarray(strings, dtype=np.int64)
+            # Every (token, string) pair becomes one pair per row holding the string
+            counts = bounds[strings + 1] - bounds[strings]
+            starts = np.repeat(bounds[strings] - np.cumsum(counts) + counts, counts)
+            pair_tokens.append(np.repeat(tokens, counts))
+            pair_rows.append(order[starts + np.arange(counts.sum())])
+
+        vocabulary = np.array(sorted(token_ids), dtype=object)
+        rank = np.empty(len(token_ids), dtype=np.int64)
+        rank[[token_ids[token] for token in vocabulary]] = np.arange(len(vocabulary))
+        tokens = rank[np.concatenate(pair_tokens)] if pair_tokens else np.empty(0, dtype=np.int64)
+        rows = np.concatenate(pair_rows) if pair_rows else np.empty(0, dtype=np.int64)
+        pairs = np.unique(tokens * len(frame) + rows)
+        self.vocabulary = vocabulary
+        self.postings = (pairs % max(len(frame), 1)).astype(np.int32)
+        self.offsets = np.searchsorted(pairs // max(len(frame), 1), np.arange(len(vocabulary) + 1))
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def save(self, root):
+        """Write the index under ``root``, next to the column store of its frame."""
+        np.save(os.path.join(root, POSTINGS), self.postings)
+        np.save(os.path.join(root, OFFSETS), self.offsets)
+        with open(os.path.join(root, VOCABULARY), 'w', encoding='utf-8') as f:
+            json.dump({'columns': self.columns, 'vocabulary': list(self.vocabulary)}, f)
+
+    @classmethod
+    def load(cls, root):
+        """Index saved under ``root``, its posting lists memory-mapped; ``None`` if there is none."""
+        if not os.path.isfile(os.path.join(root, VOCABULARY)):
+            return None
+        index = cls.__new__(cls)
+        with open(os.path.join(root, VOCABULARY), encoding='utf-8') as f:
+            saved = json.load(f)
+        index.columns = saved['columns']
+        index.vocabulary = np.array(saved['vocabulary'], dtype=object)
+        index.postings = np.load(os.path.join(root, POSTINGS), mmap_mode='r')
+        index.offsets = np.load(os.path.join(root, OFFSETS))
+        return index
+
+    def lookup(self, prefix):
+        """Rows holding a token starting with ``prefix``."""
+        lo = np.searchsorted(self.vocabulary, prefix, side='left')
+        hi = np.searchsorted(self.vocabulary, prefix + '\uffff', side='left')
+        if hi - lo == 1:
+            return self.postings[self.offsets[lo]:self.offsets[hi]]
+        return np.unique(self.postings[self.offsets[lo]:self.offsets[hi]])
+
+    def search(self, query):
+        """Rows matching every word of ``query`` (as a word prefix), in table order."""
+        rows = None
+        for word in tokenize(query):
+            found = self.lookup(word)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if not len(rows):
+                break
+        return np.empty(0, dtype=np.int32) if rows is None else rows
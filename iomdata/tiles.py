@@ -0,0 +1,209 @@
+"""Server-side raster tiles for the incident map.
+
+The density layer is rendered here rather than in the browser: the selected
+incidents are projected once to Web Mercator, and every 256 px tile of the
+pyramid bins the points around it with ``np.bincount`` (weighted by
+victims) and blurs the grid with a separable Gaussian kernel, two matrix
+products. Colours are scaled per zoom level, so neighbouring tiles match.
+Tiles are kept in ``IOMDATA_TILE_CACHE``, a disk cache keyed by the
+dataset, filter state and tile, so each one is rendered once per
+deployment; the least recently used tiles are pruned beyond
+``IOMDATA_TILE_CACHE_MAX_BYTES``.
+
+The base layer comes from ``IOMDATA_BASE_TILES``, a directory of
+``{z}/{x}/{y}.png`` tiles exported for offline use; without one, tiles with
+a plain graticule are drawn so the map still works on air-gapped hosts.
+"""
+import contextlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.image import imsave
+
+from .data import CACHE_DIR
+from .sharedcache import DiskBackend, cache_key
+from .singleflight import SingleFlight
+
+TILE_SIZE = 256
+MAX_ZOOM = int(os.environ.get('IOMDATA_TILE_MAX_ZOOM', 12))
+TILE_CACHE = os.environ.get('IOMDATA_TILE_CACHE', os.path.join(CACHE_DIR, 'tiles'))
+TILE_CACHE_MAX_BYTES = int(os.environ.get('IOMDATA_TILE_CACHE_MAX_BYTES', 256 << 20))
+BASE_TILES = os.environ.get('IOMDATA_BASE_TILES', '')
+# Kernel radius in pixels, as the radius of the browser-side density layer
+RADIUS = 20
+# Web Mercator stops at this latitude
+MAX_LATITUDE = 85.05112878
+COLORSCALE = 'Reds'
+MAX_OPACITY = 0.8
+# Graticule spacing in degrees, by zoom level
+GRATICULE_STEPS = ((2, 30), (4, 10), (6, 5), (8, 1))
+BACKGROUND = (242, 242, 240, 255)
+GRATICULE = (205, 205, 205, 255)
+
+
+def mercator(lat, lon):
+    """Web Mercator ``(x, y)`` of the coordinates, both in ``[0, 1)``."""
+    lat = np.radians(np.clip(np.asarray(lat, dtype=float), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon, dtype=float) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return x, y
+
+
+def _kernel():
+    # (TILE_SIZE, TILE_SIZE + 2 * RADIUS): row i blurs the padded pixels around pixel i
+    offsets = np.arange(TILE_SIZE + 2 * RADIUS)[None, :] - RADIUS - np.arange(TILE_SIZE)[:, None]
+    weights = np.exp(-0.5 * (offsets / (RADIUS / 2)) ** 2)
+    weights[np.abs(offsets) > RADIUS] = 0
+    return weights
+
+
+_KERNEL = _kernel()
+
+
+def _png(rgba):
+    buffer = io.BytesIO()
+    imsave(buffer, rgba, format='png')
+    return buffer.getvalue()
+
+
+_EMPTY = _png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+class DensityTiles:
+    """Projected points of one selection, sorted by ``x`` so a tile finds its points by binary search."""
+
+    def __init__(self, lat, lon, weights):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        weights = np.nan_to_num(np.asarray(weights, dtype=float))
+        valid = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180) & (weights > 0)
+        x, y = mercator(lat[valid], lon[valid])
+        order = np.argsort(x, kind='stable')
+        self.x, self.y, self.weights = x[order], y[order], weights[valid][order]
+        self._peaks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df):
+        weights = df.get('Total Number of Dead and Missing', np.ones(len(df)))
+        return cls(df['LATITUDE'], df['LONGITUDE'], weights)
+
+    def peak(self, z):
+        """Density at which colours saturate on zoom ``z``: the heaviest block of ``RADIUS`` pixels."""
+        with self._lock:
+            if z not in self._peaks:
+                scale = TILE_SIZE * 2 ** z / RADIUS
+                rows, columns = np.floor(self.y * scale).astype(np.int64), np.floor(self.x * scale).astype(np.int64)
+                blocks = rows * int(np.ceil(scale)) + columns
+                _, inverse = np.unique(blocks, return_inverse=True)
+                self._peaks[z] = float(np.bincount(inverse, weights=self.weights).max()) if len(blocks) else 0.0
+            return self._peaks[z]
+
+    def density(self, z, tx, ty):
+        """Blurred density of the pixels of tile ``(z, tx, ty)``."""
+        scale = TILE_SIZE * 2 ** z
+        width = TILE_SIZE + 2 * RADIUS
+        # Points up to RADIUS pixels outside the tile still reach into it
+        start = np.searchsorted(self.x, (tx * TILE_SIZE - RADIUS) / scale, 'left')
+        end = np.searchsorted(self.x, ((tx + 1) * TILE_SIZE + RADIUS) / scale, 'left')
+        px = np.floor(self.x[start:end] * scale - tx * TILE_SIZE + RADIUS).astype(np.int64)
+        py = np.floor(self.y[start:end] * scale - ty * TILE_SIZE + RADIUS).astype(np.int64)
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < width)
+        if not inside.any():
+            return None
+        grid = np.bincount(py[inside] * width + px[inside], weights=self.weights[start:end][inside],
+                           minlength=width * width).reshape(width, width)
+        return _KERNEL @ grid @ _KERNEL.T
+
+    def render(self, z, tx, ty):
+        """PNG of tile ``(z, tx, ty)``."""
+        density = self.density(z, tx, ty)
+        if density is None:
+            return _EMPTY
+        # Log scale: single incidents stay visible next to mass-casualty ones
+        level = np.clip(np.log1p(density) / np.log1p(self.peak(z)), 0, 1)
+        rgba = colormaps[COLORSCALE](level, bytes=True)
+        rgba[..., 3] = np.where(density > 1e-3, level * MAX_OPACITY * 255, 0).astype(np.uint8)
+        return _png(rgba)
+
+
+_densities = OrderedDict()
+_densities_lock = threading.Lock()
+_flights = SingleFlight()
+_store = None
+_store_lock = threading.Lock()
+
+
+def density_tiles(dataset, state):
+    """Tile renderer of the rows of ``dataset`` selected by ``state``."""
+    key = (dataset.key, state)
+    with _densities_lock:
+        if key in _densities:
+            _densities.move_to_end(key)
+            return _densities[key]
+    tiles = _flights.do(key, lambda: DensityTiles.from_frame(dataset.filtered(state)))
+    with _densities_lock:
+        _densities[key] = tiles
+        while len(_densities) > 16:
+            _densities.popitem(last=False)
+    return tiles
+
+
+def _tile_cache():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DiskBackend(TILE_CACHE, TILE_CACHE_MAX_BYTES)
+        return _store
+
+
+def _cached(key, render, *args):
+    store = _tile_cache()
+    png = store.get_bytes(key)
+    if png is None:
+        png = render(*args)
+        # A full or read-only disk only costs the next request a render
+        with contextlib.suppress(OSError):
+            store.set_bytes(key, png)
+    return png
+
+
+def density_tile(dataset, state, z, x, y):
+    """PNG of density tile ``(z, x, y)`` for ``dataset`` under ``state``, cached on disk."""
+    key = cache_key('tiles', dataset.key, state, RADIUS, z, x, y)
+    return _flights.do(key, _cached, key, lambda: density_tiles(dataset, state).render(z, x, y))
+
+
+def graticule(z, x, y):
+    """PNG of a plain base tile with latitude and longitude lines."""
+    step = next((step for max_zoom, step in GRATICULE_STEPS if z <= max_zoom), GRATICULE_STEPS[-1][1])
+    edges = (np.arange(TILE_SIZE + 1) / TILE_SIZE + np.array([[x], [y]])) / 2 ** z
+    lon = edges[0] * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * edges[1]))))
+    # A line runs through every pixel whose edges fall on both sides of a multiple of the step
+    columns = np.floor(lon[:-1] / step) != np.floor(lon[1:] / step)
+    rows = np.floor(lat[:-1] / step) != np.floor(lat[1:] / step)
+    rgba = np.empty((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    rgba[:] = BACKGROUND
+    rgba[rows] = GRATICULE
+    rgba[:, columns] = GRATICULE
+    return _png(rgba)
+
+
+def base_tile(z, x, y):
+    """PNG of base tile ``(z, x, y)``: from ``BASE_TILES`` when present, else a graticule."""
+    if BASE_TILES:
+        path = os.path.join(BASE_TILES, str(z), str(x), f'{y}.png')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+    key = cache_key('graticule', z, x, y)
+    return _flights.do(key, _cached, key, graticule, z, x, y)
@@ -0,0 +1,80 @@
+"""Startup warm-up of the default datasets and popular filter states.
+
+Filter states used in the dashboard are appended to a usage log; at startup a
+background thread loads the default datasets and precomputes every section for
+the default state and the most used ones, so the first visitor is served from
+cache. The log lives under ``IOMDATA_CACHE_DIR`` (or ``IOMDATA_USAGE_LOG``)
+and is rotated once it reaches ``IOMDATA_USAGE_LOG_BYTES``, keeping the
+previous file as ``usage.jsonl.1``.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from . import engine
+from .data import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+USAGE_LOG = os.environ.get('IOMDATA_USAGE_LOG', os.path.join(CACHE_DIR, 'usage.jsonl'))
+USAGE_LOG_BYTES = int(os.environ.get('IOMDATA_USAGE_LOG_BYTES', 1 << 20))
+WARMUP_TOP = int(os.environ.get('IOMDATA_WARMUP_TOP', 5))
+
+_log_lock = threading.Lock()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def record_usage(state, session=None):
+    """Append ``state`` to the usage log, once per change within a session."""
+    if session is not None:
+        if session.get('_iomdata_last_state') == state:
+            return
+        session['_iomdata_last_state'] = state
+    line = json.dumps(state.to_dict(), sort_keys=True, default=str)
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(USAGE_LOG), exist_ok=True)
+            if os.path.exists(USAGE_LOG) and os.path.getsize(USAGE_LOG) >= USAGE_LOG_BYTES:
+                os.replace(USAGE_LOG, USAGE_LOG + '.1')
+            with open(USAGE_LOG, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except OSError:
+        logger.warning("Could not write usage log %s", USAGE_LOG)
+
+
+def popular_states(top=WARMUP_TOP):
+    """Most used non-default filter states from the usage log and its previous file."""
+    counts = Counter()
+    for path in [USAGE_LOG + '.1', USAGE_LOG]:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    counts[engine.FilterState.from_dict(json.loads(line))] += 1
+                except (ValueError, TypeError):
+                    continue
+    counts.pop(engine.FilterState(), None)
+    return [state for state, _ in counts.most_common(top)]
+
+
+def warm_up(top=WARMUP_TOP):
+    for dataset in engine.default_datasets():
+        # Indexes not tied to a filter state, used by the explorer search
+        dataset.text_index
+        for state in [engine.FilterState()] + popular_states(top):
+            engine.warm(dataset, state)
+        logger.info("Warmed up %s", dataset.name)
+
+
+def start_warmup(top=WARMUP_TOP):
+    """Run :func:`warm_up` in a daemon thread, once per process."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, args=(top,), name='iomdata-warmup', daemon=True)
+            _thread.start()
+    return _thread
@@ -0,0 +1,125 @@
+"""Shared fixtures: a synthetic incidents dataset and random filter states."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.spatial import haversine
+
+REGIONS = ['Mediterranean', 'North America', 'Northern Africa', 'South-eastern Asia', 'Central America']
+TYPES = ['Incident', 'Split Incident', 'Cumulative Incident']
+ROUTES = ['Central Mediterranean', 'US-Mexico border crossing', 'Western Africa / Atlantic', 'Darien']
+COUNTRIES = ['Italy', 'Libya', 'Mexico', 'United States', 'Greece', 'Panama', 'Fiji', 'Tunisia']
+ORIGINS = ['Northern Africa', 'Central America', 'Western Africa', 'Southern Asia', 'Unknown',
+           'Western Africa, Northern Africa', 'Central America,Caribbean, South America']
+CAUSES = ['Drowning', 'Vehicle accident', 'Violence', 'Sickness', 'Mixed or unknown', 'Harsh conditions']
+# Incidents gather around these places; the last one straddles the antimeridian
+CENTRES = [(35.5, 12.6), (31.9, -111.0), (8.5, -77.5), (36.8, 25.4), (-17.8, 179.8)]
+
+
+def incidents(n=4000, seed=0):
+    """Raw incidents shaped like the IOM export, with missing values in every column that has them."""
+    rng = np.random.default_rng(seed)
+
+    def pick(values, missing=0.0):
+        picked = np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+        picked[rng.random(n) < missing] = None
+        return picked
+
+    dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(rng.integers(0, 10 * 365, n), unit='D')
+    centres = np.asarray(CENTRES)[rng.integers(0, len(CENTRES), n)]
+    lat = np.clip(centres[:, 0] + rng.normal(0, 1.5, n), -90, 90)
+    lon = (centres[:, 1] + rng.normal(0, 1.5, n) + 180) % 360 - 180
+    # Incidents at the same spot, as when the source only gives a town
+    repeated = rng.random(n) < 0.2
+    lat[repeated], lon[repeated] = np.round(lat[repeated], 1), np.round(lon[repeated], 1)
+    no_place = rng.random(n) < 0.03
+    lat[no_place], lon[no_place] = np.nan, np.nan
+    dead = rng.poisson(2, n).astype(float)
+    missing = np.where(rng.random(n) < 0.3, rng.poisson(5, n), 0).astype(float)
+    month = pd.Series(dates.month_name()).to_numpy(dtype=object)
+    # Abbreviated and numbered months occur in hand-edited files
+    month[rng.random(n) < 0.05] = 'Jan'
+    month[rng.random(n) < 0.02] = None
+    frame = pd.DataFrame({
+        'Incident Type': pick(TYPES),
+        'Region of Incident': pick(REGIONS, 0.01),
+        'Incident Date': pd.Series(dates).where(rng.random(n) > 0.01),
+        'Incident Year': dates.year.astype(float),
+        'Month': month,
+        'Number of Dead': np.where(rng.random(n) < 0.05, np.nan, dead),
+        'Minimum Estimated Number of Missing': missing,
+        'Total Number of Dead and Missing': dead + missing,
+        'Number of Survivors': np.where(rng.random(n) < 0.5, rng.poisson(8, n), 0).astype(float),
+        'Number of Females': rng.poisson(0.5, n).astype(float),
+        'Number of Males': rng.poisson(1.5, n).astype(float),
+        'Number of Children': rng.poisson(0.3, n).astype(float),
+        'Country of Origin': pick(COUNTRIES, 0.1),
+        'Region of Origin': pick(ORIGINS, 0.05),
+        'Cause of Death': pick(CAUSES),
+        'Country of Incident': pick(COUNTRIES),
+        'Migration Route': pick(ROUTES, 0.2),
+        'Location of Incident': [f'{place} near km {km}' for place, km in zip(pick(COUNTRIES), rng.integers(0, 50, n))],
+        'LATITUDE': lat,
+        'LONGITUDE': lon,
+        'Information Source': pick(['Coast guard', 'Media', 'NGO report', 'Survivors']),
+        'Source Quality': pick([1, 2, 3, 4, 5, 'Unverified']),
+    })
+    return frame
+
+
+@pytest.fixture(scope='session')
+def dataset():
+    return engine.Dataset.from_frame(incidents(), 'synthetic')
+
+
+def random_state(frame, seed):
+    """A filter state drawn at random, mixing cell-aligned and row-level filters."""
+    rng = np.random.default_rng(seed)
+    changes = {}
+    for field, column in engine.FILTER_COLUMNS.items():
+        if rng.random() < 0.5:
+            options = frame[column].dropna().unique()
+            chosen = rng.choice(options, size=rng.integers(1, len(options)), replace=False)
+            changes[field] = tuple(sorted(value.item() if hasattr(value, 'item') else value for value in chosen))
+    if rng.random() < 0.3:
+        start = pd.Timestamp('2014-01-01') + pd.Timedelta(days=int(rng.integers(0, 3000)))
+        end = start + pd.Timedelta(days=int(rng.integers(0, 1500)))
+        changes['dates'] = (start.date().isoformat(), end.date().isoformat())
+    if rng.random() < 0.2:
+        lat, lon = CENTRES[rng.integers(0, len(CENTRES))]
+        changes['near'] = (lat + rng.normal(0, 1), lon, float(rng.uniform(20, 400)))
+    if rng.random() < 0.2:
+        lat, lon = CENTRES[rng.integers(0, len(CENTRES))]
+        changes['bounds'] = (lat - 2.0, (lon - 3 + 180) % 360 - 180, lat + 2.0, (lon + 3 + 180) % 360 - 180)
+    if rng.random() < 0.3:
+        column = rng.choice(['Incident Type', 'Migration Route', 'Country of Incident'])
+        values = frame[column].dropna().unique()
+        changes['picks'] = engine.chart_picks({column: tuple(rng.choice(values, size=2, replace=False))})
+    return engine.FilterState(**changes)
+
+
+@pytest.fixture(params=range(40))
+def state(request, dataset):
+    return random_state(dataset.frame, request.param)
+
+
+def reference_rows(frame, state):
+    """Rows of ``frame`` selected by ``state``, filtered with plain pandas."""
+    mask = pd.Series(True, index=frame.index)
+    for field, column in engine.FILTER_COLUMNS.items():
+        if getattr(state, field) is not None:
+            mask &= frame[column].isin(getattr(state, field))
+    if state.dates is not None:
+        days = frame['Incident Date'].dt.normalize()
+        mask &= (days >= pd.Timestamp(state.dates[0])) & (days <= pd.Timestamp(state.dates[1]))
+    lat, lon = frame['LATITUDE'], frame['LONGITUDE']
+    if state.near is not None:
+        mask &= haversine(state.near[0], state.near[1], lat, lon) <= state.near[2]
+    if state.bounds is not None:
+        south, west, north, east = state.bounds
+        inside = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        mask &= (lat >= south) & (lat <= north) & inside
+    for column, values in state.picks or ():
+        mask &= frame[column].isin(values)
+    return frame[mask]
@@ -0,0 +1,131 @@
+"""HTTP API status codes, caching headers and filter parsing."""
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import pandas as pd
+import pytest
+
+from iomdata import aggregations, engine
+from iomdata.api import Handler
+
+from .conftest import incidents, reference_rows
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def get(server, dataset):
+    def get(endpoint, params=(), headers=None):
+        query = urlencode([('dataset', dataset.key)] + list(params))
+        request = urllib.request.Request(f'{server}/{endpoint}?{query}', headers=headers or {})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+    return get
+
+
+def frame(body):
+    return pd.read_json(io.StringIO(body.decode('utf-8')), orient='split')
+
+
+def test_kpis_are_integers(get, dataset):
+    status, _, body = get('kpis')
+    assert status == 200
+    values = dict(json.loads(body)['data'])
+    assert values['Incidents'] == len(dataset.frame)
+    assert all(isinstance(value, int) for value in values.values())
+
+
+def test_etag_answers_304(get):
+    status, headers, _ = get('routes', [('n', 3)])
+    etag = headers['ETag']
+    assert status == 200 and etag
+    status, headers, body = get('routes', [('n', 3)], {'If-None-Match': etag})
+    assert status == 304 and headers['ETag'] == etag and body == b''
+    # Another filter state is another response
+    status, headers, _ = get('routes', [('n', 3), ('regions', 'Mediterranean')], {'If-None-Match': etag})
+    assert status == 200 and headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('params', [
+    [('start', 'bad')],
+    [('start', '2020-13-01')],
+    [('end', '2020-02-30')],
+    [('start', '2021-01-01'), ('end', '2020-01-01')],
+    [('years', 'x')],
+    [('near', '1,2')],
+    [('picks', '[1, 2]')],
+    [('picks', '{"Incident Type": "Incident"}')],
+    [('granularity', 'decade')],
+])
+def test_bad_parameters_answer_400(get, params):
+    status, _, body = get('trend', params)
+    assert status == 400 and json.loads(body)['error']
+
+
+def test_not_found(get, server):
+    assert get('nothing')[0] == 404
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f'{server}/kpis?dataset=unknown')
+    assert e.value.code == 404
+
+
+def test_open_date_range_uses_the_dataset_dates(get, dataset):
+    status, _, body = get('trend', [('granularity', 'year'), ('start', '2022-01-01')])
+    assert status == 200
+    trend = frame(body)
+    state = engine.FilterState(dates=('2022-01-01', dataset.date_bounds()[1].isoformat()))
+    assert len(trend) == 2
+    assert trend['Incidents'].sum() == len(reference_rows(dataset.frame, state).dropna(subset=['Incident Date']))
+
+
+def test_picks(get, dataset):
+    status, _, body = get('kpis', [('picks', json.dumps({'Incident Type': ['Incident']}))])
+    assert status == 200
+    assert dict(json.loads(body)['data'])['Incidents'] == (dataset.frame['Incident Type'] == 'Incident').sum()
+
+
+def test_survival_has_the_dashboard_rate(get, dataset):
+    survival = frame(get('survival')[2]).set_index('Incident Type')
+    rates = aggregations.survival_rate(dataset.frame)
+    pd.testing.assert_series_equal(survival['Survival Rate (%)'].dropna(), rates, check_names=False, check_index_type=False)
+    people = survival['Number of Survivors'] + survival[aggregations.VICTIMS]
+    assert survival['Survival Rate (%)'].isna().equals(people < aggregations.SURVIVAL_MIN_PEOPLE)
+
+
+def test_survival_rate_threshold():
+    sums = pd.DataFrame({'Number of Survivors': [1, 3, 10], aggregations.VICTIMS: [0, 2, 30]},
+                        index=pd.Index(['One', 'Five', 'Forty'], name='Incident Type'))
+    rates = aggregations.survival_rates(sums)
+    assert rates.to_dict() == {'Five': 60.0, 'Forty': 25.0}
+
+
+def test_locations_from_the_sketches(get, dataset):
+    status, _, body = get('locations', [('n', 3)])
+    assert status == 200
+    locations = frame(body).set_index('Location of Incident')['Incidents']
+    expected = engine.section(dataset, engine.FilterState(), 'heavy_hitters', 'Location of Incident', 3)
+    assert locations.to_dict() == expected.to_dict()
+
+
+def test_months_without_incident_year(server):
+    dataset = engine.Dataset.from_frame(incidents(300, seed=44).drop(columns=['Incident Year']), 'no years')
+    query = urlencode([('dataset', dataset.key)])
+    with urllib.request.urlopen(f'{server}/months?{query}') as response:
+        months = frame(response.read())
+    assert months['Incidents'].sum() == dataset.frame['Month'].notna().sum()
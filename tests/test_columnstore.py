@@ -0,0 +1,47 @@
+"""Column store round trips and the loader dispatch."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import engine, report
+from iomdata.columnstore import read_columns, write_columns
+
+
+def decoded(frame):
+    # Plain arrays in place of the memory maps and each frame's string pool
+    return pd.DataFrame({col: np.array(frame[col], dtype=object if isinstance(frame[col].dtype, pd.CategoricalDtype) else None)
+                         for col in frame.columns})
+
+
+@pytest.fixture(scope='module')
+def root(dataset, tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('columns'))
+    write_columns(dataset.frame, root, key=dataset.key)
+    return root
+
+
+def test_round_trip(dataset, root):
+    key, frame = read_columns(root)
+    assert key == dataset.key
+    # Columns come back in their smallest type
+    pd.testing.assert_frame_equal(decoded(frame), decoded(dataset.frame), check_dtype=False)
+    # Numbers among the strings of a column come back as numbers, missing values as NaN
+    source = dataset.frame['Source Quality']
+    assert frame['Source Quality'].dtype == object
+    assert [type(value) for value in frame['Source Quality'].dropna()] == [type(value) for value in source.dropna()]
+    assert frame['Source Quality'].isna().equals(source.isna())
+
+
+def test_load_path_dispatch(dataset, root):
+    loaded = engine.load_path(root)
+    # Other dtypes than the source file: a dataset of its own
+    assert loaded.key == f'{dataset.key}:columns' and loaded is engine.load_columns(root)
+    pd.testing.assert_series_equal(engine.section(loaded, engine.FilterState(), 'column_sums'),
+                                   engine.section(dataset, engine.FilterState(), 'column_sums'), check_dtype=False)
+
+
+def test_report_reads_a_column_store(dataset, root, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(report, 'generate', lambda dataset, *args: calls.append(dataset) or [])
+    report.main([root, '--by', 'regions', '--output', str(tmp_path)])
+    assert [loaded.key for loaded in calls] == [f'{dataset.key}:columns']
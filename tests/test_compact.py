@@ -0,0 +1,86 @@
+"""Compact traces against the figures drawn before compaction."""
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import compact
+from iomdata.data import decoded_columns, prepare
+from iomdata.spatial import SELECTION_PADDING
+
+from .conftest import incidents
+
+
+@pytest.fixture
+def points():
+    """Mapped incidents as the map tab draws them, above the compact threshold."""
+    frame = decoded_columns(prepare(incidents(2 * compact.COMPACT_POINTS, seed=5)))
+    return frame.dropna(subset=['LATITUDE', 'LONGITUDE']).reset_index(drop=True)
+
+
+def baseline_text(df_map):
+    """Hover strings of the map before the compact encoding, one per point."""
+    hover_text = []
+    for idx, row in df_map.iterrows():
+        texto = f"Local: {row.get('Location of Incident', 'N/A')}<br>"
+        texto += f"Tipo: {row['Incident Type']}<br>"
+        texto += f"Data: {row['Incident Date']}<br>"
+        texto += f"Vítimas: {int(row['Total Number of Dead and Missing'])}"
+        hover_text.append(texto)
+    return hover_text
+
+
+def hover_fields(df_map):
+    return {'Local': df_map['Location of Incident'], 'Tipo': df_map['Incident Type'],
+            'Data': df_map['Incident Date'],
+            'Vítimas': df_map['Total Number of Dead and Missing'].fillna(0).astype(int)}
+
+
+def shown(trace):
+    """The hover strings the browser shows for ``trace``."""
+    if 'text' in trace:
+        return list(trace['text'])
+    template = trace['hovertemplate'].removesuffix('<extra></extra>')
+    return [re.sub(r'%\{customdata\[(\d+)\]\}', lambda m: str(row[int(m.group(1))]), template)
+            for row in trace['customdata']]
+
+
+@pytest.mark.parametrize('typed', [True, False])
+def test_quantized_coordinates_stay_within_the_selection_padding(monkeypatch, typed):
+    monkeypatch.setattr(compact, 'TYPED_ARRAYS', typed)
+    rng = np.random.default_rng(3)
+    n = 2 * compact.COMPACT_POINTS
+    for values in [rng.uniform(-90, 90, n), rng.uniform(-180, 180, n), np.full(n, 179.999994)]:
+        sent = compact.quantize(pd.Series(values))
+        assert np.abs(np.asarray(sent, dtype=np.float64) - values).max() <= SELECTION_PADDING
+    sizes = rng.uniform(5, 30, n)
+    assert np.abs(compact.quantize(sizes, 1) - sizes).max() <= 0.05 + 1e-6
+
+
+def test_small_traces_are_sent_as_is():
+    values = pd.Series([35.123456789, -111.987654321])
+    assert compact.quantize(values) is values
+    assert compact.scatter_type(len(values)).__name__ == 'Scatter'
+    assert compact.scatter_type(compact.COMPACT_POINTS + 1).__name__ == 'Scattergl'
+
+
+def test_compact_hover_matches_the_baseline(points):
+    trace = compact.hover(hover_fields(points), len(points))
+    assert 'customdata' in trace
+    assert shown(trace) == baseline_text(points)
+
+
+def test_small_hover_matches_the_baseline(points):
+    small = points.head(50)
+    trace = compact.hover(hover_fields(small), len(small))
+    assert 'text' in trace
+    assert shown(trace) == baseline_text(small)
+
+
+def test_hover_shows_scalars_and_missing_values_as_before():
+    frame = pd.DataFrame({'Location of Incident': ['Lampedusa', None], 'Incident Type': ['Incident', 'Incident'],
+                          'Incident Date': pd.to_datetime(['2016-05-26', None]),
+                          'Total Number of Dead and Missing': [3.0, 0.0]})
+    assert shown(compact.hover(hover_fields(frame), 2)) == baseline_text(frame)
+    assert shown(compact.hover({'Local': 'N/A'}, 2)) == ['Local: N/A'] * 2
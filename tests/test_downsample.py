@@ -0,0 +1,41 @@
+"""Downsampling of long trend series."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata.downsample import METHODS, downsample
+
+
+def daily(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.poisson(5, n).astype(float)
+    # One spike and one gap the reduced trace must still show
+    values[n // 3] = 500
+    values[2 * n // 3] = -50
+    return pd.Series(values, index=pd.date_range('2014-01-01', periods=n, freq='D'))
+
+
+@pytest.mark.parametrize('method', list(METHODS))
+@pytest.mark.parametrize('n, max_points', [(5000, 1200), (3001, 300), (1201, 1200), (50, 10)])
+def test_keeps_the_ends_and_extremes(method, n, max_points):
+    series = daily(n)
+    reduced = downsample(series, max_points, method)
+    assert len(reduced) <= max_points
+    assert reduced.index.is_monotonic_increasing and reduced.index.is_unique
+    assert reduced.index[0] == series.index[0] and reduced.index[-1] == series.index[-1]
+    assert series.idxmax() in reduced.index and series.idxmin() in reduced.index
+    # Points are picked, not interpolated
+    pd.testing.assert_series_equal(reduced, series.loc[reduced.index])
+
+
+@pytest.mark.parametrize('method', list(METHODS))
+def test_short_series_pass_through(method):
+    series = daily(800)
+    assert downsample(series, 800, method) is series
+    assert downsample(series, 0, method) is series
+    np.testing.assert_array_equal(METHODS[method](np.arange(5), np.ones(5), 2), np.arange(5))
+
+
+def test_lttb_fills_the_cap():
+    series = daily(5000)
+    assert len(downsample(series, 1200, 'lttb')) == 1200
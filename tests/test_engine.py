@@ -0,0 +1,198 @@
+"""Indexed sections against the same numbers computed with plain pandas."""
+import gc
+import io
+import weakref
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import aggregations, api, engine
+from iomdata.aggregations import VICTIM_BUCKETS, VICTIMS
+from iomdata.data import MONTHS, content_key, decoded_columns, prepare
+from iomdata.hotspots import HotspotGraph
+
+from .conftest import incidents, reference_rows
+
+
+def test_filtered_matches_pandas(dataset, state):
+    expected = reference_rows(dataset.frame, state)
+    selected = dataset.filtered(state)
+    np.testing.assert_array_equal(selected.index.to_numpy(), expected.index.to_numpy())
+    pd.testing.assert_frame_equal(selected, expected)
+
+
+def test_positions_are_table_order(dataset, state):
+    positions = dataset.positions(state)
+    assert (np.diff(positions) > 0).all()
+    np.testing.assert_array_equal(positions, dataset.frame.index.get_indexer(reference_rows(dataset.frame, state).index))
+
+
+def test_state_round_trips_through_dict(state):
+    assert engine.FilterState.from_dict(state.to_dict()) == state
+
+
+def test_longer_export_extends_the_loaded_dataset():
+    raw = incidents(1500, seed=11)
+    head = engine.load_dataset(raw.iloc[:1000].to_csv(index=False).encode(), 'head.csv')
+    head.hotspot_graph(50.0)
+    payload = raw.to_csv(index=False).encode()
+    extended = engine.load_dataset(payload, 'full.csv')
+    assert extended.key == content_key(payload) and extended is not head
+    expected = prepare(pd.read_csv(io.BytesIO(payload)))
+    pd.testing.assert_frame_equal(extended.frame, expected)
+    # The hotspot graph was carried over and extended with the new rows
+    assert 50.0 in extended._hotspot_graphs
+    pd.testing.assert_frame_equal(extended.hotspots(engine.FilterState(), 50.0, 10),
+                                  HotspotGraph.from_frame(expected, 50.0).clusters(None, expected[VICTIMS], 10))
+
+
+@pytest.mark.parametrize('column', ['Incident Type', 'Migration Route', 'Country of Origin', 'Cause of Death'])
+def test_top_values_match_pandas(dataset, state, column):
+    top = engine.section(dataset, state, 'top_values', column, 5)
+    expected = reference_rows(dataset.frame, state)[column].value_counts()
+    expected = expected[expected > 0]
+    # Values tied on the last count may be ranked differently
+    assert top.tolist() == expected.head(5).tolist()
+    assert top.to_dict() == {value: expected[value] for value in top.index}
+    assert not isinstance(top.index.dtype, pd.CategoricalDtype)
+
+
+def expected_distribution(rows, by):
+    groups = rows[VICTIMS].groupby(rows[by].astype(object) if by else pd.Series('All', index=rows.index))
+    return pd.DataFrame({
+        'Incidents': groups.size(),
+        'Mean': groups.mean(),
+        **{name: groups.agg(lambda values, q=q: np.quantile(values, q)) for name, q in engine.QUANTILES.items()},
+        'Max': groups.max(),
+    })
+
+
+@pytest.mark.parametrize('by', [None, 'Region of Incident', 'Incident Type'])
+def test_distribution_matches_pandas(dataset, state, by):
+    found = engine.section(dataset, state, 'distribution', VICTIMS, by).set_index(by or 'Group')
+    expected = expected_distribution(reference_rows(dataset.frame, state), by)
+    if expected.empty:
+        assert found.empty
+        return
+    pd.testing.assert_frame_equal(found.sort_index(), expected.sort_index(), check_names=False, check_index_type=False)
+
+
+def test_histogram_matches_pandas(dataset, state):
+    histogram = engine.section(dataset, state, 'histogram', VICTIMS, VICTIM_BUCKETS)
+    victims = reference_rows(dataset.frame, state)[VICTIMS]
+    expected = pd.cut(victims, list(VICTIM_BUCKETS) + [np.inf], right=False).value_counts(sort=False)
+    assert histogram.tolist() == expected.tolist()
+    assert histogram.sum() == (victims >= VICTIM_BUCKETS[0]).sum()
+
+
+@pytest.mark.parametrize('measure', ['Incidents', 'Victims'])
+def test_seasonality_matches_pandas(dataset, state, measure):
+    matrix = engine.section(dataset, state, 'seasonality', measure)
+    rows = reference_rows(dataset.frame, state).dropna(subset=['Incident Year', 'Month'])
+    values = pd.Series(1, index=rows.index) if measure == 'Incidents' else rows[VICTIMS]
+    expected = (values.groupby([rows['Incident Year'].astype(int), rows['Month'].astype(object)]).sum()
+                .unstack(fill_value=0).reindex(columns=MONTHS, fill_value=0))
+    assert list(matrix.columns) == MONTHS
+    pd.testing.assert_frame_equal(matrix, expected, check_dtype=False, check_names=False, check_index_type=False,
+                                  check_column_type=False)
+    month_counts = engine.section(dataset, state, 'month_counts')
+    assert month_counts.tolist() == rows['Month'].value_counts().reindex(MONTHS).tolist()
+
+
+def expected_correlation(frame, rows):
+    return rows[aggregations.correlation_columns(frame)].astype(float).corr()
+
+
+def test_correlation_matches_pandas(dataset, state):
+    corr = engine.section(dataset, state, 'correlation')
+    pd.testing.assert_frame_equal(corr, expected_correlation(dataset.frame, reference_rows(dataset.frame, state)))
+
+
+def test_correlation_of_empty_and_constant_columns():
+    frame = incidents(1000, seed=7)
+    frame['Number of Children'] = 2
+    dataset = engine.Dataset.from_frame(frame, 'constant')
+    # Empty selections by cells and by rows, then one with rows
+    states = [engine.FilterState(years=(1900,)), engine.FilterState(dates=('1900-01-01', '1900-12-31')),
+              engine.FilterState(regions=('Mediterranean',)), engine.FilterState()]
+    for state in states:
+        corr = engine.section(dataset, state, 'correlation')
+        expected = expected_correlation(dataset.frame, reference_rows(dataset.frame, state))
+        pd.testing.assert_frame_equal(corr, expected)
+    # Nothing correlates with a column that does not vary
+    assert engine.section(dataset, engine.FilterState(), 'correlation')['Number of Children'].isna().all()
+
+
+@pytest.mark.parametrize('column', ['Incident Date', VICTIMS, 'Number of Survivors', 'Country of Incident', 'Source Quality'])
+@pytest.mark.parametrize('ascending', [True, False])
+def test_row_order_matches_pandas(dataset, state, column, ascending):
+    order = engine.section(dataset, state, 'row_order', column, ascending)
+    values = reference_rows(dataset.frame, state)[column]
+    if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+        # Text, and numbers among text, sort as text
+        values = values.astype(object).astype(str).where(values.notna())
+    # Missing values last and ties in table order, in both directions
+    expected = values.sort_values(ascending=ascending, na_position='last', kind='stable')
+    np.testing.assert_array_equal(order, dataset.frame.index.get_indexer(expected.index))
+
+
+def test_page_matches_iloc(dataset):
+    state = engine.FilterState(regions=('Mediterranean',))
+    order = engine.section(dataset, state, 'row_order', VICTIMS, False)
+    rows = dataset.frame.iloc[order]
+    size = 25
+    last = (len(order) - 1) // size
+    assert len(order) % size
+    for number in [0, 1, last, last + 1, last + 10]:
+        page = dataset.page(order, number, size)
+        pd.testing.assert_frame_equal(page, decoded_columns(rows.iloc[number * size:(number + 1) * size]))
+        assert not any(isinstance(dtype, pd.CategoricalDtype) for dtype in page.dtypes)
+    assert len(dataset.page(order, last, size)) == len(order) % size
+    assert dataset.page(order, last + 1, size).empty
+
+
+def test_page_size_does_not_grow_with_the_string_pool():
+    pytest.importorskip('pyarrow')
+    frame = incidents(20000, seed=9)
+    # A pool of over 20,000 strings, as in the full export
+    frame['Location of Incident'] = [f'Site {i}' for i in range(len(frame))]
+    dataset = engine.Dataset.from_frame(frame, 'pool')
+    page = dataset.page(np.arange(len(frame)), 3, 25)
+    # Sent to the browser as Arrow; Streamlit turns mixed columns into text
+    body = api.encode(page.astype({'Source Quality': str}), 'arrow')
+    assert len(body) < 20_000
+
+
+def test_dropping_the_last_lease_frees_the_dataset():
+    dataset = engine.Dataset.from_frame(incidents(300, seed=31), 'leased')
+    key = dataset.key
+    first, second = engine.lease(dataset), engine.lease(dataset)
+    engine.warm(dataset, engine.FilterState())
+    indexes = [weakref.ref(dataset.spatial_index), weakref.ref(dataset.hotspot_graph(50))]
+    freed = weakref.ref(dataset)
+    del dataset
+    del first
+    gc.collect()
+    assert engine.get_dataset(key) is not None
+    assert any(cached[0] == key for cached in engine._cache)
+    del second
+    gc.collect()
+    assert engine.get_dataset(key) is None
+    assert not any(cached[0] == key for cached in engine._cache)
+    assert freed() is None and all(index() is None for index in indexes)
+
+
+@pytest.mark.parametrize('state', [
+    engine.FilterState(),
+    engine.FilterState(regions=('Mediterranean',)),
+    engine.FilterState(dates=('2016-01-01', '2018-12-31')),
+])
+def test_month_counts_without_incident_year(state):
+    frame = incidents(500, seed=43).drop(columns=['Incident Year'])
+    dataset = engine.Dataset.from_frame(frame, 'no years')
+    assert aggregations.required_columns('month_counts') == ['Month']
+    counts = engine.section(dataset, state, 'month_counts')
+    rows = reference_rows(dataset.frame, state)
+    assert list(counts.index) == MONTHS and counts.index.name == 'Month'
+    assert counts.tolist() == rows['Month'].value_counts().reindex(MONTHS, fill_value=0).tolist()
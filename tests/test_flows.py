@@ -0,0 +1,43 @@
+"""Origin-to-destination flows of the partition cells against the selected rows."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import aggregations, engine
+from iomdata.aggregations import VICTIMS
+
+from .conftest import reference_rows
+
+ORIGIN = 'Region of Origin'
+
+
+def by_pair(flows):
+    return flows.sort_values(['Origin', 'Destination'], ignore_index=True)
+
+
+@pytest.mark.parametrize('destination', ['Region of Incident', 'Country of Incident'])
+def test_cells_match_rows(dataset, state, destination):
+    flows = engine.section(dataset, state, 'flows', ORIGIN, destination)
+    expected = aggregations.flows(reference_rows(dataset.frame, state), ORIGIN, destination)
+    pd.testing.assert_frame_equal(by_pair(flows), by_pair(expected), check_index_type=False)
+
+
+def test_flows_add_up_to_the_totals(dataset, state):
+    flows = engine.section(dataset, state, 'flows', ORIGIN, 'Region of Incident')
+    rows = reference_rows(dataset.frame, state).dropna(subset=[ORIGIN, 'Region of Incident'])
+    # Incidents listing several origins are split between them
+    assert flows['Incidents'].sum() == pytest.approx(len(rows))
+    assert flows['Victims'].sum() == pytest.approx(rows[VICTIMS].sum())
+    assert flows['Incidents'].is_monotonic_decreasing
+
+
+def test_listed_origins_share_the_incident():
+    df = pd.DataFrame({
+        ORIGIN: ['Western Africa, Northern Africa', 'Northern Africa', None],
+        'Region of Incident': ['Mediterranean', 'Mediterranean', 'Mediterranean'],
+        VICTIMS: [4.0, 1.0, 7.0],
+    })
+    flows = aggregations.flows(df, ORIGIN, 'Region of Incident').set_index('Origin')
+    assert flows['Incidents'].to_dict() == {'Northern Africa': 1.5, 'Western Africa': 0.5}
+    assert flows['Victims'].to_dict() == {'Northern Africa': 3.0, 'Western Africa': 2.0}
+    assert np.all(flows['Destination'] == 'Mediterranean')
@@ -0,0 +1,41 @@
+"""Hotspots of the shared location graph against clustering the selected rows."""
+import numpy as np
+import pytest
+
+from iomdata import engine
+from iomdata.aggregations import VICTIMS
+from iomdata.hotspots import HotspotIndex, convex_hull
+
+from .conftest import reference_rows
+
+
+@pytest.mark.parametrize('eps_km', [25.0, 150.0])
+def test_graph_matches_index(dataset, state, eps_km):
+    found = dataset.hotspots(state, eps_km, 10)
+    expected = HotspotIndex.from_frame(reference_rows(dataset.frame, state), eps_km, 10).clusters()
+    # Border locations within reach of two hotspots may join either
+    assert len(found) == len(expected)
+    for column in ['Incidents', 'Victims', 'Locations']:
+        assert found[column].sum() == expected[column].sum()
+
+
+def test_section_covers_all_rows(dataset):
+    hotspots = engine.section(dataset, engine.FilterState(), 'hotspots', 25.0, 10)
+    expected = HotspotIndex.from_frame(dataset.frame, 25.0, 10).clusters()
+    assert len(hotspots) == len(expected)
+    assert hotspots['Victims'].sum() == expected['Victims'].sum() <= dataset.frame[VICTIMS].sum()
+    assert hotspots['Victims'].is_monotonic_decreasing
+
+
+def test_hull_keeps_the_extreme_points():
+    rng = np.random.default_rng(5)
+    lon, lat = rng.normal(0, 1, 500), rng.normal(0, 1, 500)
+    ring = [(float(x), float(y)) for x, y in zip(lon, lat)]
+    hull = convex_hull(lon, lat)
+    assert hull[0] == hull[-1]
+    assert set(hull) <= set(ring)
+    for corner in [np.argmin(lon), np.argmax(lon), np.argmin(lat), np.argmax(lat)]:
+        assert ring[corner] in hull
+    # Only the hull's vertices give the same hull
+    vertices = np.asarray(hull[:-1])
+    assert convex_hull(vertices[:, 0], vertices[:, 1]) == hull
@@ -0,0 +1,102 @@
+"""Background ingestion of uploads: progress, hand-off and failures."""
+import gc
+import time
+
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.data import content_key
+from iomdata.ingest import STAGES, IngestJob, _jobs, ingest
+
+from .conftest import incidents
+
+
+def freed(key, timeout=10):
+    """Whether the dataset ``key`` is unregistered within ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    # The worker thread lets go of its job just after the job completes
+    while engine.get_dataset(key) is not None and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.01)
+    return engine.get_dataset(key) is None
+
+
+def upload(seed):
+    """An uploaded CSV export, as bytes."""
+    return incidents(300, seed=seed).to_csv(index=False).encode()
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    """Every (stage, progress) a job reports, in order."""
+    reported = []
+    report = IngestJob._report
+
+    def recorded(job, stage, fraction):
+        report(job, stage, fraction)
+        reported.append((job.stage, job.progress))
+
+    monkeypatch.setattr(IngestJob, '_report', recorded)
+    return reported
+
+
+def test_progress_goes_through_every_stage(reports):
+    job = ingest(upload(21), 'incidents.csv')
+    assert job.wait(60) is not None
+    stages = [stage for stage, _ in reports]
+    assert sorted(set(stages), key=stages.index) == ['parsing', 'normalizing', 'indexing']
+    # Each stage stays within its share of the bar, which only moves forward
+    progress = [value for _, value in reports]
+    assert progress == sorted(progress)
+    assert all(STAGES[stage][0] <= value <= STAGES[stage][1] for stage, value in reports)
+    assert job.stage == 'indexing' and job.progress == 1.0
+
+
+def test_finished_job_hands_over_the_dataset():
+    payload = upload(22)
+    job = ingest(payload, 'incidents.csv')
+    # Identical uploads share the running job
+    assert ingest(payload, 'copy.csv') is job or job.done
+    dataset = job.wait(60)
+    assert job.done and job.error is None
+    assert dataset.key == content_key(payload)
+    assert engine.get_dataset(dataset.key) is dataset
+    pd.testing.assert_frame_equal(dataset.frame, engine.load_dataset(payload, 'incidents.csv').frame)
+    # Its default sections are ready when it is handed over
+    assert any(cached[:2] == (dataset.key, engine.FilterState()) for cached in engine._cache)
+    assert content_key(payload) not in _jobs
+    # A later upload of the same file is answered from the registered dataset
+    again = ingest(payload, 'incidents.csv')
+    assert again.done and again.dataset is dataset and again.progress == 1.0
+
+
+def test_failed_parse_is_reported_and_can_be_retried():
+    payload = upload(23)
+    job = ingest(payload, 'incidents.xlsx')
+    assert job.wait(60) is None
+    assert job.done and job.error
+    assert engine.get_dataset(content_key(payload)) is None
+    assert content_key(payload) not in _jobs
+    retry = ingest(payload, 'incidents.csv')
+    assert retry is not job
+    assert retry.wait(60) is not None and retry.error is None
+
+
+def test_unused_upload_is_freed_with_its_job():
+    job = ingest(upload(24), 'incidents.csv')
+    key = job.wait(60).key
+    assert engine.get_dataset(key) is not None
+    # The session replaces the upload before ever showing it
+    del job
+    assert freed(key)
+
+
+def test_shown_upload_outlives_its_job():
+    job = ingest(upload(25), 'incidents.csv')
+    held = engine.lease(job.wait(60))
+    key = held.dataset.key
+    del job
+    assert not freed(key, timeout=0.2)
+    del held
+    assert freed(key)
@@ -0,0 +1,64 @@
+"""Batch report generation and its failures."""
+import multiprocessing
+import os
+
+import pytest
+
+from iomdata import engine, report
+from iomdata.store import write_store
+
+from .conftest import incidents
+
+# The patched renderer reaches the workers by forking
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="needs forked workers")
+
+
+def render(dataset, path, title, formats=('html',)):
+    if 'Mediterranean' in title:
+        raise RuntimeError("broken slice")
+    with open(path + '.html', 'w', encoding='utf-8') as f:
+        f.write(title)
+    return [path + '.html']
+
+
+@pytest.fixture
+def csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, 'render', render)
+    path = str(tmp_path / 'incidents.csv')
+    incidents(500, seed=11).to_csv(path, index=False)
+    return path
+
+
+def test_failed_reports_are_collected(csv, tmp_path):
+    dataset = engine.load_path(csv)
+    regions = sorted(dataset.frame['Region of Incident'].dropna().unique())
+    with pytest.raises(report.ReportError) as e:
+        report.generate(dataset, ['regions'], str(tmp_path / 'out'), workers=2)
+    assert e.value.failed == [report.report_name(['regions'], ('Mediterranean',))]
+    # The other reports were still written
+    assert len(e.value.written) == len(regions) - 1
+    assert all(os.path.exists(path) for path in e.value.written)
+
+
+def test_cli_exits_non_zero(csv, tmp_path):
+    output = str(tmp_path / 'out')
+    assert report.main([csv, '--by', 'regions', '--output', output, '--workers', '2']) == 1
+    assert report.main([csv, '--by', 'types', '--output', output, '--workers', '2']) == 0
+    assert report.main([csv, '--by', 'types', '--years', '2018', '--output', output, '--workers', '2']) == 0
+
+
+def test_filters_read_only_their_partitions(csv, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    dataset = engine.load_path(csv)
+    root = str(tmp_path / 'store')
+    write_store(dataset.frame, root, key='report-store')
+    regions = dataset.frame.loc[dataset.frame['Incident Year'] == 2018, 'Region of Incident'].dropna().unique()
+    assert 'Mediterranean' in regions
+    output = str(tmp_path / 'out')
+    # Mediterranean reports fail: one failure among one report per region of 2018
+    assert report.main([root, '--by', 'regions', '--years', '2018', '--output', output, '--workers', '2']) == 1
+    # The reports of the other regions, next to plotly.js
+    assert len(os.listdir(output)) == len(regions)
+    # Nothing selected: known from the manifest, no worker started
+    monkeypatch.setattr(report, '_run', None)
+    assert report.main([root, '--years', '1900', '--output', output]) == 0
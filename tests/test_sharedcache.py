@@ -0,0 +1,113 @@
+"""Shared cache backends, the usage log and the warm-up."""
+import os
+import threading
+import time
+
+import pytest
+
+from iomdata import aggregations, engine, sharedcache, warmup
+from iomdata.sharedcache import DiskBackend, MemoryBackend, cache_key, from_url
+
+from .conftest import incidents
+
+
+def entries(root):
+    return sorted(name for _, _, files in os.walk(root) for name in files if name.endswith('.pkl'))
+
+
+def test_disk_url_sets_the_size_limit(tmp_path):
+    assert from_url(f'disk:{tmp_path}').max_bytes == sharedcache.SHARED_CACHE_MAX_BYTES
+    backend = from_url(f'disk:{tmp_path}?max_bytes=5000')
+    assert backend.root == str(tmp_path) and backend.max_bytes == 5000
+
+
+@pytest.mark.parametrize('backend', ['memory', 'disk'])
+def test_none_is_cached(tmp_path, backend):
+    backend = MemoryBackend() if backend == 'memory' else DiskBackend(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+
+    assert backend.get_or_compute('key', compute) is None
+    assert backend.get_or_compute('key', compute) is None
+    assert len(calls) == 1
+    assert backend.get('missing', 'default') == 'default'
+
+
+def test_prune_keeps_recently_used_entries(tmp_path):
+    backend = DiskBackend(str(tmp_path), max_bytes=40_000)
+    keys = [cache_key('entry', i) for i in range(30)]
+    for i, key in enumerate(keys):
+        backend.set(key, bytes(2_000))
+        # Modification times must differ for the eviction order
+        os.utime(backend._path(key), (time.time() - 1000 + i, time.time() - 1000 + i))
+        if i == 5:
+            backend.get(keys[0])
+    backend.prune(backend.max_bytes)
+    kept = entries(tmp_path)
+    assert sum(os.path.getsize(backend._path(name[:-4])) for name in kept) <= 40_000
+    # The entry read after the first ones were written outlives them
+    assert keys[0] + '.pkl' in kept and keys[-1] + '.pkl' in kept and keys[1] + '.pkl' not in kept
+
+
+def test_writes_prune_on_their_own(tmp_path):
+    backend = DiskBackend(str(tmp_path), max_bytes=20_000)
+    for i in range(100):
+        backend.set(cache_key('entry', i), bytes(1_000))
+    total = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(tmp_path) for f in files)
+    # Pruned every twentieth of the limit written
+    assert 0 < total <= 20_000 * 21 // 20
+
+
+def test_lock_computes_once_and_leaves_no_files(tmp_path):
+    # One backend per thread: only the file locks keep them apart, as between processes
+    backends = [DiskBackend(str(tmp_path)) for _ in range(8)]
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda b=b: results.append(b.get_or_compute('key', compute))) for b in backends]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 8 and len(calls) == 1
+    assert os.listdir(os.path.join(tmp_path, 'locks')) == []
+
+
+def test_usage_log_rotates(tmp_path, monkeypatch):
+    monkeypatch.setattr(warmup, 'USAGE_LOG', str(tmp_path / 'usage.jsonl'))
+    monkeypatch.setattr(warmup, 'USAGE_LOG_BYTES', 2_000)
+    popular = engine.FilterState(regions=('Mediterranean',))
+    for i in range(200):
+        warmup.record_usage(popular if i % 2 else engine.FilterState(years=(2000 + i % 7,)))
+    assert os.path.getsize(tmp_path / 'usage.jsonl') < 2_200
+    assert os.path.exists(tmp_path / 'usage.jsonl.1')
+    assert not os.path.exists(tmp_path / 'usage.jsonl.2')
+    assert warmup.popular_states(1) == [popular]
+
+
+def test_warm_up_computes_the_popular_states(tmp_path, monkeypatch):
+    monkeypatch.setattr(warmup, 'USAGE_LOG', str(tmp_path / 'usage.jsonl'))
+    dataset = engine.Dataset.from_frame(incidents(600, seed=3), 'warm')
+    monkeypatch.setattr(engine, 'default_datasets', lambda: [dataset])
+    popular = engine.FilterState(regions=('Mediterranean',))
+    for _ in range(3):
+        warmup.record_usage(popular)
+    warmup.record_usage(engine.FilterState(years=(2016,)))
+    warmup.warm_up(top=1)
+
+    def fail(*args):
+        raise AssertionError("computed again")
+
+    monkeypatch.setattr(engine, '_run_section', fail)
+    for state in [engine.FilterState(), popular]:
+        for spec in aggregations.DASHBOARD_SECTIONS:
+            engine.section(dataset, state, *spec)
+    with pytest.raises(AssertionError):
+        engine.section(dataset, engine.FilterState(years=(2016,)), *aggregations.DASHBOARD_SECTIONS[0])
@@ -0,0 +1,78 @@
+"""Concurrent callers of one key share a single computation."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from iomdata import singleflight
+from iomdata.singleflight import SingleFlight
+
+CALLERS = 8
+
+
+@pytest.fixture
+def waiting(monkeypatch):
+    """Semaphore released whenever a caller starts waiting on another's call."""
+    arrived = threading.Semaphore(0)
+
+    class Event(threading.Event):
+        def wait(self, timeout=None):
+            arrived.release()
+            return super().wait(timeout)
+
+    class Call(singleflight._Call):
+        def __init__(self):
+            super().__init__()
+            self.done = Event()
+
+    monkeypatch.setattr(singleflight, '_Call', Call)
+    return arrived
+
+
+def leader(waiting, outcome):
+    """A computation that finishes with ``outcome()`` once every other caller waits on it."""
+    runs = []
+
+    def compute():
+        runs.append(threading.get_ident())
+        for _ in range(CALLERS - 1):
+            assert waiting.acquire(timeout=10)
+        return outcome()
+
+    return compute, runs
+
+
+def call_together(flight, key, compute):
+    with ThreadPoolExecutor(CALLERS) as pool:
+        return [pool.submit(flight.do, key, compute) for _ in range(CALLERS)]
+
+
+def test_concurrent_callers_share_one_run(waiting):
+    flight = SingleFlight()
+    compute, runs = leader(waiting, object)
+    results = [future.result(timeout=30) for future in call_together(flight, 'section', compute)]
+    assert len(runs) == 1
+    assert all(result is results[0] for result in results)
+    assert len(flight) == 0
+
+
+def test_error_reaches_every_waiter(waiting):
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("parse failed")
+
+    compute, runs = leader(waiting, fail)
+    futures = call_together(flight, 'section', compute)
+    errors = [future.exception(timeout=30) for future in futures]
+    assert len(runs) == 1
+    assert all(isinstance(error, ValueError) and error is errors[0] for error in errors)
+    # The key is free again: the next call computes afresh
+    assert len(flight) == 0
+    assert flight.do('section', lambda: 'recomputed') == 'recomputed'
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert [flight.do(key, str.upper, key) for key in ('a', 'b', 'a')] == ['A', 'B', 'A']
+    assert len(flight) == 0
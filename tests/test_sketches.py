@@ -0,0 +1,85 @@
+"""Stream sketch error bounds and the heavy hitters section."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.data import prepare
+from iomdata.sketches import CountMinSketch, HeavyHitters, SpaceSaving
+
+from .conftest import incidents
+
+
+def zipf_chunks(n=20000, chunks=8, seed=0):
+    rng = np.random.default_rng(seed)
+    values = pd.Series([f'place {i}' for i in rng.zipf(1.3, n) % 5000])
+    return values, np.array_split(values, chunks)
+
+
+def test_space_saving_bounds():
+    values, chunks = zipf_chunks()
+    sketch = SpaceSaving(k=100)
+    for chunk in chunks:
+        sketch.update(chunk)
+    true = values.value_counts()
+    assert sketch.total == len(values) and len(sketch) == 100
+    for value, count in sketch.counts.items():
+        assert count - sketch.errors[value] <= true[value] <= count
+    # Every value above total / k is tracked
+    assert set(true[true > len(values) / 100].index) <= set(sketch.counts)
+
+
+def test_count_min_bounds_and_merge():
+    values, chunks = zipf_chunks()
+    sketches = [CountMinSketch(width=512).update(chunk) for chunk in chunks]
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged = merged.merge(sketch)
+    single = CountMinSketch(width=512).update(values)
+    np.testing.assert_array_equal(merged.table, single.table)
+    true = values.value_counts()
+    estimates = merged.estimate(true.index)
+    assert np.all(estimates >= true.to_numpy())
+    assert np.mean(estimates - true.to_numpy()) <= np.e / 512 * len(values)
+    with pytest.raises(ValueError):
+        merged.merge(CountMinSketch(width=256))
+
+
+def test_unused_categories_are_not_counted():
+    values = pd.Series(['a', 'b', 'a', None], dtype=pd.CategoricalDtype([f'v{i}' for i in range(10000)] + ['a', 'b']))
+    sketch = SpaceSaving(k=5).update(values)
+    assert sketch.counts == {'a': 2, 'b': 1} and sketch.total == 3
+
+
+@pytest.fixture(scope='module')
+def skewed():
+    frame = incidents(3000, seed=5)
+    rng = np.random.default_rng(5)
+    frame['Location of Incident'] = [f'Site {i}' for i in rng.zipf(1.5, len(frame)) % 2000]
+    return frame
+
+
+def test_heavy_hitters_section(skewed):
+    dataset = engine.Dataset.from_frame(skewed, 'skewed')
+    column = 'Location of Incident'
+    top = engine.section(dataset, engine.FilterState(), 'heavy_hitters', column, 5)
+    exact = dataset.frame[column].value_counts()
+    assert top.index.name == column and top.name == 'count'
+    assert top.to_dict() == exact.head(5).to_dict()
+    # Filtered states are counted exactly
+    state = engine.FilterState(regions=('Mediterranean',))
+    pd.testing.assert_series_equal(engine.section(dataset, state, 'heavy_hitters', column, 5),
+                                   engine.section(dataset, state, 'value_counts', column).head(5))
+
+
+def test_appended_rows_update_the_sketches(skewed):
+    base = engine.Dataset(prepare(skewed.iloc[:2000].copy()), 'sketch-base', 'base')
+    sketches = base.heavy_hitters
+    extended = base.appended(skewed.iloc[2000:].copy())
+    assert base.heavy_hitters is sketches
+    fresh = HeavyHitters(sketches.columns).update(extended.frame)
+    for column in sketches.columns:
+        np.testing.assert_array_equal(extended.heavy_hitters.sketches[column].table, fresh.sketches[column].table)
+        assert extended.heavy_hitters.candidates[column].total == len(extended.frame[column].dropna())
+    pd.testing.assert_series_equal(extended.heavy_hitters.top('Location of Incident', 5),
+                                   fresh.top('Location of Incident', 5))
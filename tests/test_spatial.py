@@ -0,0 +1,95 @@
+"""Grid index queries against a brute-force scan of every point."""
+import numpy as np
+import pytest
+
+from iomdata.spatial import GridIndex, haversine, selection_bounds
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = np.random.default_rng(7)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, 5000)))
+    lon = rng.uniform(-180, 180, 5000)
+    # Gaps and out-of-range coordinates are never returned
+    lat[:50] = np.nan
+    lon[50:60] = 400.0
+    return lat, lon
+
+
+def brute_radius(lat, lon, centre_lat, centre_lon, km):
+    with np.errstate(invalid='ignore'):
+        return np.flatnonzero((haversine(centre_lat, centre_lon, lat, lon) <= km) & (np.abs(lon) <= 180))
+
+
+def brute_bbox(lat, lon, south, west, north, east):
+    with np.errstate(invalid='ignore'):
+        inside = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        return np.flatnonzero(inside & (lat >= south) & (lat <= north) & (np.abs(lon) <= 180))
+
+
+@pytest.mark.parametrize('cell_degrees', [0.5, 1.0, 5.0])
+@pytest.mark.parametrize('centre,km', [
+    ((35.5, 12.6), 300.0),
+    ((0.0, 179.5), 800.0),
+    ((-10.0, -179.9), 50.0),
+    ((88.0, 40.0), 500.0),
+    ((-89.5, 0.0), 2000.0),
+    ((20.0, 100.0), 12000.0),
+    ((45.0, -70.0), 0.0),
+])
+def test_radius_matches_brute_force(points, cell_degrees, centre, km):
+    lat, lon = points
+    index = GridIndex(lat, lon, cell_degrees)
+    np.testing.assert_array_equal(index.radius(*centre, km), brute_radius(lat, lon, *centre, km))
+
+
+@pytest.mark.parametrize('cell_degrees', [0.5, 1.0, 5.0])
+@pytest.mark.parametrize('box', [
+    (30.0, 10.0, 40.0, 20.0),
+    (-5.0, 170.0, 5.0, -170.0),
+    (-90.0, -180.0, 90.0, 180.0),
+    (80.0, -30.0, 90.0, 30.0),
+    (10.0, 10.0, 10.0, 10.0),
+    (12.3, 45.6, 12.4, 45.7),
+])
+def test_bbox_matches_brute_force(points, cell_degrees, box):
+    lat, lon = points
+    index = GridIndex(lat, lon, cell_degrees)
+    np.testing.assert_array_equal(index.bbox(*box), brute_bbox(lat, lon, *box))
+
+
+def test_random_queries(points):
+    lat, lon = points
+    index = GridIndex(lat, lon)
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        centre = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        km = rng.uniform(1, 3000)
+        np.testing.assert_array_equal(index.radius(*centre, km), brute_radius(lat, lon, *centre, km))
+        south, north = np.sort(rng.uniform(-90, 90, 2))
+        west, east = rng.uniform(-180, 180, 2)
+        np.testing.assert_array_equal(index.bbox(south, west, north, east),
+                                      brute_bbox(lat, lon, south, west, north, east))
+
+
+def test_selection_bounds_keep_the_edge_points():
+    points = [{'lat': 10.123456, 'lon': -5.5}, {'lat': 11.0, 'lon': -4.25}, {'x': 1}]
+    south, west, north, east = selection_bounds(points)
+    assert south < 10.123456 < 11.0 < north
+    assert west < -5.5 < -4.25 < east
+    assert selection_bounds([{'x': 1}]) is None
+
+
+@pytest.mark.parametrize('lons', [[179.2, -179.6, 178.9], [-179.9, 179.99], [170.0, -170.0, 180.0, -180.0]])
+def test_selection_bounds_across_the_antimeridian(points, lons):
+    selected = [{'lat': 5.0 + i, 'lon': lon} for i, lon in enumerate(lons)]
+    south, west, north, east = selection_bounds(selected)
+    assert west > east
+    assert (east - west) % 360 < 25
+    lat, lon = points
+    # Only the points between the selected ones, not the whole globe
+    found = GridIndex(lat, lon).bbox(south, west, north, east)
+    np.testing.assert_array_equal(found, brute_bbox(lat, lon, south, west, north, east))
+    assert np.all((np.abs(lon[found]) >= 170 - 1e-4))
+    for point in selected:
+        assert brute_bbox(np.array([point['lat']]), np.array([point['lon']]), south, west, north, east).size == 1
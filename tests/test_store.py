@@ -0,0 +1,103 @@
+"""Partition store round trips."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.data import NUMERIC_COLUMNS
+from iomdata.store import PARTITION_COLUMNS, PartitionStore, write_store
+
+from .conftest import reference_rows
+
+pytest.importorskip('pyarrow')
+
+
+def decoded(frame):
+    # Each frame has its own string pool
+    return frame.astype({col: object for col in frame.columns
+                         if isinstance(frame[col].dtype, pd.CategoricalDtype) and col != 'Month'})
+
+
+@pytest.fixture(scope='module')
+def store(dataset, tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('store'))
+    write_store(dataset.frame, root, key=dataset.key)
+    return PartitionStore(root)
+
+
+def partition_rows(frame):
+    return list(frame.groupby(list(PARTITION_COLUMNS), sort=True, dropna=False).indices.values())
+
+
+def test_round_trip(dataset, store):
+    expected = dataset.frame.iloc[np.concatenate(partition_rows(dataset.frame))].reset_index(drop=True)
+    frame = store.read()
+    pd.testing.assert_frame_equal(decoded(frame), decoded(expected))
+    # Numbers among the strings of a column come back as numbers
+    assert {type(value) for value in frame['Source Quality'].dropna()} == {int, str}
+
+
+def test_read_partitions(dataset, store):
+    rows = partition_rows(dataset.frame)
+    ids = [len(store) - 1, 0, 3]
+    expected = dataset.frame.iloc[np.concatenate([rows[i] for i in ids])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(decoded(store.read(ids)), decoded(expected))
+    assert [store.partitions[i]['rows'] for i in ids] == [len(rows[i]) for i in ids]
+
+
+def test_load_store(dataset, store):
+    loaded = engine.load_store(store.root)
+    assert loaded.key == f'{dataset.key}:parquet' and loaded is engine.load_store(store.root)
+    assert len(loaded.frame) == len(dataset.frame)
+    assert engine.section(loaded, engine.FilterState(), 'column_sums').equals(
+        engine.section(dataset, engine.FilterState(), 'column_sums'))
+
+
+def test_select_keeps_every_selected_row(dataset, store, state):
+    ids = store.select(state)
+    selected = dataset.frame.index.get_indexer(reference_rows(dataset.frame, state).index)
+    # Partitions left out hold none of the selected rows
+    for i, rows in enumerate(partition_rows(dataset.frame)):
+        if i not in ids:
+            assert not np.isin(rows, selected).any()
+    if state.dates is None and state.years is None and state.regions is None:
+        assert len(ids) == len(store)
+
+
+@pytest.mark.parametrize('state', [
+    engine.FilterState(),
+    engine.FilterState(years=(2016, 2019)),
+    engine.FilterState(regions=('Mediterranean', 'North America')),
+    engine.FilterState(years=(2018,), regions=('Mediterranean',)),
+    engine.FilterState(years=(1900,)),
+])
+def test_totals_from_the_manifest(dataset, store, state):
+    totals = engine.store_totals(store.root, state)
+    rows = reference_rows(dataset.frame, state)
+    assert totals['Incidents'] == len(rows)
+    for column in NUMERIC_COLUMNS:
+        assert totals[column] == pytest.approx(rows[column].sum())
+
+
+def test_totals_need_partition_aligned_filters(store):
+    assert engine.store_totals(store.root, engine.FilterState(types=('Incident',))) is None
+    assert engine.store_totals(store.root, engine.FilterState(dates=('2018-01-01', '2018-06-30'))) is None
+
+
+def test_load_store_reads_the_selected_partitions(dataset, store, monkeypatch):
+    state = engine.FilterState(years=(2017, 2018), regions=('Mediterranean',), dates=('2017-06-01', '2018-03-31'),
+                               types=('Incident',))
+    reads = []
+    read_parquet = pd.read_parquet
+
+    def counted(path, *args, **kwargs):
+        reads.append(path)
+        return read_parquet(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_parquet', counted)
+    loaded = engine.load_store(store.root, state)
+    assert len(reads) == len(store.select(state)) <= 2
+    assert loaded.key != engine.load_store(store.root).key
+    # Sections of the pruned dataset are those of the full one
+    pd.testing.assert_series_equal(engine.section(loaded, state, 'column_sums'), engine.section(dataset, state, 'column_sums'))
+    assert len(loaded.filtered(state)) == len(reference_rows(dataset.frame, state))
@@ -0,0 +1,62 @@
+"""Keyword search against a brute-force scan of the text columns."""
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.columnstore import write_columns
+from iomdata.textindex import TEXT_COLUMNS, TextIndex
+
+QUERIES = [
+    'drowning', 'DROWN', 'coast', 'Coast guard', 'guard coast', 'united states', 'near km 3', 'km 33',
+    'vehicle media', 'mixed unknown', 'harsh violence', 'ngo', 'nothing here',
+]
+
+
+def brute_search(frame, query):
+    mask = pd.Series(True, index=frame.index)
+    for word in re.findall(r'\w+', query.lower()):
+        # Every word must start a word of one of the columns
+        found = pd.Series(False, index=frame.index)
+        for column in TEXT_COLUMNS:
+            found |= frame[column].astype(str).str.contains(r'\b' + re.escape(word), case=False, regex=True)
+        mask &= found
+    return np.flatnonzero(mask.to_numpy())
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_search_matches_brute_force(dataset, query):
+    np.testing.assert_array_equal(dataset.text_index.search(query), brute_search(dataset.frame, query))
+
+
+def test_words_are_not_joined(dataset):
+    # "Coast guard" is two tokens: neither the joined word nor a word's inside matches
+    assert len(dataset.text_index.search('coast guard'))
+    assert not len(dataset.text_index.search('coastguard'))
+    assert not len(dataset.text_index.search('oast'))
+    # Words may come from different columns of the row
+    rows = dataset.text_index.search('drowning media')
+    assert len(rows) and set(rows) == set(dataset.text_index.search('drowning')) & set(dataset.text_index.search('media'))
+
+
+@pytest.mark.parametrize('query', ['', '   ', '!?', '-'])
+def test_empty_queries_match_nothing(dataset, query):
+    assert len(dataset.text_index.search(query)) == 0
+
+
+def test_accents_are_ignored():
+    frame = pd.DataFrame({'Location of Incident': ['Darién Gap', 'Darien', 'Calais'], 'Cause of Death': [None] * 3})
+    index = TextIndex(frame)
+    assert index.search('darién').tolist() == index.search('DARIEN').tolist() == [0, 1]
+
+
+def test_index_is_saved_with_the_column_store(dataset, tmp_path):
+    write_columns(dataset.frame, str(tmp_path), key='textindex')
+    loaded = engine.load_columns(str(tmp_path))
+    # Loaded with the store, not rebuilt
+    assert loaded._text_index is not None
+    np.testing.assert_array_equal(loaded.text_index.vocabulary, dataset.text_index.vocabulary)
+    for query in QUERIES:
+        np.testing.assert_array_equal(loaded.text_index.search(query), dataset.text_index.search(query))
@@ -0,0 +1,41 @@
+"""Tile rendering and the bounded tile cache."""
+import os
+
+import pytest
+
+from iomdata import engine, tiles
+from iomdata.sharedcache import DiskBackend
+
+PNG = b'\x89PNG'
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = DiskBackend(str(tmp_path), max_bytes=20_000)
+    monkeypatch.setattr(tiles, '_store', store)
+    return store
+
+
+def size(root):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files if f.endswith('.pkl'))
+
+
+def test_density_tile_is_rendered_once(dataset, store, monkeypatch):
+    state = engine.FilterState(regions=('Mediterranean',))
+    png = tiles.density_tile(dataset, state, 3, 4, 3)
+    assert png.startswith(PNG)
+
+    def fail(*args):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(tiles, 'density_tiles', fail)
+    assert tiles.density_tile(dataset, state, 3, 4, 3) == png
+    with pytest.raises(AssertionError):
+        tiles.density_tile(dataset, engine.FilterState(), 3, 4, 3)
+
+
+def test_cache_stays_within_its_limit(store):
+    for x in range(16):
+        for y in range(4):
+            assert tiles.base_tile(4, x, y).startswith(PNG)
+    assert 0 < size(store.root) <= store.max_bytes * 21 // 20
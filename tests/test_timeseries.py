@@ -0,0 +1,31 @@
+"""Trend rollups against a direct pandas groupby of the selected rows."""
+import pandas as pd
+import pytest
+
+from iomdata import engine
+from iomdata.aggregations import VICTIMS
+from iomdata.timeseries import GRANULARITIES
+
+from .conftest import reference_rows
+
+
+def expected_trend(rows, granularity):
+    rows = rows[rows['Incident Date'].notna()]
+    days = rows['Incident Date'].dt.normalize()
+    if granularity != 'day':
+        days = days.dt.to_period(GRANULARITIES[granularity]).dt.start_time
+    trend = pd.DataFrame({'Incidents': 1, 'Victims': rows[VICTIMS]}).groupby(days.rename('Day')).sum()
+    return trend.astype(float)
+
+
+@pytest.mark.parametrize('granularity', list(GRANULARITIES))
+def test_trend_matches_pandas(dataset, state, granularity):
+    trend = engine.section(dataset, state, 'trend', granularity)
+    expected = expected_trend(reference_rows(dataset.frame, state), granularity)
+    pd.testing.assert_frame_equal(trend.astype(float), expected, check_index_type=False, check_freq=False)
+
+
+def test_extreme_dates_do_not_overflow(dataset):
+    state = engine.FilterState(dates=('0001-01-01', '9999-12-31'))
+    pd.testing.assert_frame_equal(engine.section(dataset, state, 'trend', 'year'),
+                                  engine.section(dataset, engine.FilterState(), 'trend', 'year'))